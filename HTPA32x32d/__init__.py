@@ -1,3 +1,14 @@
-import HTPA32x32d.tools
-import HTPA32x32d.dataset
-import HTPA32x32d.communication
+import importlib
+
+# submodules are imported on first access (PEP 562), e.g. HTPA32x32d.tools
+__all__ = ["tools", "dataset", "communication", "stats", "background"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
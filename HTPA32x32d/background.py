@@ -0,0 +1,216 @@
+"""
+Incremental background models of thermopile sensor array sequences and foreground extraction.
+
+Background estimates are updated in O(1) per frame, vectorized over all pixels,
+so the same model processes whole arrays shaped [frames, height, width] and live frame streams.
+The state can be saved per device and loaded to warm-start the next session.
+"""
+import numpy as np
+import os
+
+import HTPA32x32d.tools as tools
+
+
+BACKGROUND_METHODS = ["average", "exponential", "median"]
+# exponential decay weight of the newest frame
+BACKGROUND_ALPHA = 0.01
+# step of the approximate running median [degrees Celsius per frame]
+BACKGROUND_MEDIAN_STEP = 0.05
+# pixels warmer than the background by more than this [degrees Celsius] are foreground
+BACKGROUND_THRESHOLD = 1.5
+BACKGROUND_FN_TEMPLATE = "background_ID{}.npz"
+
+
+class TPA_Background():
+    """
+    Incremental background model:
+    - "average" ⟵ running mean of all frames seen,
+    - "exponential" ⟵ exponentially decaying average, background += alpha * (frame - background),
+    - "median" ⟵ approximate running median, background moves by step towards each frame.
+    The first frame initializes the background.
+    Foreground masks compare each frame with the background estimated from the previous frames.
+
+    Attributes
+    ----------
+    method : str
+        See BACKGROUND_METHODS.
+    alpha : float
+        Weight of the newest frame ("exponential").
+    step : float
+        Step of the running median [degrees Celsius] ("median").
+    threshold : float
+        Foreground threshold above the background [degrees Celsius].
+    scale : float
+        Factor converting values of frames to degrees Celsius, e.g. tools.TEMPERATURE_SCALE for raw integers.
+    background : np.array
+        Current background [height, width], None before the first frame.
+    n : int
+        Number of frames seen.
+
+    Methods
+    -------
+    update(frame)
+        update with a frame [height, width], returns its foreground mask.
+    process(array, return_backgrounds=False)
+        update with frames [frames, height, width], returns foreground masks (and backgrounds used for each frame).
+    foreground(array)
+        foreground masks of frames against the current background, without updating it.
+    save(fp)
+        save model state, see load() and background_filepath().
+    """
+
+    def __init__(self, method: str = "exponential", alpha: float = BACKGROUND_ALPHA, step: float = BACKGROUND_MEDIAN_STEP, threshold: float = BACKGROUND_THRESHOLD, scale: float = 1.):
+        if method not in BACKGROUND_METHODS:
+            raise ValueError("Unknown background method: {}".format(method))
+        self.method = method
+        self.alpha = alpha
+        self.step = step
+        self.threshold = threshold
+        self.scale = scale
+        self.background = None
+        self.n = 0
+
+    def foreground(self, array) -> np.ndarray:
+        """
+        Parameters
+        ----------
+        array : np.array
+            Frame [height, width] or frames [frames, height, width].
+
+        Returns
+        -------
+        np.array
+            Boolean mask(s) of pixels warmer than the background by more than threshold.
+        """
+        return self._foreground(tools.as_celsius(np.asarray(array), self.scale))
+
+    def _foreground(self, array) -> np.ndarray:
+        if self.background is None:
+            return np.zeros(array.shape, dtype=bool)
+        return (array - self.background) > self.threshold
+
+    def update(self, frame) -> np.ndarray:
+        """
+        Parameters
+        ----------
+        frame : np.array
+            [height, width]
+
+        Returns
+        -------
+        np.array
+            Foreground mask of the frame (before the update).
+        """
+        frame = np.asarray(tools.as_celsius(frame, self.scale, np.float64), dtype=np.float64)
+        mask = self._foreground(frame)
+        if self.background is None:
+            self.background = frame.copy()
+        elif self.method == "average":
+            self.background += (frame - self.background) / (self.n + 1)
+        elif self.method == "exponential":
+            self.background += self.alpha * (frame - self.background)
+        else:
+            self.background += self.step * np.sign(frame - self.background)
+        self.n += 1
+        return mask
+
+    def process(self, array, return_backgrounds: bool = False):
+        """
+        Parameters
+        ----------
+        array : np.array
+            [frames, height, width]
+        return_backgrounds : bool, optional
+            If True backgrounds used for each frame are returned too (float64, same shape as array).
+
+        Returns
+        -------
+        np.array
+            Foreground masks [frames, height, width].
+        np.array, optional
+            Backgrounds [frames, height, width].
+        """
+        data = np.asarray(tools.as_celsius(array, self.scale, np.float64), dtype=np.float64)
+        backgrounds = np.empty_like(data)
+        first = 0
+        if len(data) and (self.background is None):
+            # the first frame is its own background
+            self.background = data[0].copy()
+            self.n += 1
+            backgrounds[0] = data[0]
+            first = 1
+        if len(data) > first:
+            states = self._states(data[first:])
+            backgrounds[first] = self.background
+            backgrounds[first + 1:] = states[:-1]
+            self.background = states[-1].copy()
+            self.n += len(states)
+        masks = (data - backgrounds) > self.threshold
+        if first:
+            masks[0] = False
+        return (masks, backgrounds) if return_backgrounds else masks
+
+    def _states(self, data) -> np.ndarray:
+        """
+        Backgrounds after each frame of data [frames, height, width], vectorized over frames where possible, the state is not modified.
+        """
+        if self.method == "average":
+            counts = self.n + np.arange(1, len(data) + 1, dtype=np.float64).reshape((-1,) + (1,) * (data.ndim - 1))
+            return (np.cumsum(data, axis=0) + self.n * self.background) / counts
+        if self.method == "exponential":
+            from scipy.signal import lfilter
+            a = self.alpha
+            return lfilter([a], [1., a - 1.], data, axis=0, zi=((1. - a) * self.background)[np.newaxis])[0]
+        states = np.empty_like(data)
+        state = self.background.copy()
+        for idx, frame in enumerate(data):
+            state += self.step * np.sign(frame - state)
+            states[idx] = state
+        return states
+
+    def save(self, fp: str) -> bool:
+        """
+        Save the model (parameters and state) to .npz.
+        """
+        tools.ensure_parent_exists(fp)
+        background = self.background if (self.background is not None) else np.zeros(0)
+        np.savez(fp, method=self.method, alpha=self.alpha, step=self.step, threshold=self.threshold, scale=self.scale, background=background, n=self.n)
+        return True
+
+    @classmethod
+    def load(cls, fp: str):
+        """
+        Load a model saved with save().
+        """
+        with np.load(fp) as data:
+            scale = float(data["scale"]) if ("scale" in data.files) else 1.
+            model = cls(str(data["method"]), float(data["alpha"]), float(data["step"]), float(data["threshold"]), scale)
+            model.n = int(data["n"])
+            model.background = data["background"].copy() if model.n else None
+        return model
+
+
+def background_filepath(directory: str, device_id) -> str:
+    """
+    Filepath of the background model of a device (view ID), see BACKGROUND_FN_TEMPLATE.
+    """
+    return os.path.join(directory, BACKGROUND_FN_TEMPLATE.format(device_id))
+
+
+def load_device_background(directory: str, device_id, **kwargs) -> TPA_Background:
+    """
+    Warm-start: load the saved background model of a device, or create a new one (kwargs passed to TPA_Background) if there is none.
+    """
+    fp = background_filepath(directory, device_id)
+    if os.path.exists(fp):
+        return TPA_Background.load(fp)
+    return TPA_Background(**kwargs)
+
+
+def iter_foreground(model: TPA_Background, chunks):
+    """
+    Foreground masks of a stream of chunks [frames, height, width] (or (frames, timestamps) tuples, e.g. tools.iter_tpa_file()),
+    the model is updated with every chunk.
+    """
+    for chunk in chunks:
+        yield model.process(chunk[0] if isinstance(chunk, tuple) else chunk)
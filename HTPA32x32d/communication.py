@@ -8,7 +8,6 @@ import datetime
 import signal
 from pathlib import Path
 import struct
-import cv2
 
 IP_LIST_FP = os.path.join("recording", "settings", "devices.txt")
 HTPA_PORT = 30444
@@ -239,6 +238,7 @@ class Cap(threading.Thread):
 
 class WebCam(threading.Thread):
     def __init__(self, dir_path, T0, height = 480 , width = 640, extension = "jpg"):
+        import cv2
         threading.Thread.__init__(self)
         self.shutdown_flag = threading.Event()
         cam = cv2.VideoCapture(0)
@@ -256,6 +256,7 @@ class WebCam(threading.Thread):
         self.extension = extension
 
     def run(self):
+        import cv2
         print('Thread [camera] #%s started' % self.ident)
         while not self.shutdown_flag.is_set():
                 self._write()
@@ -263,6 +264,7 @@ class WebCam(threading.Thread):
         self.cam.release()
 
     def _write(self):
+        import cv2
         timestamp = time.time() - self.T0
         fp = os.path.join(self.dir_path, "{:.2f}".format(timestamp).replace(".","-") + "." + self.extension)
         ret, frame = self.cam.read()
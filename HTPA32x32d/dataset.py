@@ -1,10 +1,5 @@
 import numpy as np
-import pandas as pd
-import cv2
 import os
-import imageio
-from scipy.spatial.distance import cdist
-import matplotlib.pyplot as plt
 import pickle
 import itertools
 import json
@@ -13,6 +8,8 @@ import collections
 import shutil
 import pickle
 import re
+import bisect
+import concurrent.futures
 
 
 import HTPA32x32d.tools as tools
@@ -26,6 +23,7 @@ TPA_NFO_FN = "tpa.nfo"
 PROCESSED_OK_KEY = "PROCESSED_OK"
 MADE_OK_KEY = "MAKE_OK"
 SYNCHRONIZATION_MAX_ERROR = 0.05
+ALIGNMENT_METHODS = ["nearest", "monotonic"]
 DATASET_POSITIVE_ONE_HOT = np.array([0, 1])
 DATASET_NEGATIVE_ONE_HOT = np.array([1, 0])
 
@@ -35,11 +33,12 @@ class _TPA_Sample():
     Use TPA_Sample_from_filepaths or TPA_Sample_from_data that inherit from this class.
     """
 
-    def __init__(self, filepaths, ids, arrays, timestamps):
+    def __init__(self, filepaths, ids, arrays, timestamps, scale=1.):
         self.filepaths = filepaths
         self.ids = ids
         self.arrays = arrays
         self.timestamps = timestamps
+        self.scale = scale
 
     def test_alignment(self):
         lengths = [len(ts) for ts in self.timestamps]
@@ -60,13 +59,12 @@ class _TPA_Sample():
         if not self.test_alignment():
             raise Exception("Unaligned sequences cannot be synchronized!")
         data = np.concatenate(self.arrays, axis=2)
-        pc = tools.np2pc(data)
         ts = np.sum(self.timestamps, axis=0)/len(self.timestamps)
         duration = tools.timestamps2frame_durations(ts)
         head, tail = os.path.split(self.filepaths[0])
         fn = _TPA_get_file_prefix(tail) + "ID" + "-".join(self.ids) + ".gif"
         fp = os.path.join(head, fn)
-        tools.write_pc2gif(pc, fp, duration=duration)
+        tools.write_np2gif(fp, data, duration=duration, pseudocolor=tools.Pseudocolor(scale=self.scale))
 
 
 class TPA_Sample_from_filepaths(_TPA_Sample):
@@ -83,6 +81,8 @@ class TPA_Sample_from_filepaths(_TPA_Sample):
         List of arrays (TPA sequences [frames, height, width]).
     timestamps : list
         List of lists of timestamps corresponding to each timestep.
+    scale : float
+        Factor converting array values to degrees Celsius, tools.TEMPERATURE_SCALE if loaded with dtype tools.RAW_DTYPE.
 
     Methods
     -------
@@ -92,12 +92,29 @@ class TPA_Sample_from_filepaths(_TPA_Sample):
         returns True if arrays are the same length. 
     """
 
-    def __init__(self, filepaths):
+    def __init__(self, filepaths, t_start=None, t_end=None, dtype=None, workers=1, executor=None, cache=False):
+        """
+        Parameters
+        ----------
+        filepaths : list
+            Filepaths of views.
+        t_start, t_end : float, optional
+            Load only frames with timestamps in [t_start, t_end], see tools.read_tpa_file().
+        dtype : str, optional
+            E.g. tools.RAW_DTYPE to keep raw int16 values (half the memory), see tools.read_tpa_file().
+        workers : int, optional
+            Number of views loaded concurrently (serially by default, None for one per view), see tools.read_tpa_files().
+        executor : concurrent.futures.Executor, optional
+            Open pool to load views in, see tools.read_tpa_files().
+        cache : bool, optional
+            Reuse recordings already loaded in this process, arrays are then read-only views, see tools.read_tpa_file().
+        """
         ids = [self._read_ID(fp) for fp in filepaths]
-        samples = [tools.read_tpa_file(fp) for fp in filepaths]
+        samples = tools.read_tpa_files(filepaths, workers=workers, t_start=t_start, t_end=t_end, dtype=dtype, executor=executor, cache=cache)
         arrays = [sample[0] for sample in samples]
         timestamps = [sample[1] for sample in samples]
-        _TPA_Sample.__init__(self, filepaths, ids, arrays, timestamps)
+        raw = (dtype is not None) and (np.dtype(dtype) == tools.RAW_DTYPE)
+        _TPA_Sample.__init__(self, filepaths, ids, arrays, timestamps, tools.TEMPERATURE_SCALE if raw else 1.)
 
     def _read_ID(self, filepath):
         fn = os.path.basename(filepath)
@@ -119,7 +136,7 @@ class TPA_Sample_from_filepaths(_TPA_Sample):
             "Use TPA_Sample_from_data if you need to modify arrays.")
 
     def get_header(self):
-        return tools.read_txt_header(self.filepaths[0])
+        return tools.read_tpa_header(self.filepaths[0])
 
 
 class TPA_Sample_from_data(_TPA_Sample):
@@ -133,14 +150,26 @@ class TPA_Sample_from_data(_TPA_Sample):
     arrays : list
         List of arrays (TPA sequences [frames, height, width]).
     timestamps : list
-        List of lists of timestamps corresponding to each timestep.
+        List of timestamps (float64 arrays) corresponding to each timestep.
     filepaths : list, optional
         Filepaths to write arrays to when using write().
+    scale : float
+        Factor converting array values to degrees Celsius, e.g. tools.TEMPERATURE_SCALE for raw integers (tools.RAW_DTYPE),
+        used by write(), write_gif() and resample_uniform().
+
+    Timesteps selected by alignment are kept as index arrays over the original arrays,
+    arrays are materialized only when accessed through self.arrays or written.
 
     Methods
     -------
     align_timesteps(reset_T0 = False)
         align arrays in time, refer to match_timesteps in this module for details.
+    select_timesteps(indices)
+        keep timesteps given by index arrays, arrays are not copied.
+    get_array(idx)
+        array of a view with selected timesteps applied.
+    resample_uniform(fps, method = "linear")
+        resample arrays onto a uniform time grid, refer to resample_uniform in tools module for details.
     write()
         write arrays stored in self.arrays to filepaths in self.filepaths.
     test_synchronization(max_error)
@@ -149,16 +178,62 @@ class TPA_Sample_from_data(_TPA_Sample):
         returns True if arrays are the same length. 
     """
 
-    def __init__(self, arrays, timestamps, ids, output_filepaths=None, header=None):
+    def __init__(self, arrays, timestamps, ids, output_filepaths=None, header=None, scale=1.):
         filepaths = None
         ids = ids.copy()
-        arrays = arrays.copy()
-        timestamps = timestamps.copy()
+        timestamps = [np.asarray(ts, dtype=np.float64) for ts in timestamps]
         self.header = header
-        _TPA_Sample.__init__(self, filepaths, ids, arrays, timestamps)
+        _TPA_Sample.__init__(self, filepaths, ids, arrays, timestamps, scale)
         if output_filepaths:
             self.filepaths = output_filepaths
 
+    @property
+    def arrays(self):
+        for i, indices in enumerate(self._indices):
+            if indices is not None:
+                self._arrays[i] = self.get_array(i)
+                self._indices[i] = None
+        return self._arrays
+
+    @arrays.setter
+    def arrays(self, arrays):
+        self._arrays = list(arrays)
+        self._indices = [None] * len(self._arrays)
+
+    def get_array(self, idx):
+        """
+        Array of a view with selected timesteps applied, not stored.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the view.
+
+        Returns
+        -------
+        np.array
+            [frames, height, width]
+        """
+        indices = self._indices[idx]
+        return self._arrays[idx] if (indices is None) else self._arrays[idx][indices]
+
+    def select_timesteps(self, indices):
+        """
+        Keep timesteps given by index arrays (one for each view), 
+        indices are composed with previous selections and arrays are not copied.
+
+        Parameters
+        ----------
+        indices : list
+            Index arrays, or slices, of timesteps for each view.
+        """
+        for i, ids in enumerate(indices):
+            ids = np.arange(len(self.timestamps[i]))[ids] if isinstance(ids, slice) else np.asarray(ids, dtype=np.int64)
+            previous = self._indices[i]
+            self._indices[i] = ids if (previous is None) else previous[ids]
+            self.timestamps[i] = self.timestamps[i][ids]
+        return True
+
     def make_filepaths(self, parent_dir, prefix, extension):
         self.filepaths = [os.path.join(
             parent_dir, prefix+"ID"+id+"."+extension) for id in self.ids]
@@ -169,37 +244,246 @@ class TPA_Sample_from_data(_TPA_Sample):
         """
         assert self.filepaths
         if self.header:
-            assert (tools.get_extension(self.filepaths[0]).lower() == 'txt')
-        for fp, array, ts in zip(self.filepaths, self.arrays, self.timestamps):
-            tools.write_tpa_file(fp, array, ts, header=self.header)
+            assert (tools.get_reader(self.filepaths[0]) in tools.HEADER_READERS)
+        for i, (fp, ts) in enumerate(zip(self.filepaths, self.timestamps)):
+            tools.write_tpa_file(fp, self.get_array(i), ts, header=self.header, scale=self.scale)
         return True
 
-    def align_timesteps(self, reset_T0=False):
+    def align_timesteps(self, reset_T0=False, method="nearest", **kwargs):
         """
-        Align timesteps. Refer to match_timesteps() in this module for details.
+        Align timesteps. Refer to match_timesteps() and match_timesteps_monotonic() in tools module for details.
 
         Parameters
         ----------
         reset_T0 : bool, optional
             If True delay of the inital frame will be removed from timestamps
+        method : str, optional
+            "nearest" (frames can be repeated or skipped) or "monotonic" (one-to-one, no repeated frames), see ALIGNMENT_METHODS.
+        kwargs
+            Passed to the matching function, e.g. criterion or band for "monotonic".
         """
-        indexes = tools.match_timesteps(*self.timestamps)
-        for i in range(len(self.ids)):
-            self.arrays[i] = self.arrays[i][indexes[i]]
-            timestamps = np.array(self.timestamps[i])[indexes[i]]
-            self.timestamps[i] = list(timestamps)
+        indexes = _match_timesteps(self.timestamps, method, **kwargs)
+        self.select_timesteps(indexes)
         if reset_T0:
             sample_T0_min = np.min([ts[0] for ts in self.timestamps])
-            timestamps = [np.array(ts)-sample_T0_min for ts in self.timestamps]
-            self.timestamps = timestamps
+            self.timestamps = [ts - sample_T0_min for ts in self.timestamps]
         return True
 
+    def resample_uniform(self, fps, method="linear", **kwargs):
+        """
+        Resample all views onto one uniform time grid at a target frame rate, spanning the time range covered by all views.
+        Refer to resample_uniform() in tools module for details.
+
+        Parameters
+        ----------
+        fps : float
+            Target frame rate.
+        method : str, optional
+            "nearest", "linear" or "cubic", see tools.RESAMPLING_METHODS.
+        kwargs
+            Passed to tools.resample_uniform(), e.g. max_gap or fill_value.
+
+        Returns
+        -------
+        list
+            Masks of valid frames for each view (invalid frames are filled with fill_value).
+            Resampled arrays are in degrees Celsius (scale is reset to 1).
+        """
+        t_start = max(ts[0] for ts in self.timestamps)
+        t_end = min(ts[-1] for ts in self.timestamps)
+        valid_masks = []
+        for i in range(len(self.ids)):
+            array, grid, valid = tools.resample_uniform(
+                self.get_array(i), self.timestamps[i], fps, method, t_start=t_start, t_end=t_end, scale=self.scale, **kwargs)
+            self._arrays[i], self._indices[i] = array, None
+            self.timestamps[i] = grid
+            valid_masks.append(valid)
+        self.scale = 1.
+        return valid_masks
+
+
+class TPA_Stream_Synchronizer():
+    """
+    Online synchronization of multi-view frame streams (TPA views and optionally RGB).
+    Each frame of the reference view is bundled with the nearest frame (by timestamp) of each other view,
+    same as match_timesteps() does offline with the reference being the shortest sequence.
+    A bundle is emitted as soon as every other view received a frame at or after the reference timestamp,
+    or, if a view falls behind, when the newest received timestamp exceeds the reference timestamp by max_latency.
+    Bundles with any time error above max_error are dropped.
+    Timestamps of each view must be increasing.
+
+    Attributes
+    ----------
+    ids : list
+        View IDs (e.g. ["121", "122", "123", "RGB"]), bundles follow this order.
+    reference_id : str
+        View whose frames define bundle timesteps.
+    max_error : float
+        Maximum time error in a bundle [s], SYNCHRONIZATION_MAX_ERROR by default.
+    max_latency : float
+        Maximum time [s] a reference frame waits for other views.
+    max_buffer : int
+        Maximum number of frames buffered per view, oldest frames are dropped.
+    stats : dict
+        Counters: "emitted", "unsynchronized" (dropped bundles), "lagging" (forced decisions) and
+        "overflow", "out_of_order" (dropped frames) per view.
+
+    Methods
+    -------
+    push(view_id, frame, timestamp)
+        add a frame, returns a list of bundles ready, bundle is a tuple (frames, timestamps).
+    flush()
+        decide all buffered reference frames (end of streams), returns a list of bundles.
+    lagging_views()
+        IDs of views behind the newest received timestamp by more than max_latency.
+    """
+
+    def __init__(self, ids, reference_id=None, max_error=None, max_latency=1., max_buffer=256):
+        self.ids = list(ids)
+        self.reference_id = self.ids[0] if (reference_id is None) else reference_id
+        assert self.reference_id in self.ids
+        self.max_error = SYNCHRONIZATION_MAX_ERROR if (max_error is None) else max_error
+        self.max_latency = max_latency
+        self.max_buffer = max_buffer
+        self._timestamps = {view_id: [] for view_id in self.ids}
+        self._frames = {view_id: [] for view_id in self.ids}
+        self._newest = {view_id: None for view_id in self.ids}
+        self.stats = {"emitted": 0, "unsynchronized": 0,
+                      "lagging": {view_id: 0 for view_id in self.ids},
+                      "overflow": {view_id: 0 for view_id in self.ids},
+                      "out_of_order": {view_id: 0 for view_id in self.ids}}
+
+    def push(self, view_id, frame, timestamp):
+        """
+        Add a frame of view_id.
+
+        Returns
+        -------
+        list
+            Synchronized bundles (frames, timestamps) that became ready, in order of ids.
+        """
+        if (self._newest[view_id] is not None) and (timestamp <= self._newest[view_id]):
+            self.stats["out_of_order"][view_id] += 1
+            return []
+        self._newest[view_id] = timestamp
+        self._timestamps[view_id].append(timestamp)
+        self._frames[view_id].append(frame)
+        if len(self._timestamps[view_id]) > self.max_buffer:
+            del self._timestamps[view_id][0]
+            del self._frames[view_id][0]
+            self.stats["overflow"][view_id] += 1
+        return self._process()
+
+    def flush(self):
+        """
+        Decide all buffered reference frames with frames received so far (e.g. at the end of streams).
+
+        Returns
+        -------
+        list
+            Synchronized bundles (frames, timestamps).
+        """
+        return self._process(force=True)
+
+    def lagging_views(self):
+        """
+        IDs of views whose newest frame is older than the newest frame of all views by more than max_latency.
+        """
+        newest = self._newest_timestamp()
+        if newest is None:
+            return []
+        return [view_id for view_id in self.ids
+                if (self._newest[view_id] is None) or (newest - self._newest[view_id] > self.max_latency)]
+
+    def _newest_timestamp(self):
+        received = [ts for ts in self._newest.values() if ts is not None]
+        return max(received) if received else None
+
+    def _nearest(self, view_id, timestamp, force):
+        """
+        Index of the nearest buffered frame, None if undecided yet, -1 if there are no frames.
+        """
+        timestamps = self._timestamps[view_id]
+        right = bisect.bisect_left(timestamps, timestamp)
+        if right == len(timestamps):
+            if not force:
+                return None
+            return right - 1
+        if right == 0:
+            return right
+        # ties resolve to the earlier frame, same as match_timesteps()
+        if abs(timestamp - timestamps[right]) < abs(timestamp - timestamps[right - 1]):
+            return right
+        return right - 1
+
+    def _process(self, force=False):
+        bundles = []
+        newest = self._newest_timestamp()
+        reference_timestamps = self._timestamps[self.reference_id]
+        while reference_timestamps:
+            reference_timestamp = reference_timestamps[0]
+            forced = force or (newest - reference_timestamp > self.max_latency)
+            indices = {}
+            for view_id in self.ids:
+                if view_id == self.reference_id:
+                    continue
+                indices[view_id] = self._nearest(view_id, reference_timestamp, forced)
+                if indices[view_id] is None:
+                    break
+            if None in indices.values():
+                break
+            frames, timestamps = [], []
+            for view_id in self.ids:
+                if view_id == self.reference_id:
+                    frames.append(self._frames[view_id][0])
+                    timestamps.append(reference_timestamp)
+                elif indices[view_id] >= 0:
+                    frames.append(self._frames[view_id][indices[view_id]])
+                    timestamps.append(self._timestamps[view_id][indices[view_id]])
+                    if reference_timestamp > self._timestamps[view_id][-1]:
+                        self.stats["lagging"][view_id] += 1
+                else:
+                    frames.append(None)
+                    timestamps.append(None)
+                    self.stats["lagging"][view_id] += 1
+            del reference_timestamps[0]
+            del self._frames[self.reference_id][0]
+            # frames before the chosen one can not be nearest to later reference frames
+            for view_id, idx in indices.items():
+                if idx > 0:
+                    del self._timestamps[view_id][:idx]
+                    del self._frames[view_id][:idx]
+            if (None in timestamps) or (max(abs(ts - reference_timestamp) for ts in timestamps) > self.max_error):
+                self.stats["unsynchronized"] += 1
+                continue
+            self.stats["emitted"] += 1
+            bundles.append((frames, timestamps))
+        return bundles
+
+
+def _match_timesteps(timestamps, method="nearest", **kwargs):
+    if method == "nearest":
+        return tools.match_timesteps(*timestamps, **kwargs)
+    if method == "monotonic":
+        return tools.match_timesteps_monotonic(*timestamps, **kwargs)
+    raise ValueError("Unknown alignment method {}, use one of {}".format(method, ALIGNMENT_METHODS))
+
 
 def _TPA_get_file_prefix(filepath):
     name = tools.remove_extension(os.path.basename(filepath))
     return name.split("ID")[0]
 
 
+def _copy_tpa_file(src, dst):
+    # some formats (e.g. npyd) are directories
+    if os.path.isdir(src):
+        if os.path.exists(dst):
+            shutil.rmtree(dst)
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+
 class _TPA_File_Manager():
     """
     TPA_Preparer and TPA_Dataset_Maker inherit from this class.
@@ -282,6 +566,7 @@ class _Preparer(_TPA_File_Manager):
         _TPA_File_Manager.__init__(self, reset_log)
         self._json_required_keys = ["raw_input_dir", "processed_destination_dir", "view_IDs",
                                     "tpas_extension", "MAKE", "PREPARE"]
+        self.failed_prefixes = {}
 
     def generate_config_template(self, output_json_filepath):
         self._generate_config_template(
@@ -300,6 +585,10 @@ class _Preparer(_TPA_File_Manager):
             self.visualize = bool(self._json['VISUALIZE'])
         except KeyError:
             self.visualize = False
+        try:
+            self.cache = bool(self._json['CACHE'])
+        except KeyError:
+            self.cache = False
         try:
             self.undistort = bool(self._json['UNDISTORT'])
         except KeyError:
@@ -312,9 +601,55 @@ class _Preparer(_TPA_File_Manager):
             self.vis_order = self._json['vis_order']
         except KeyError:
             self.vis_order = None
+        try:
+            self.alignment = self._json['ALIGNMENT']
+        except KeyError:
+            self.alignment = "nearest"
+        assert self.alignment in ALIGNMENT_METHODS
+        try:
+            self.workers = int(self._json['WORKERS'])
+        except KeyError:
+            self.workers = 1
         self.configured = True
         return True
 
+    def _view_workers(self, workers, prefixes_n):
+        """
+        Number of views read at once by each prefix job: 1 in serial mode (a single process), 
+        otherwise the workers left over by the pool of prefixes (os.cpu_count() if workers is 0).
+        """
+        workers = self.workers if (workers is None) else workers
+        if workers == 1:
+            return 1
+        workers = workers or os.cpu_count() or 1
+        return max(1, workers // max(prefixes_n, 1))
+
+    def _run_prefix_jobs(self, job, jobs, workers):
+        """
+        Run per-prefix jobs serially or in a process pool, logs of each prefix are written in the order of jobs.
+        Returns results of jobs, raises an exception listing failed prefixes after all jobs are done.
+        """
+        workers = self.workers if (workers is None) else workers
+        workers = workers or os.cpu_count() or 1
+        if (workers == 1) or (len(jobs) < 2):
+            results = list(map(job, jobs))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(min(workers, len(jobs)), initializer=tools.disable_read_cache) as executor:
+                results = list(executor.map(job, jobs))
+        self.failed_prefixes = {}
+        for prefix_job, (logs, error, result) in zip(jobs, results):
+            for log_msg in logs:
+                self._log(log_msg)
+            if error:
+                self._log(error)
+                self.failed_prefixes[prefix_job[0]] = error
+        if self.failed_prefixes:
+            msg = "[ERROR] {} prefixes failed: {}".format(
+                len(self.failed_prefixes), ", ".join(self.failed_prefixes))
+            self._log(msg)
+            raise Exception(msg)
+        return [result for _, _, result in results]
+
     def _write_nfo(self):
         filepath = os.path.join(self.processed_destination_dir, TPA_NFO_FN)
         data = {PROCESSED_OK_KEY: 1}
@@ -349,6 +684,35 @@ class _Preparer(_TPA_File_Manager):
         dataset_maker.generate_config_template(filepath, fill_dict)
 
 
+def _prepare_tpa_prefix(job):
+    """
+    Read, align and write views of one prefix, see TPA_Preparer.prepare().
+    Returns (log messages, error message or None, None).
+    """
+    prefix, raw_input_dir, processed_destination_dir, view_IDs, tpas_extension, alignment, max_error, visualize, workers, cache = job
+    try:
+        raw_fp_prefix = os.path.join(raw_input_dir, prefix)
+        processed_fp_prefix = os.path.join(
+            processed_destination_dir, prefix)
+        raw_fps = [raw_fp_prefix + "ID" + view_id + "." +
+                   tpas_extension for view_id in view_IDs]
+        processed_fps = [processed_fp_prefix + "ID" + view_id +
+                         "." + tpas_extension for view_id in view_IDs]
+        raw_sample = TPA_Sample_from_filepaths(raw_fps, workers=workers, cache=cache)
+        processed_sample = TPA_Sample_from_data(
+            raw_sample.arrays, raw_sample.timestamps, raw_sample.ids, processed_fps)
+        processed_sample.align_timesteps(reset_T0=True, method=alignment)
+        if not processed_sample.test_synchronization(max_error=max_error):
+            return [], "[ERROR] {} did not pass synchronization test (max error {} s exceeded)!".format(
+                prefix, max_error), None
+        processed_sample.write()
+        if visualize:
+            processed_sample.write_gif()
+    except Exception as e:
+        return [], "[ERROR] {} failed: {}: {}".format(prefix, type(e).__name__, e), None
+    return [], None, None
+
+
 class TPA_Preparer(_Preparer):
     """
     Prepare files by processing raw samples (frame alignment) and generating a label file to be 
@@ -380,6 +744,9 @@ class TPA_Preparer(_Preparer):
         and passed to config()
     config()
         Configure #TODO FINISH DOCS
+    prepare(workers=None)
+        Process prefixes, in parallel processes if workers (or "WORKERS" in config) is not 1 (0: os.cpu_count()).
+        Failed prefixes are collected in failed_prefixes and reported after all prefixes are processed.
     
     """
 
@@ -393,7 +760,7 @@ class TPA_Preparer(_Preparer):
                 "[WARNING] UNDISTORT and calib_fp not supported in TPA_Preparer")
         return True
 
-    def prepare(self):
+    def prepare(self, workers=None, cache=None):
         if not self.configured:
             msg = "Configure with config() first"
             self._log(msg)
@@ -409,7 +776,7 @@ class TPA_Preparer(_Preparer):
         for pattern in glob_patterns:
             files.extend(glob.glob(pattern))
         prefixes = [_TPA_get_file_prefix(f) for f in files]
-        prefixes2process = list(set(prefixes))
+        prefixes2process = sorted(set(prefixes))
         prefixes2process_number0 = len(prefixes2process)
         # filter out samples that miss views
         prefixes2process = self._remove_missing_views(
@@ -419,29 +786,14 @@ class TPA_Preparer(_Preparer):
         self._log("[INFO] {} prefixes ignored out of initial {}".format(
             prefixes_ignored, prefixes2process_number0))
         self._log('"VISUALIZE" set to {}'.format(self.visualize))
+        self._log('"ALIGNMENT" set to {}'.format(self.alignment))
+        cache = self.cache if (cache is None) else cache
+        self._log('"CACHE" set to {}'.format(cache))
         self._log("Reading, aligning and removing T0 from samples...")
-        QUIT = False
-        for prefix in prefixes2process:
-            raw_fp_prefix = os.path.join(self.raw_input_dir, prefix)
-            processed_fp_prefix = os.path.join(
-                self.processed_destination_dir, prefix)
-            raw_fps = [raw_fp_prefix + "ID" + view_id + "." +
-                       self.tpas_extension for view_id in self.view_IDs]
-            processed_fps = [processed_fp_prefix + "ID" + view_id +
-                             "." + self.tpas_extension for view_id in self.view_IDs]
-            raw_sample = TPA_Sample_from_filepaths(raw_fps)
-            processed_sample = TPA_Sample_from_data(
-                raw_sample.arrays, raw_sample.timestamps, raw_sample.ids, processed_fps)
-            processed_sample.align_timesteps(reset_T0=True)
-            if not processed_sample.test_synchronization(max_error=SYNCHRONIZATION_MAX_ERROR):
-                QUIT = True
-                self._log("[ERROR] {} did not pass synchronization test (max error {} s exceeded)!".format(
-                    prefix, SYNCHRONIZATION_MAX_ERROR))
-                continue
-            processed_sample.write()
-            if self.visualize:
-                processed_sample.write_gif()
-        assert not QUIT
+        view_workers = self._view_workers(workers, len(prefixes2process))
+        jobs = [(prefix, self.raw_input_dir, self.processed_destination_dir, self.view_IDs, self.tpas_extension,
+                 self.alignment, SYNCHRONIZATION_MAX_ERROR, self.visualize, view_workers, cache) for prefix in prefixes2process]
+        self._run_prefix_jobs(_prepare_tpa_prefix, jobs, workers)
         self._write_nfo()
         self._write_labels_file(prefixes2process)
         self._write_make_file()
@@ -590,7 +942,7 @@ class TPA_Dataset_Maker(_Dataset_Maker):
         self._log("[INFO] Copying files...")
         for src_tuple, dst_tuple in zip(fps2copy, fps2output):
             for src, dst in zip(src_tuple, dst_tuple):
-                shutil.copy2(src, dst)
+                _copy_tpa_file(src, dst)
         self._log("Writing nfo, labels and json files...")
         self._write_nfo()
         self._copy_labels_file()
@@ -640,6 +992,7 @@ class _TPA_RGB_Sample():
 
         vis_order - preferred order, 
         """
+        import cv2
         if not self.test_alignment():
             raise Exception("Unaligned sequences cannot be synchronized!")
         if vis_order:
@@ -707,8 +1060,8 @@ class TPA_RGB_Sample_from_filepaths(_TPA_RGB_Sample):
     #TODO
     """
 
-    def __init__(self, tpa_filepaths, rgb_directory):
-        TPA = TPA_Sample_from_filepaths(tpa_filepaths)
+    def __init__(self, tpa_filepaths, rgb_directory, workers=1, executor=None, cache=False):
+        TPA = TPA_Sample_from_filepaths(tpa_filepaths, workers=workers, executor=executor, cache=cache)
         RGB = RGB_Sample_from_filepaths(rgb_directory)
         _TPA_RGB_Sample.__init__(self, TPA, RGB)
         if os.path.exists(os.path.join(rgb_directory, "label.txt")):
@@ -717,7 +1070,7 @@ class TPA_RGB_Sample_from_filepaths(_TPA_RGB_Sample):
             self.label = int(data.strip())
 
     def get_header(self):
-        return tools.read_txt_header(self.TPA.filepaths[0])
+        return tools.read_tpa_header(self.TPA.filepaths[0])
 
     def write(self):
         """
@@ -741,9 +1094,9 @@ class TPA_RGB_Sample_from_data(_TPA_RGB_Sample):
     RGB is from filepaths
     """
 
-    def __init__(self, tpa_arrays, tpa_timestamps, tpa_ids, rgb_directory, tpa_output_filepaths=None, rgb_output_directory=None, header=None):
+    def __init__(self, tpa_arrays, tpa_timestamps, tpa_ids, rgb_directory, tpa_output_filepaths=None, rgb_output_directory=None, header=None, scale=1.):
         TPA = TPA_Sample_from_data(
-            tpa_arrays, tpa_timestamps, tpa_ids, tpa_output_filepaths, header=header)
+            tpa_arrays, tpa_timestamps, tpa_ids, tpa_output_filepaths, header=header, scale=scale)
         RGB = RGB_Sample_from_filepaths(rgb_directory)
         self.rgb_output_directory = rgb_output_directory
         _TPA_RGB_Sample.__init__(self, TPA, RGB)
@@ -779,23 +1132,24 @@ class TPA_RGB_Sample_from_data(_TPA_RGB_Sample):
             f.write(str(["{}: {}".format(i, fp)
                          for i, fp in enumerate(dst_filepaths)]))
 
-    def align_timesteps(self, reset_T0=False):
+    def align_timesteps(self, reset_T0=False, method="nearest", **kwargs):
         """
-        Align timesteps. Refer to match_timesteps() in this module for details.
+        Align timesteps. Refer to match_timesteps() and match_timesteps_monotonic() in tools module for details.
 
         Parameters
         ----------
         reset_T0 : bool, optional
             If True delay of the inital frame will be removed from timestamps
+        method : str, optional
+            "nearest" (frames can be repeated or skipped) or "monotonic" (one-to-one, no repeated frames), see ALIGNMENT_METHODS.
+        kwargs
+            Passed to the matching function, e.g. criterion or band for "monotonic".
         """
-        indexes = tools.match_timesteps(*self._TPA_RGB_timestamps)
+        indexes = _match_timesteps(self._TPA_RGB_timestamps, method, **kwargs)
         #TPA
-        for i in range(len(self.TPA.ids)):
-            self.TPA.arrays[i] = self.TPA.arrays[i][indexes[i]]
-            timestamps = np.array(self.TPA.timestamps[i])[indexes[i]]
-            self.TPA.timestamps[i] = list(timestamps)
+        i = len(self.TPA.ids)
+        self.TPA.select_timesteps(indexes[:i])
         #RGB
-        i += 1
         self.RGB.timestamps = list(np.array(self.RGB.timestamps)[indexes[i]])
         self.RGB.filepaths = list(np.array(self.RGB.filepaths)[indexes[i]])
         #update timestamps
@@ -854,6 +1208,7 @@ def _unpack_calib_pkl(fp: str) -> list:
 
 class _Undistorter():
     def __init__(self, mtx, dist, width, height):
+        import cv2
         newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
             mtx, dist, (width, height), 1, (width, height))
         self.mtx = mtx
@@ -861,9 +1216,55 @@ class _Undistorter():
         self.newcameramtx, self.roi = newcameramtx, roi
 
     def undistort(self, img):
+        import cv2
         return cv2.undistort(img, self.mtx, self.dist, None, self.newcameramtx)
 
 
+def _prepare_tpa_rgb_prefix(job):
+    """
+    Read, align and write views and RGB frames of one prefix (undistorted if calib is given), see TPA_RGB_Preparer.prepare().
+    Returns (log messages, error message or None, True if the sample is negative).
+    """
+    import cv2
+    prefix, raw_input_dir, processed_destination_dir, view_IDs, tpas_extension, alignment, max_error, visualize, vis_order, calib, workers, cache = job
+    logs = []
+    try:
+        raw_fp_prefix = os.path.join(raw_input_dir, prefix)
+        logs.append("Processing {}...".format(raw_fp_prefix))
+        processed_fp_prefix = os.path.join(
+            processed_destination_dir, prefix)
+        tpa_fps = [raw_fp_prefix + "ID" + view_id + "." +
+                   tpas_extension for view_id in view_IDs]
+        processed_fps = [processed_fp_prefix + "ID" + view_id +
+                         "." + tpas_extension for view_id in view_IDs]
+        rgb_dir = os.path.join(raw_input_dir, prefix + "ID" + "RGB")
+        processed_rgb_dir = os.path.join(
+            processed_destination_dir, prefix + "ID" + "RGB")
+        raw_sample = TPA_RGB_Sample_from_filepaths(tpa_fps, rgb_dir, workers=workers, cache=cache)
+        header = raw_sample.get_header()
+        processed_sample = TPA_RGB_Sample_from_data(raw_sample.TPA.arrays, raw_sample.TPA.timestamps, raw_sample.TPA.ids,
+                                                    rgb_dir, tpa_output_filepaths=processed_fps, rgb_output_directory=processed_rgb_dir, header=header)
+        processed_sample.align_timesteps(reset_T0=True, method=alignment)
+        if not processed_sample.test_synchronization(max_error=max_error):
+            return logs, "[ERROR] {} did not pass synchronization test (max error {} s exceeded)!".format(
+                prefix, max_error), False
+        negative = (header.split(",")[-1] == "neg")
+        processed_sample.write()
+        if visualize:
+            processed_sample.write_gif(vis_order=vis_order)
+        if calib:
+            undistorter = _Undistorter(*calib)
+            img_fps = glob.glob(os.path.join(
+                processed_rgb_dir, "*." + tools.HTPA_UDP_MODULE_WEBCAM_IMG_EXT))
+            for img_fp in img_fps:
+                img = cv2.imread(img_fp)
+                cv2.imwrite(img_fp, undistorter.undistort(img))
+        logs.append("Processed {}.".format(raw_fp_prefix))
+    except Exception as e:
+        return logs, "[ERROR] {} failed: {}: {}".format(prefix, type(e).__name__, e), False
+    return logs, None, negative
+
+
 class TPA_RGB_Preparer(_Preparer):
     """
     Prepare files by processing raw samples (frame alignment) and generating a label file to be 
@@ -895,6 +1296,9 @@ class TPA_RGB_Preparer(_Preparer):
         and passed to config()
     config()
         Configure #TODO FINISH DOCS
+    prepare(workers=None)
+        Process prefixes, in parallel processes if workers (or "WORKERS" in config) is not 1 (0: os.cpu_count()).
+        Failed prefixes are collected in failed_prefixes and reported after all prefixes are processed.
     
     """
 
@@ -903,8 +1307,8 @@ class TPA_RGB_Preparer(_Preparer):
 
     def config(self, json_filepath):
         self._config(json_filepath)
-        if (self.tpas_extension.lower() != 'txt'):
-            msg = "[ERROR] Only .txt supported!"
+        if (tools.READERS_EXTENSIONS_DICT.get(self.tpas_extension.lower()) not in tools.HEADER_READERS):
+            msg = "[ERROR] Only formats that store headers supported: {}!".format(tools.HEADER_READERS)
             raise Exception(msg)
         lowercase_ids = [id.lower() for id in self.view_IDs]
         if 'rgb' in lowercase_ids:
@@ -918,7 +1322,7 @@ class TPA_RGB_Preparer(_Preparer):
             raise Exception(msg)
         return True
 
-    def prepare(self):
+    def prepare(self, workers=None, cache=None):
         if not self.configured:
             msg = "Configure with config() first"
             self._log(msg)
@@ -934,7 +1338,7 @@ class TPA_RGB_Preparer(_Preparer):
         for pattern in glob_patterns:
             files.extend(glob.glob(pattern))
         prefixes = [_TPA_get_file_prefix(f) for f in files]
-        prefixes2process = list(set(prefixes))
+        prefixes2process = sorted(set(prefixes))
         prefixes2process_number0 = len(prefixes2process)
         # filter out samples that miss views
         prefixes2process = self._remove_missing_views(
@@ -946,47 +1350,19 @@ class TPA_RGB_Preparer(_Preparer):
         self._log("[INFO] {} prefixes ignored out of initial {}".format(
             prefixes_ignored, prefixes2process_number0))
         self._log('"UNDISTORT" set to {}'.format(self.undistort))
+        self._log('"ALIGNMENT" set to {}'.format(self.alignment))
+        cache = self.cache if (cache is None) else cache
+        self._log('"CACHE" set to {}'.format(cache))
         self._log("Reading, aligning and removing T0 from samples...")
-        QUIT = False
+        calib = None
         if self.undistort:
             mtx, dist, width, height, _ = _unpack_calib_pkl(self.calib_fp)
-            self._undistorter = _Undistorter(mtx, dist, width, height)
-        negative_samples_dict = {}
-        for prefix in prefixes2process:
-            raw_fp_prefix = os.path.join(self.raw_input_dir, prefix)
-            self._log("Processing {}...".format(raw_fp_prefix))
-            processed_fp_prefix = os.path.join(
-                self.processed_destination_dir, prefix)
-            tpa_fps = [raw_fp_prefix + "ID" + view_id + "." +
-                       self.tpas_extension for view_id in self.view_IDs]
-            processed_fps = [processed_fp_prefix + "ID" + view_id +
-                             "." + self.tpas_extension for view_id in self.view_IDs]
-            rgb_dir = os.path.join(self.raw_input_dir, prefix + "ID" + "RGB")
-            processed_rgb_dir = os.path.join(
-                self.processed_destination_dir, prefix + "ID" + "RGB")
-            raw_sample = TPA_RGB_Sample_from_filepaths(tpa_fps, rgb_dir)
-            header = raw_sample.get_header()
-            processed_sample = TPA_RGB_Sample_from_data(raw_sample.TPA.arrays, raw_sample.TPA.timestamps, raw_sample.TPA.ids,
-                                                        rgb_dir, tpa_output_filepaths=processed_fps, rgb_output_directory=processed_rgb_dir, header=header)
-            processed_sample.align_timesteps(reset_T0=True)
-            if not processed_sample.test_synchronization(max_error=SYNCHRONIZATION_MAX_ERROR):
-                QUIT = True
-                self._log("[ERROR] {} did not pass synchronization test (max error {} s exceeded)!".format(
-                    prefix, SYNCHRONIZATION_MAX_ERROR))
-                continue    
-            if header.split(",")[-1] == "neg":
-                negative_samples_dict[prefix] = int(-1)
-            processed_sample.write()
-            if self.visualize:
-                processed_sample.write_gif(vis_order=self.vis_order)
-            if self.undistort:
-                img_fps = glob.glob(os.path.join(
-                    processed_rgb_dir, "*." + tools.HTPA_UDP_MODULE_WEBCAM_IMG_EXT))
-                for img_fp in img_fps:
-                    img = cv2.imread(img_fp)
-                    cv2.imwrite(img_fp, self._undistorter.undistort(img))
-            self._log("Processed {}.".format(raw_fp_prefix))
-        assert not QUIT
+            calib = (mtx, dist, width, height)
+        view_workers = self._view_workers(workers, len(prefixes2process))
+        jobs = [(prefix, self.raw_input_dir, self.processed_destination_dir, self.view_IDs, self.tpas_extension, self.alignment,
+                 SYNCHRONIZATION_MAX_ERROR, self.visualize, self.vis_order, calib, view_workers, cache) for prefix in prefixes2process]
+        negatives = self._run_prefix_jobs(_prepare_tpa_rgb_prefix, jobs, workers)
+        negative_samples_dict = {prefix: int(-1) for prefix, negative in zip(prefixes2process, negatives) if negative}
         self._write_nfo()
         self._write_labels_file(prefixes2process, negative_samples_dict)
         self._write_make_file()
@@ -1019,7 +1395,7 @@ def _get_class_from_json_file(prefix, json_filepath):
 class TPA_RGB_Dataset_Maker(_Dataset_Maker):
     '''
     CALL A TPA_RGBPreparer FIRST ; #TODO FINISH DOCS
-    ONLY TXT SUPPORTED
+    ONLY FORMATS THAT STORE HEADERS SUPPORTED (see tools.HEADER_READERS)
     '''
 
     def __init__(self, reset_log=True):
@@ -1080,7 +1456,7 @@ class TPA_RGB_Dataset_Maker(_Dataset_Maker):
         dirs2output = []
         label_txt_dict = {}
         for prefix in prefixes2make:
-            subject_name = _get_subject_from_header(tools.read_txt_header(os.path.join(
+            subject_name = _get_subject_from_header(tools.read_tpa_header(os.path.join(
                 self.processed_input_dir, prefix + "ID" + self.view_IDs[0] + "." + self.tpas_extension)))
             subject_name = re.sub('[^\w\-_\. ]', '_', subject_name)
             # 1 > pos or 0 > neg
@@ -1116,9 +1492,9 @@ class TPA_RGB_Dataset_Maker(_Dataset_Maker):
         self._log("[INFO] Copying files...")
         for src_tuple, dst_tuple in zip(fps2copy, fps2output):
             for src, dst in zip(src_tuple, dst_tuple):
-                shutil.copy2(src, dst)
-                old_header = tools.read_txt_header(src)
-                tools.modify_txt_header(dst, old_header+",label{}".format(self._labels[_TPA_get_file_prefix(src)]))
+                _copy_tpa_file(src, dst)
+                old_header = tools.read_tpa_header(src)
+                tools.modify_tpa_header(dst, old_header+",label{}".format(self._labels[_TPA_get_file_prefix(src)]))
         for src, dst in zip(dirs2copy, dirs2output):
             try:
                 shutil.copytree(src, dst)
@@ -1167,6 +1543,7 @@ def convert_TXT2NPZ_TPA_RGB_Dataset(dataset_dir: str, frames: int, frame_shift:
     crop the recordings from array[:] to array[label-frames+frame_shift:label+frame_shift]
     size = (height, width) in pixels
     '''
+    import cv2
     assert (frame_shift >= 0)
     assert (frames >= 0)
     assert (frames-frame_shift > 0)
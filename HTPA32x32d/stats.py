@@ -0,0 +1,251 @@
+"""
+Chunked statistics of thermopile sensor array sequences shaped [frames, height, width]:
+per-frame series (min, max, mean, std, percentiles, foreground pixel count)
+and per-pixel maps (mean, variance, min, max, temporal noise).
+
+Statistics are computed chunk by chunk, so arrays, memmaps and iterators of chunks are supported,
+and can be cached in small .stats.npz sidecars next to recordings.
+"""
+import numpy as np
+import os
+
+import HTPA32x32d.tools as tools
+
+
+STATS_CHUNK_FRAMES = 1024
+STATS_PERCENTILES = (5., 50., 95.)
+# pixels warmer than the frame median by more than this [degrees Celsius] are foreground
+FOREGROUND_DELTA = 2.
+HOT_PIXEL_SIGMAS = 5.
+STATS_SIDECAR_EXT = "stats.npz"
+FRAME_STATS_KEYS = ["frame_min", "frame_max", "frame_mean", "frame_std", "frame_percentiles", "frame_foreground"]
+PIXEL_STATS_KEYS = ["pixel_mean", "pixel_var", "pixel_min", "pixel_max", "pixel_noise"]
+
+
+def frame_stats(array, percentiles=STATS_PERCENTILES, foreground_delta: float = FOREGROUND_DELTA, scale: float = 1.) -> dict:
+    """
+    Per-frame statistics, vectorized over frames.
+
+    Parameters
+    ----------
+    array : np.array
+        [frames, height, width]
+    percentiles : tuple, optional
+        Percentiles of each frame.
+    foreground_delta : float, optional
+        Pixels warmer than the frame median by more than foreground_delta are counted as foreground.
+    scale : float, optional
+        Factor converting array values to degrees Celsius, e.g. tools.TEMPERATURE_SCALE for raw integers.
+
+    Returns
+    -------
+    dict
+        Arrays shaped (frames,) for keys in FRAME_STATS_KEYS, frame_percentiles shaped (frames, len(percentiles)).
+    """
+    data = np.asarray(tools.as_celsius(array, scale, np.float64), dtype=np.float64).reshape(len(array), -1)
+    q = np.unique(np.r_[percentiles, 50.])
+    quantiles = np.percentile(data, q, axis=1).T if len(data) else np.zeros((0, len(q)))
+    median = quantiles[:, np.searchsorted(q, 50.)]
+    return {
+        "frame_min": data.min(axis=1) if len(data) else np.zeros(0),
+        "frame_max": data.max(axis=1) if len(data) else np.zeros(0),
+        "frame_mean": data.mean(axis=1),
+        "frame_std": data.std(axis=1),
+        "frame_percentiles": quantiles[:, np.searchsorted(q, percentiles)],
+        "frame_foreground": (data > (median[:, np.newaxis] + foreground_delta)).sum(axis=1),
+    }
+
+
+class TPA_Stats():
+    """
+    Accumulates per-frame series and per-pixel maps of a sequence chunk by chunk.
+    Per-pixel mean and variance are merged with numerically stable pairwise updates (Chan et al.),
+    temporal noise is the RMS of frame-to-frame differences divided by sqrt(2) (including differences across chunks).
+
+    Attributes
+    ----------
+    percentiles : tuple
+        Percentiles of each frame.
+    foreground_delta : float
+        Foreground threshold above the frame median [degrees Celsius].
+    scale : float
+        Factor converting values of chunks to degrees Celsius, e.g. tools.TEMPERATURE_SCALE for raw integers.
+    n : int
+        Number of frames processed.
+
+    Methods
+    -------
+    update(array)
+        add a chunk [frames, height, width].
+    result()
+        dict of per-frame series (FRAME_STATS_KEYS) and per-pixel maps (PIXEL_STATS_KEYS).
+    """
+
+    def __init__(self, percentiles=STATS_PERCENTILES, foreground_delta: float = FOREGROUND_DELTA, scale: float = 1.):
+        self.percentiles = tuple(float(p) for p in percentiles)
+        self.foreground_delta = foreground_delta
+        self.scale = scale
+        self.n = 0
+        self._frames = {key: [] for key in FRAME_STATS_KEYS}
+        self._mean, self._m2 = None, None
+        self._min, self._max = None, None
+        self._last = None
+        self._diff2, self._diffs = None, 0
+
+    def update(self, array):
+        array = np.asarray(array)
+        if not len(array):
+            return self
+        for key, value in frame_stats(array, self.percentiles, self.foreground_delta, self.scale).items():
+            self._frames[key].append(value)
+        data = tools.as_celsius(array, self.scale, np.float64).astype(np.float64)
+        n = len(data)
+        mean = data.mean(axis=0)
+        m2 = np.square(data - mean).sum(axis=0)
+        if self._mean is None:
+            self._mean, self._m2 = mean, m2
+            self._min, self._max = data.min(axis=0), data.max(axis=0)
+            self._diff2 = np.zeros_like(mean)
+        else:
+            total = self.n + n
+            delta = mean - self._mean
+            self._mean = self._mean + delta * n / total
+            self._m2 = self._m2 + m2 + np.square(delta) * self.n * n / total
+            np.minimum(self._min, data.min(axis=0), out=self._min)
+            np.maximum(self._max, data.max(axis=0), out=self._max)
+        previous = data if (self._last is None) else np.concatenate([self._last[np.newaxis], data])
+        self._diff2 += np.square(np.diff(previous, axis=0)).sum(axis=0)
+        self._diffs += len(previous) - 1
+        self._last = data[-1]
+        self.n += n
+        return self
+
+    def result(self) -> dict:
+        result = {key: np.concatenate(values) if values else np.zeros(0) for key, values in self._frames.items()}
+        if not self.n:
+            return result
+        result["pixel_mean"] = self._mean
+        result["pixel_var"] = self._m2 / self.n
+        result["pixel_min"] = self._min
+        result["pixel_max"] = self._max
+        result["pixel_noise"] = np.sqrt(self._diff2 / (2 * self._diffs)) if self._diffs else np.full_like(self._mean, np.nan)
+        return result
+
+
+def compute_stats(source, chunk_frames: int = STATS_CHUNK_FRAMES, percentiles=STATS_PERCENTILES, foreground_delta: float = FOREGROUND_DELTA, scale: float = 1.) -> dict:
+    """
+    Per-frame series and per-pixel maps of a sequence, see TPA_Stats.
+
+    Parameters
+    ----------
+    source : np.array, iterable
+        Array or memmap [frames, height, width], or an iterable of chunks (arrays or (array, timestamps) tuples).
+    chunk_frames : int, optional
+        Frames processed at once if source is an array.
+    percentiles : tuple, optional
+    foreground_delta : float, optional
+    scale : float, optional
+        See TPA_Stats.
+
+    Returns
+    -------
+    dict
+        See TPA_Stats.result().
+    """
+    stats = TPA_Stats(percentiles, foreground_delta, scale)
+    if isinstance(source, np.ndarray):
+        chunks = (source[start:start + chunk_frames] for start in range(0, len(source), chunk_frames))
+    else:
+        chunks = (chunk[0] if isinstance(chunk, tuple) else chunk for chunk in source)
+    for chunk in chunks:
+        stats.update(chunk)
+    return stats.result()
+
+
+def hot_pixel_map(stats: dict, sigmas: float = HOT_PIXEL_SIGMAS) -> np.ndarray:
+    """
+    Pixels with mean temperature or temporal noise deviating from the median over the frame
+    by more than sigmas robust standard deviations (1.4826 MAD).
+
+    Parameters
+    ----------
+    stats : dict
+        Result of compute_stats() or tpa_file_stats().
+    sigmas : float, optional
+
+    Returns
+    -------
+    np.array
+        Boolean map [height, width].
+    """
+    hot = np.zeros(stats["pixel_mean"].shape, dtype=bool)
+    for key in ["pixel_mean", "pixel_noise"]:
+        values = stats[key]
+        median = np.nanmedian(values)
+        sigma = 1.4826 * np.nanmedian(np.abs(values - median))
+        if sigma > 0:
+            hot |= np.abs(values - median) > sigmas * sigma
+    return hot
+
+
+def stats_filepath(filepath: str) -> str:
+    """
+    Filepath of the statistics sidecar of a recording, next to it with the extension replaced.
+    """
+    return os.path.splitext(filepath)[0] + "." + STATS_SIDECAR_EXT
+
+
+def save_stats(fp: str, stats: dict, **params) -> bool:
+    """
+    Save statistics (and parameters they were computed with) to .npz.
+    """
+    tools.ensure_parent_exists(fp)
+    params = {"param_" + key: np.asarray(value) for key, value in params.items()}
+    np.savez(fp, **stats, **params)
+    return True
+
+
+def load_stats(fp: str) -> dict:
+    """
+    Load statistics saved with save_stats(), parameters are returned with "param_" prefixed keys.
+    """
+    with np.load(fp) as data:
+        return {key: data[key] for key in data.files}
+
+
+def tpa_file_stats(filepath: str, cache: bool = True, chunk_frames: int = STATS_CHUNK_FRAMES, percentiles=STATS_PERCENTILES, foreground_delta: float = FOREGROUND_DELTA) -> dict:
+    """
+    Statistics of a recording read in chunks (see tools.iter_tpa_file()), cached in a sidecar (see stats_filepath()).
+    The sidecar is used if it is newer than the recording and was computed with the same parameters.
+
+    Parameters
+    ----------
+    filepath : str
+    cache : bool, optional
+        If True the sidecar is read and (re)written.
+    chunk_frames : int, optional
+    percentiles : tuple, optional
+    foreground_delta : float, optional
+
+    Returns
+    -------
+    dict
+        See TPA_Stats.result(), per-frame timestamps are stored in "timestamps".
+    """
+    sidecar_fp = stats_filepath(filepath)
+    params = {"percentiles": np.asarray(percentiles, dtype=np.float64), "foreground_delta": foreground_delta}
+    if cache and os.path.exists(sidecar_fp) and (os.path.getmtime(sidecar_fp) >= os.path.getmtime(filepath)):
+        stats = load_stats(sidecar_fp)
+        if all(np.array_equal(stats.get("param_" + key), value) for key, value in params.items()):
+            return {key: value for key, value in stats.items() if not key.startswith("param_")}
+    stats = TPA_Stats(percentiles, foreground_delta)
+    timestamps = []
+    # degrees Celsius also for raw files
+    for array, ts in tools.iter_tpa_file(filepath, chunk_frames, dtype=tools.DTYPE):
+        stats.update(array)
+        timestamps.append(ts)
+    result = stats.result()
+    result["timestamps"] = np.concatenate(timestamps) if timestamps else np.zeros(0)
+    if cache:
+        save_stats(sidecar_fp, result, **params)
+    return result
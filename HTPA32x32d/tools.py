@@ -14,12 +14,7 @@ Warnings:
     txt array order is 'F'
 """
 import numpy as np
-import pandas as pd
-import cv2
 import os
-import imageio
-from scipy.spatial.distance import cdist
-import matplotlib.pyplot as plt
 import pickle
 import itertools
 import json
@@ -28,30 +23,138 @@ import collections
 import shutil
 import pickle
 import re
+import struct
+import zipfile
+import zlib
+import bisect
+import concurrent.futures
+import threading
 
 
 DTYPE = "float32"
+# raw Heimann HTPA values are integers in [TEMPERATURE_SCALE deg. Celsius]
+RAW_DTYPE = "int16"
+TEMPERATURE_SCALE = 1e-2
 PD_SEP = ","
 PD_NAN = np.inf
 PD_DTYPE = np.float32
 READ_CSV_ARGS = {"skiprows": 1}
 PD_TIME_COL = "Time (sec)"
 PD_PTAT_COL = "PTAT"
+CSV_WRITE_CHUNK_FRAMES = 4096
 
 
 HTPA_UDP_MODULE_WEBCAM_IMG_EXT = "jpg"
 
 
+TXT_WRITE_BLOCK_FRAMES = 1024
+TXT_INDEX_EXT = "idx"
+TXT_INDEX_MAGIC = b"HTPAIDX1"
+TXT_INDEX_DTYPE = np.dtype([("offset", "<i8"), ("timestamp", "<f8")])
+TXT_VALIDATION_BLOCK_BYTES = 1 << 22
+TXT_ISSUE_KINDS = ["value_count", "non_integer", "truncated", "timestamp", "non_monotonic"]
+TXT_REPAIR_MODES = ["drop", "interpolate"]
+
+
+NPZ_FRAMES_KEY = "frames"
+NPZ_TIMESTAMPS_KEY = "timestamps"
+NPZ_HEADER_KEY = "header"
+NPYD_FRAMES_FN = "frames.npy"
+NPYD_TIMESTAMPS_FN = "timestamps.npy"
+NPYD_HEADER_FN = "header.txt"
+TPAC_MAGIC = b"TPAC"
+# magic, record kind, frames, columns, frames and timestamps payload sizes, first and last timestamp
+TPAC_RECORD = struct.Struct("<4sB3xIIQQdd")
+TPAC_METADATA_RECORD = 0
+TPAC_CHUNK_RECORD = 1
+TPAC_CHUNK_FRAMES = 256
+TPAC_COMPRESSION_LEVEL = 6
+
+
+# cv2.COLORMAP_JET, OpenCV is imported only by functions that need it
+CV_COLORMAP_JET = 2
+PSEUDOCOLOR_LUT_SIZE = 256
+PSEUDOCOLOR_RANGE_MODES = ["fixed", "file", "running"]
+_COLORMAP_LUTS = {}
+
+
+VIDEO_SCALE = 10
+VIDEO_CHUNK_FRAMES = 256
+VIDEO_FOURCC_DICT = {
+    "avi": "MJPG",
+    "mp4": "mp4v",
+}
+
+
+MONOTONIC_MATCHING_BAND = 8
+MONOTONIC_MATCHING_CRITERIA = ["sum", "max"]
+
+
+RESAMPLING_METHODS = ["nearest", "linear", "cubic"]
+RESAMPLING_MAX_GAP = 1.
+RESAMPLING_CHUNK_FRAMES = 1024
+
+
+HISTOGRAM_START = -20.
+HISTOGRAM_STOP = 120.
+HISTOGRAM_STEP = 0.1
+HISTOGRAM_CHUNK_FRAMES = 1024
+
+
+# output of each conversion format: suffix appended to the source filepath without extension
+CONVERSION_FORMATS_DICT = {
+    "csv": ".csv",
+    "gif": ".gif",
+    "mp4": ".mp4",
+    "avi": ".avi",
+    "frames": "",
+    "bmp": ".bmp",
+    "histogram": "_histogram.png",
+    "txt": ".TXT",
+    "pickle": ".pickle",
+    "npz": ".npz",
+    "npyd": ".npyd",
+    "tpac": ".tpac",
+    "parquet": ".parquet",
+}
+CONVERSION_FORMATS = list(CONVERSION_FORMATS_DICT.keys())
+
+
+PARQUET_LAYOUTS = ["wide", "long"]
+PARQUET_ROW_GROUP_SECONDS = 60.
+PARQUET_PREFIX_COL = "prefix"
+PARQUET_VIEW_COL = "view"
+PARQUET_SUBJECT_COL = "subject"
+PARQUET_LABEL_COL = "label"
+PARQUET_FRAME_COL = "frame"
+PARQUET_TIME_COL = "timestamp"
+PARQUET_PIXEL_COL = "pixel"
+PARQUET_TEMPERATURE_COL = "temperature"
+
+
 READERS_EXTENSIONS_DICT = {
     "txt": "txt",
     "csv": "csv",
     "pickle": "pickle",
     "pkl": "pickle",
     "p": "pickle",
+    "npz": "npz",
+    "npyd": "npyd",
+    "tpac": "tpac",
 }
 
 
 SUPPORTED_EXTENSIONS = list(READERS_EXTENSIONS_DICT.keys())
+# readers that store headers
+HEADER_READERS = ["txt", "npz", "npyd", "tpac"]
+# readers that support mmap_mode
+MMAP_READERS = ["npz", "npyd"]
+# readers parsed in Python (GIL-bound), read_tpa_files() reads them in processes instead of threads
+PROCESS_READERS = ["txt"]
+# bound of the in-process cache of parsed recordings and headers, see TPA_Read_Cache
+READ_CACHE_MAX_BYTES = 512 * 2 ** 20
+# estimated size of a timestamp in a list [bytes]
+READ_CACHE_LIST_ITEM_BYTES = 32
 
 
 def remove_extension(filepath):
@@ -64,14 +167,186 @@ def get_extension(filepath):
 
 def ensure_path_exists(path):
     if not os.path.exists(path):
-        os.makedirs(path)
+        # exist_ok: directories may be created concurrently by worker processes
+        os.makedirs(path, exist_ok=True)
 
 
 def ensure_parent_exists(path):
     ensure_path_exists(os.path.dirname(path))
 
 
-def read_tpa_file(filepath: str, array_size: int = 32):
+def get_reader(filepath: str) -> str:
+    """
+    Reader (format) of a file, deduced from its extension, see READERS_EXTENSIONS_DICT.
+    """
+    extension_lowercase = get_extension(filepath).lower()
+    assert (extension_lowercase in SUPPORTED_EXTENSIONS)
+    return READERS_EXTENSIONS_DICT[extension_lowercase]
+
+
+def _file_signature(filepath: str) -> tuple:
+    """
+    (absolute path, size, mtime) of a file, directories (npyd) are described by their files.
+    """
+    filepath = os.path.abspath(filepath)
+    if os.path.isdir(filepath):
+        stats = [os.stat(entry.path) for entry in sorted(os.scandir(filepath), key=lambda entry: entry.name) if entry.is_file()]
+        return (filepath, sum(stat.st_size for stat in stats), max([stat.st_mtime_ns for stat in stats], default=0), len(stats))
+    stat = os.stat(filepath)
+    return (filepath, stat.st_size, stat.st_mtime_ns)
+
+
+def _freeze(value):
+    """
+    Make arrays of a cached value read-only (in place), returns its estimated size in bytes.
+    """
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_freeze(item) for item in value) if any(isinstance(item, (np.ndarray, tuple, list)) for item in value) \
+            else READ_CACHE_LIST_ITEM_BYTES * len(value)
+    if isinstance(value, str):
+        return len(value)
+    return READ_CACHE_LIST_ITEM_BYTES
+
+
+def _thaw(value):
+    """
+    Value returned from the cache: arrays as read-only views of the cached data, lists (timestamps) as copies.
+    """
+    if isinstance(value, np.ndarray):
+        return value.view()
+    if isinstance(value, tuple):
+        return tuple(_thaw(item) for item in value)
+    if isinstance(value, list):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class TPA_Read_Cache():
+    """
+    In-process LRU cache of parsed recordings and headers, bounded in bytes.
+    Entries are keyed by absolute path, size and mtime of the file (see _file_signature()) and reading arguments,
+    so modified files are read again. Recordings are cached only on request (read_tpa_file(cache=True)),
+    cached arrays are read-only, callers get views and have to copy (np.array()) before modifying them.
+
+    Attributes
+    ----------
+    max_bytes : int
+        Bound of the cached data size, 0 disables the cache.
+    enabled : bool
+        If False, nothing is cached or looked up.
+    hits, misses : int
+        Counters of lookups.
+    nbytes : int
+        Current cached data size.
+
+    Methods
+    -------
+    get(filepath, kind, loader, *args)
+        cached loader(*args) for the file.
+    lookup(filepath, kind, *args), put(filepath, kind, value, *args)
+        get() in two steps, e.g. if values are loaded elsewhere.
+    invalidate(filepath=None)
+        drop entries of a file (all entries if None).
+    info()
+        dict of counters and sizes.
+    """
+
+    def __init__(self, max_bytes: int = READ_CACHE_MAX_BYTES, enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits, self.misses = 0, 0
+        self.nbytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filepath: str, kind: str, loader, *args):
+        if not (self.enabled and self.max_bytes):
+            return loader(*args)
+        value = self.lookup(filepath, kind, *args)
+        if value is None:
+            value = self.put(filepath, kind, loader(*args), *args)
+        return value
+
+    def lookup(self, filepath: str, kind: str, *args):
+        """
+        Cached value or None (counted as a miss).
+        """
+        if not (self.enabled and self.max_bytes):
+            return None
+        key = (_file_signature(filepath), kind, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _thaw(entry[0])
+
+    def put(self, filepath: str, kind: str, value, *args):
+        """
+        Cache value loaded from the file, returns its read-only view (see get()).
+        """
+        if not (self.enabled and self.max_bytes):
+            return value
+        key = (_file_signature(filepath), kind, args)
+        nbytes = _freeze(value)
+        if nbytes <= self.max_bytes:
+            with self._lock:
+                if key in self._entries:
+                    self.nbytes -= self._entries.pop(key)[1]
+                self._entries[key] = (value, nbytes)
+                self.nbytes += nbytes
+                self._evict()
+        return _thaw(value)
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+    def invalidate(self, filepath: str = None):
+        filepath = None if (filepath is None) else os.path.abspath(filepath)
+        with self._lock:
+            for key in list(self._entries):
+                if (filepath is None) or (key[0][0] == filepath):
+                    self.nbytes -= self._entries.pop(key)[1]
+
+    def resize(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "nbytes": self.nbytes, "max_bytes": self.max_bytes, "enabled": self.enabled}
+
+
+_READ_CACHE = TPA_Read_Cache()
+
+
+def read_cache() -> TPA_Read_Cache:
+    """
+    The cache used by read_tpa_file(cache=True), read_tpa_header() and read_txt_header(),
+    e.g. read_cache().info(), read_cache().resize(max_bytes), read_cache().enabled = False.
+    """
+    return _READ_CACHE
+
+
+def disable_read_cache():
+    """
+    Disable and empty the read cache of this process, e.g. as initializer of worker processes
+    (read_tpa_files(), preparers), so that workers do not hold own copies of cached recordings.
+    """
+    _READ_CACHE.enabled = False
+    _READ_CACHE.invalidate()
+
+
+def read_tpa_file(filepath: str, array_size: int = 32, t_start: float = None, t_end: float = None, mmap_mode: str = None, dtype=None, cache: bool = False):
     """
     Convert Heimann HTPA file to NumPy array shaped [frames, height, width].
     Currently supported: see SUPPORTED_EXTENSIONS flag
@@ -80,6 +355,21 @@ def read_tpa_file(filepath: str, array_size: int = 32):
     ----------
     filepath : str
     array_size : int, optional (for txt files only)
+    t_start : float, optional
+        If given, frames with timestamps earlier than t_start are not loaded.
+    t_end : float, optional
+        If given, frames with timestamps later than t_end are not loaded.
+        Timestamps are assumed to be monotonic, the window [t_start, t_end] is located by binary search;
+        txt files are read only partially using the line-offset index (see load_txt_index()),
+        npz and npyd files are memory-mapped if possible, tpac files decompress only overlapping chunks.
+    mmap_mode : str, optional (for MMAP_READERS only)
+        As in np.load(), frames are memory-mapped instead of being loaded.
+    dtype : str, optional
+        RAW_DTYPE returns raw integers in [TEMPERATURE_SCALE deg. Celsius] (half the memory of float32, lossless),
+        a float dtype returns degrees Celsius, by default the stored type is kept (DTYPE for txt files), see as_dtype().
+    cache : bool, optional
+        If True (and mmap_mode is not given) the result is cached in memory and repeated reads are served from it, 
+        see read_cache(). Cached arrays are read-only, copy them before modifying.
 
     Returns
     -------
@@ -88,18 +378,170 @@ def read_tpa_file(filepath: str, array_size: int = 32):
     list
         list of timestamps
     """
-    extension_lowercase = get_extension(filepath).lower()
-    assert (extension_lowercase in SUPPORTED_EXTENSIONS)
-    reader = READERS_EXTENSIONS_DICT[extension_lowercase]
+    if cache and not mmap_mode:
+        dtype = None if (dtype is None) else np.dtype(dtype).str
+        return _READ_CACHE.get(filepath, "frames", _read_tpa_file, filepath, array_size, t_start, t_end, None, dtype)
+    return _read_tpa_file(filepath, array_size, t_start, t_end, mmap_mode, dtype)
+
+
+def _read_tpa_file_job(args):
+    return _read_tpa_file(*args)
+
+
+def read_tpa_files(filepaths: list, workers: int = 1, array_size: int = 32, t_start: float = None, t_end: float = None, dtype=None, cache: bool = False, executor=None) -> list:
+    """
+    Read many Heimann HTPA files (e.g. views of a sample), serially or concurrently, see read_tpa_file().
+    Concurrently, files parsed in Python (PROCESS_READERS, i.e. txt) are read in processes, 
+    other formats (decompression and I/O release the GIL) in threads. Cached files are not read again.
+
+    Parameters
+    ----------
+    filepaths : list
+    workers : int, optional
+        Number of files read at once, 1 (default) reads serially, None one per file (up to os.cpu_count()).
+    array_size, t_start, t_end, dtype, cache : optional
+        See read_tpa_file().
+    executor : concurrent.futures.Executor, optional
+        Open thread or process pool to read the files in (workers is ignored), 
+        e.g. reused across samples instead of starting pools in every call.
+
+    Returns
+    -------
+    list
+        (array, timestamps) of each file, in the order of filepaths.
+    """
+    filepaths = list(filepaths)
+    dtype = None if (dtype is None) else np.dtype(dtype).str
+    args = [(fp, array_size, t_start, t_end, None, dtype) for fp in filepaths]
+    results = [_READ_CACHE.lookup(fp, "frames", *job[1:]) if cache else None for fp, job in zip(filepaths, args)]
+    missing = [idx for idx, result in enumerate(results) if result is None]
+    workers = workers or min(len(missing), os.cpu_count() or 1)
+    if executor is not None:
+        loaded = list(executor.map(_read_tpa_file_job, [args[idx] for idx in missing]))
+    elif (workers == 1) or (len(missing) < 2):
+        loaded = [_read_tpa_file(*args[idx]) for idx in missing]
+    else:
+        in_process = [idx for idx in missing if get_reader(filepaths[idx]) in PROCESS_READERS]
+        in_thread = [idx for idx in missing if idx not in in_process]
+        futures = {}
+        with concurrent.futures.ThreadPoolExecutor(min(workers, len(in_thread)) or 1) as threads:
+            for idx in in_thread:
+                futures[idx] = threads.submit(_read_tpa_file, *args[idx])
+            if in_process:
+                with concurrent.futures.ProcessPoolExecutor(min(workers, len(in_process)), initializer=disable_read_cache) as processes:
+                    for idx in in_process:
+                        futures[idx] = processes.submit(_read_tpa_file_job, args[idx])
+        loaded = [futures[idx].result() for idx in missing]
+    for idx, result in zip(missing, loaded):
+        results[idx] = _READ_CACHE.put(filepaths[idx], "frames", result, *args[idx][1:]) if cache else result
+    return results
+
+
+def _read_tpa_file(filepath: str, array_size: int = 32, t_start: float = None, t_end: float = None, mmap_mode: str = None, dtype=None):
+    reader = get_reader(filepath)
+    time_range = (t_start is not None) or (t_end is not None)
     if reader == 'txt':
-        return txt2np(filepath)
+        if time_range:
+            index = load_txt_index(filepath)
+            start, stop = time_range2slice(index["timestamp"], t_start, t_end)
+            return read_txt_frames(filepath, start, stop, array_size=array_size, index=index, dtype=dtype)
+        return txt2np(filepath, array_size, dtype=dtype)
     if reader == 'csv':
-        return csv2np(filepath)
+        array, timestamps = csv2np(filepath)
     if reader == 'pickle':
-        return pickle2np(filepath)
+        array, timestamps = pickle2np(filepath)
+    if reader == 'tpac':
+        array, timestamps = tpac2np(filepath, t_start=t_start, t_end=t_end)
+        return as_dtype(array, dtype, _stored_scale(array)), timestamps
+    if reader in MMAP_READERS:
+        reader_mmap_mode = mmap_mode if (mmap_mode or not time_range) else "r"
+        if reader == 'npz':
+            array, timestamps = npz2np(filepath, mmap_mode=reader_mmap_mode)
+        if reader == 'npyd':
+            array, timestamps = npyd2np(filepath, mmap_mode=reader_mmap_mode)
+    if time_range:
+        start, stop = time_range2slice(timestamps, t_start, t_end)
+        array = array[start:stop]
+        timestamps = timestamps.iloc[start:stop] if hasattr(
+            timestamps, "iloc") else timestamps[start:stop]
+        if isinstance(array, np.memmap) and not mmap_mode:
+            array = np.array(array)
+    return as_dtype(array, dtype, _stored_scale(array)), timestamps
+
+
+def iter_tpa_file(filepath: str, chunk_frames: int, array_size: int = 32, dtype=None):
+    """
+    Read Heimann HTPA file in chunks of frames, memory stays bounded by the chunk size:
+    txt files are read with the line-offset index, tpac files chunk by chunk, csv files with pandas chunks,
+    npz and npyd files are memory-mapped if possible (pickle files are loaded at once).
+
+    Parameters
+    ----------
+    filepath : str
+    chunk_frames : int
+        Number of frames per chunk.
+    array_size : int, optional (for txt files only)
+    dtype : str, optional
+        See read_tpa_file().
+
+    Yields
+    ------
+    array : np.array
+        Chunk of the sequence, shape [frames, height, width].
+    timestamps : np.array
+        Timestamps of corresponding array frames.
+    """
+    reader = get_reader(filepath)
+    if reader == 'csv':
+        for array, timestamps in iter_csv2np(filepath, chunk_frames):
+            yield as_dtype(array, dtype), np.asarray(timestamps, dtype=np.float64)
+        return
+    if reader == 'txt':
+        index = load_txt_index(filepath)
+        length = len(index)
+        read = lambda start, stop: read_txt_frames(filepath, start, stop, array_size=array_size, index=index, dtype=dtype)
+    elif reader == 'tpac':
+        with TPA_Container(filepath) as container:
+            for start in range(0, len(container), chunk_frames):
+                array_chunk, timestamps_chunk = container.read(start, start + chunk_frames)
+                yield as_dtype(array_chunk, dtype, _stored_scale(array_chunk)), timestamps_chunk
+        return
+    else:
+        array, timestamps = read_tpa_file(filepath, mmap_mode="r" if (reader in MMAP_READERS) else None, cache=False)
+        length = len(array)
+        read = lambda start, stop: (as_dtype(np.asarray(array[start:stop]), dtype, _stored_scale(array)), timestamps[start:stop])
+    for start in range(0, length, chunk_frames):
+        array_chunk, timestamps_chunk = read(start, start + chunk_frames)
+        yield array_chunk, np.asarray(timestamps_chunk, dtype=np.float64)
+
+
+def time_range2slice(timestamps, t_start: float = None, t_end: float = None):
+    """
+    Locate frames with timestamps in [t_start, t_end] by binary search.
+
+    Parameters
+    ----------
+    timestamps : list, np.array
+        Monotonic timestamps.
+    t_start : float, optional
+        Start of the time window, the first frame if None.
+    t_end : float, optional
+        End of the time window (inclusive), the last frame if None.
+
+    Returns
+    -------
+    tuple
+        (start, stop) indices, timestamps[start:stop] lie in the time window.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    start = 0 if (t_start is None) else int(
+        np.searchsorted(timestamps, t_start, side="left"))
+    stop = len(timestamps) if (t_end is None) else int(
+        np.searchsorted(timestamps, t_end, side="right"))
+    return start, max(start, stop)
 
 
-def write_tpa_file(filepath: str, array, timestamps: list, header=None) -> bool:
+def write_tpa_file(filepath: str, array, timestamps: list, header=None, scale: float = 1.) -> bool:
     """
     Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to a txt file.
     Currently supported: see SUPPORTED_EXTENSIONS flag
@@ -112,18 +554,92 @@ def write_tpa_file(filepath: str, array, timestamps: list, header=None) -> bool:
         Temperatue distribution sequence, shaped [frames, height, width].
     timestamps : list
         List of timestamps of corresponding array frames.
+    header : str, optional
+        Supported by HEADER_READERS only.
+    scale : float, optional
+        Factor converting array values to degrees Celsius, e.g. TEMPERATURE_SCALE for raw integers.
+        npz, npyd, tpac and pickle files store arrays not in degrees Celsius as raw integers (RAW_DTYPE).
     """
-    extension_lowercase = get_extension(filepath).lower()
-    assert (extension_lowercase in SUPPORTED_EXTENSIONS)
-    writer = READERS_EXTENSIONS_DICT[extension_lowercase]
+    writer = get_reader(filepath)
+    _READ_CACHE.invalidate(filepath)
     if writer == 'txt':
-        return write_np2txt(filepath, array, timestamps, header=header)
+        return write_np2txt(filepath, array, timestamps, header=header, scale=scale)
     if writer == 'csv':
         assert not header
-        return write_np2csv(filepath, array, timestamps)
+        return write_np2csv(filepath, array, timestamps, scale=scale)
+    if scale != 1:
+        array = np2centi(array, scale)
     if writer == 'pickle':
         assert not header
         return write_np2pickle(filepath, array, timestamps)
+    if writer == 'npz':
+        return write_np2npz(filepath, array, timestamps, header=header)
+    if writer == 'npyd':
+        return write_np2npyd(filepath, array, timestamps, header=header)
+    if writer == 'tpac':
+        return write_np2tpac(filepath, array, timestamps, header=header)
+
+
+def read_tpa_header(filepath: str):
+    """
+    Read header of Heimann HTPA file, see HEADER_READERS.
+
+    Parameters
+    ----------
+    filepath : str
+
+    Returns
+    -------
+    str
+        TPA file header
+    """
+    reader = get_reader(filepath)
+    assert (reader in HEADER_READERS)
+    return _READ_CACHE.get(filepath, "header", _read_tpa_header, filepath, reader)
+
+
+def _read_tpa_header(filepath: str, reader: str):
+    if reader == 'txt':
+        return _read_txt_header(filepath)
+    if reader == 'npz':
+        with np.load(filepath) as data:
+            return str(data[NPZ_HEADER_KEY])
+    if reader == 'npyd':
+        with open(os.path.join(filepath, NPYD_HEADER_FN)) as f:
+            return f.read().rstrip()
+    if reader == 'tpac':
+        with TPA_Container(filepath) as container:
+            return container.header
+
+
+def modify_tpa_header(filepath: str, new_header):
+    """
+    Replace header of Heimann HTPA file, see HEADER_READERS.
+
+    Parameters
+    ----------
+    filepath : str
+    new_header : str
+    """
+    reader = get_reader(filepath)
+    assert (reader in HEADER_READERS)
+    _READ_CACHE.invalidate(filepath)
+    if reader == 'txt':
+        return modify_txt_header(filepath, new_header)
+    if reader == 'npz':
+        with np.load(filepath) as data:
+            content = {key: data[key] for key in data.files}
+        content[NPZ_HEADER_KEY] = np.array(new_header.rstrip())
+        compressed = _npz_is_compressed(filepath)
+        with open(filepath, "wb") as f:
+            (np.savez_compressed if compressed else np.savez)(f, **content)
+    if reader == 'npyd':
+        with open(os.path.join(filepath, NPYD_HEADER_FN), "w") as f:
+            f.write(new_header.rstrip())
+    if reader == 'tpac':
+        with TPA_Container(filepath, "a") as container:
+            container.set_metadata(header=new_header)
+
 
 def modify_txt_header(filepath : str, new_header):
     header = new_header.rstrip()
@@ -133,6 +649,7 @@ def modify_txt_header(filepath : str, new_header):
         lines[0] = header
     with open(filepath, "w") as f:
         f.writelines(lines)
+    _READ_CACHE.invalidate(filepath)
 
 def read_txt_header(filepath: str):
     """
@@ -147,12 +664,16 @@ def read_txt_header(filepath: str):
     str
         TPA file header
     """
+    return _READ_CACHE.get(filepath, "header", _read_tpa_header, filepath, "txt")
+
+
+def _read_txt_header(filepath: str):
     with open(filepath) as f:
         header = f.readline().rstrip()
     return header
 
 
-def txt2np(filepath: str, array_size: int = 32):
+def txt2np(filepath: str, array_size: int = 32, dtype=None):
     """
     Convert Heimann HTPA .txt to NumPy array shaped [frames, height, width].
 
@@ -160,6 +681,8 @@ def txt2np(filepath: str, array_size: int = 32):
     ----------
     filepath : str
     array_size : int, optional
+    dtype : str, optional
+        RAW_DTYPE keeps raw integers in [TEMPERATURE_SCALE deg. Celsius], otherwise degrees Celsius (default DTYPE).
 
     Returns
     -------
@@ -172,29 +695,260 @@ def txt2np(filepath: str, array_size: int = 32):
         # discard the first line
         _ = f.readline()
         # read line by line now
-        line = "dummy line"
-        frames = []
-        timestamps = []
-        while line:
-            line = f.readline()
-            if line:
-                split = line.split(" ")
-                frame = split[0: array_size ** 2]
-                timestamp = split[-1]
-                frame = np.array([int(T) for T in frame], dtype=DTYPE)
-                frame = frame.reshape([array_size, array_size], order="F")
-                frame *= 1e-2
-                frames.append(frame)
-                timestamps.append(float(timestamp))
-        frames = np.array(frames)
-        # the array needs rotating 90 CW
-        frames = np.rot90(frames, k=-1, axes=(1, 2))
+        frames, timestamps = _txt_lines2np(f, array_size, dtype)
+    return frames, timestamps
+
+
+def _txt_lines2np(lines, array_size: int = 32, dtype=None):
+    """
+    Parse Heimann HTPA .txt frame lines (header excluded) to NumPy array shaped [frames, height, width].
+    """
+    dtype = np.dtype(dtype or DTYPE)
+    raw = (dtype == RAW_DTYPE)
+    frames = []
+    timestamps = []
+    for line in lines:
+        if line:
+            split = line.split(" ")
+            frame = split[0: array_size ** 2]
+            timestamp = split[-1]
+            frame = np.array([int(T) for T in frame], dtype=dtype)
+            frame = frame.reshape([array_size, array_size], order="F")
+            if not raw:
+                frame *= TEMPERATURE_SCALE
+            frames.append(frame)
+            timestamps.append(float(timestamp))
+    if not frames:
+        return np.zeros([0, array_size, array_size], dtype=dtype), timestamps
+    frames = np.array(frames)
+    # the array needs rotating 90 CW
+    frames = np.rot90(frames, k=-1, axes=(1, 2))
     return frames, timestamps
 
 
-def write_np2txt(output_fp: str, array, timestamps: list, header: str = None) -> bool:
+def txt_index_filepath(filepath: str) -> str:
+    """
+    Filepath of the .idx sidecar that stores the line-offset index of a Heimann HTPA .txt file.
+    """
+    return filepath + "." + TXT_INDEX_EXT
+
+
+def _parse_txt_timestamp(line: bytes) -> float:
+    try:
+        return float(line.rsplit(None, 1)[-1])
+    except (ValueError, IndexError):
+        return np.nan
+
+
+def _scan_txt_index(filepath: str, start: int = None, tokens: int = None):
+    """
+    Scan frame lines of a Heimann HTPA .txt file starting at byte offset start
+    (the first frame line if None).
+
+    Returns
+    -------
+    np.array
+        Index of newline-terminated frame lines, TXT_INDEX_DTYPE.
+    int
+        Number of bytes covered by the index.
+    np.array
+        Index of the trailing unterminated line if it is a complete frame line, otherwise empty.
+    """
+    offsets, timestamps = [], []
+    tail = np.zeros(0, dtype=TXT_INDEX_DTYPE)
+    with open(filepath, "rb") as f:
+        if start is None:
+            start = len(f.readline())
+        f.seek(start)
+        position, covered = start, start
+        for line in f:
+            line_offset = position
+            position += len(line)
+            if not line.strip():
+                if line.endswith(b"\n"):
+                    covered = position
+                continue
+            if not line.endswith(b"\n"):
+                # the line might be still being written by a recorder,
+                # it is indexed (but not persisted) only if it looks complete
+                complete = (len(line.split()) == tokens) if tokens else (b"t:" in line)
+                if complete:
+                    tail = np.array(
+                        [(line_offset, _parse_txt_timestamp(line))], dtype=TXT_INDEX_DTYPE)
+                break
+            covered = position
+            tokens = len(line.split())
+            offsets.append(line_offset)
+            timestamps.append(_parse_txt_timestamp(line))
+    index = np.zeros(len(offsets), dtype=TXT_INDEX_DTYPE)
+    index["offset"] = offsets
+    index["timestamp"] = timestamps
+    return index, covered, tail
+
+
+def _write_txt_index(index_fp: str, index, covered: int):
+    tmp_fp = "{}.{}.tmp".format(index_fp, os.getpid())
+    try:
+        with open(tmp_fp, "wb") as f:
+            f.write(TXT_INDEX_MAGIC)
+            f.write(np.array([covered], dtype="<u8").tobytes())
+            f.write(index.astype(TXT_INDEX_DTYPE).tobytes())
+        os.replace(tmp_fp, index_fp)
+    except OSError:
+        if os.path.exists(tmp_fp):
+            os.remove(tmp_fp)
+        raise
+
+
+def _read_txt_index(index_fp: str):
+    with open(index_fp, "rb") as f:
+        data = f.read()
+    header_size = len(TXT_INDEX_MAGIC) + 8
+    if (data[:len(TXT_INDEX_MAGIC)] != TXT_INDEX_MAGIC) or ((len(data) - header_size) % TXT_INDEX_DTYPE.itemsize):
+        return None, None
+    covered = int(np.frombuffer(data, dtype="<u8", count=1, offset=len(TXT_INDEX_MAGIC))[0])
+    index = np.frombuffer(data, dtype=TXT_INDEX_DTYPE, offset=header_size).copy()
+    return index, covered
+
+
+def _txt_index_is_valid(filepath: str, index, covered: int) -> bool:
+    if covered > os.path.getsize(filepath):
+        return False
+    with open(filepath, "rb") as f:
+        if len(index):
+            f.seek(index["offset"][-1])
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                return False
+            if (index["offset"][-1] + len(line)) > covered:
+                return False
+            ts = _parse_txt_timestamp(line)
+            if not ((ts == index["timestamp"][-1]) or (np.isnan(ts) and np.isnan(index["timestamp"][-1]))):
+                return False
+        if covered:
+            f.seek(covered - 1)
+            if f.read(1) != b"\n":
+                return False
+    return True
+
+
+def build_txt_index(filepath: str, save: bool = True):
+    """
+    Scan Heimann HTPA .txt once and index byte offsets and timestamps of its frame lines.
+    The index is stored in a .idx sidecar next to the file (see txt_index_filepath()),
+    if the sidecar cannot be written (e.g. read-only directory) the index is only returned.
+
+    Parameters
+    ----------
+    filepath : str
+    save : bool, optional
+        If True (default) the index is written to the .idx sidecar.
+
+    Returns
+    -------
+    np.array
+        Structured array (TXT_INDEX_DTYPE) with "offset" and "timestamp" of each frame.
+    """
+    index, covered, tail = _scan_txt_index(filepath)
+    if save:
+        try:
+            _write_txt_index(txt_index_filepath(filepath), index, covered)
+        except OSError:
+            pass
+    return np.concatenate([index, tail])
+
+
+def load_txt_index(filepath: str, save: bool = False):
+    """
+    Load the line-offset index of Heimann HTPA .txt from its .idx sidecar.
+    The index is built if the sidecar is missing or stale, and extended if the file
+    has grown since it was indexed (e.g. the file is still being recorded).
+    Readers (read_tpa_file(), iter_tpa_file(), read_txt_frames()) leave data directories untouched,
+    call build_txt_index() or pass save=True to keep the index for later reads.
+
+    Parameters
+    ----------
+    filepath : str
+    save : bool, optional
+        If True a new or extended index is written to the .idx sidecar (False by default).
+
+    Returns
+    -------
+    np.array
+        Structured array (TXT_INDEX_DTYPE) with "offset" and "timestamp" of each frame.
+    """
+    index_fp = txt_index_filepath(filepath)
+    index, covered = None, None
+    if os.path.exists(index_fp):
+        index, covered = _read_txt_index(index_fp)
+        if (index is not None) and not _txt_index_is_valid(filepath, index, covered):
+            index = None
+    if index is None:
+        return build_txt_index(filepath, save=save)
+    if (covered < os.path.getsize(filepath)):
+        tokens = None
+        if len(index):
+            with open(filepath, "rb") as f:
+                f.seek(index["offset"][-1])
+                tokens = len(f.readline().split())
+        new_index, new_covered, tail = _scan_txt_index(filepath, start=covered, tokens=tokens)
+        if new_covered > covered:
+            index = np.concatenate([index, new_index])
+            if save:
+                try:
+                    _write_txt_index(index_fp, index, new_covered)
+                except OSError:
+                    pass
+        index = np.concatenate([index, tail])
+    return index
+
+
+def read_txt_frames(filepath: str, start: int = None, stop: int = None, array_size: int = 32, index=None, dtype=None):
+    """
+    Read frames [start:stop] of Heimann HTPA .txt without parsing the preceding frames.
+    Uses the line-offset index, see load_txt_index().
+
+    Parameters
+    ----------
+    filepath : str
+    start : int, optional
+        Index of the first frame to read, same semantics as in Python slicing.
+    stop : int, optional
+        Index of the frame after the last frame to read, same semantics as in Python slicing.
+    array_size : int, optional
+    index : np.array, optional
+        Index returned by load_txt_index(), loaded if not given.
+    dtype : str, optional
+        See txt2np().
+
+    Returns
+    -------
+    np.array
+        3D array of temperature distribution sequence, shaped [frames, height, width].
+    list
+        list of timestamps
+    """
+    if index is None:
+        index = load_txt_index(filepath)
+    start, stop, _ = slice(start, stop).indices(len(index))
+    if (start >= stop):
+        return _txt_lines2np([], array_size, dtype)
+    offsets = index["offset"]
+    with open(filepath, "rb") as f:
+        f.seek(offsets[start])
+        if (stop < len(index)):
+            data = f.read(offsets[stop] - offsets[start])
+        else:
+            data = f.read()
+    lines = [line for line in data.decode().split("\n") if line.strip()]
+    return _txt_lines2np(lines[:stop - start], array_size, dtype)
+
+
+def write_np2txt(output_fp: str, array, timestamps: list, header: str = None, scale: float = 1.) -> bool:
     """
         Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to a txt file.
+        Temperatures are written as integers in [1e-2 deg. Celsius], frames are formatted in blocks
+        of TXT_WRITE_BLOCK_FRAMES.
 
         Parameters
         ----------
@@ -206,6 +960,8 @@ def write_np2txt(output_fp: str, array, timestamps: list, header: str = None) ->
             List of timestamps of corresponding array frames.
         header : str, optional
             TXT header
+        scale : float, optional
+            Factor converting array values to degrees Celsius, TEMPERATURE_SCALE for raw integers (written losslessly).
         """
     ensure_parent_exists(output_fp)
     frames = np.rot90(array, k=1, axes=(1, 2))
@@ -214,13 +970,94 @@ def write_np2txt(output_fp: str, array, timestamps: list, header: str = None) ->
         header += "\n"
     else:
         header = "HTPA32x32d\n"
+    frames_n = min(len(frames), len(timestamps))
+    # flatten each frame in 'F' order
+    frames = frames[:frames_n].transpose(0, 2, 1).reshape(frames_n, -1)
+    values = np2centi(frames, scale)
+    line_template = "%d " * values.shape[1] + "t: %s\n"
     with open(output_fp, 'w') as file:
         file.write(header)
-        for step, t in zip(frames, timestamps):
-            line = ""
-            for val in step.flatten("F"):
-                line += ("%02.2f" % val).replace(".", "")[:4] + " "
-            file.write("{}t: {}\n".format(line, t))
+        for block_start in range(0, frames_n, TXT_WRITE_BLOCK_FRAMES):
+            block_end = block_start + TXT_WRITE_BLOCK_FRAMES
+            rows = values[block_start:block_end].tolist()
+            file.write("".join(line_template % (*row, t)
+                               for row, t in zip(rows, timestamps[block_start:block_end])))
+    return True
+
+
+def np2centi(array, scale: float = 1.):
+    """
+    Convert temperatures in [deg. Celsius] to int16 integers in [1e-2 deg. Celsius] (Heimann's data structure).
+
+    Parameters
+    ----------
+    array : np.array
+    scale : float, optional
+        Factor converting array values to degrees Celsius, raw arrays (RAW_DTYPE) with TEMPERATURE_SCALE are returned as they are.
+
+    Returns
+    -------
+    np.array
+        int16 array of temperatures in [1e-2 deg. Celsius].
+    """
+    array = np.asarray(array)
+    if (scale == TEMPERATURE_SCALE) and (array.dtype == RAW_DTYPE):
+        return array
+    centi = np.rint(np.asarray(array, dtype=np.float64) * (scale / TEMPERATURE_SCALE))
+    info = np.iinfo(np.int16)
+    return np.clip(centi, info.min, info.max).astype(np.int16)
+
+
+def as_celsius(array, scale: float = TEMPERATURE_SCALE, dtype=DTYPE):
+    """
+    Convert values in [scale deg. Celsius] to degrees Celsius, by default raw integers (RAW_DTYPE).
+    Arrays with scale 1 are returned as they are.
+
+    Parameters
+    ----------
+    array : np.array
+    scale : float, optional
+        Factor converting array values to degrees Celsius.
+    dtype : str, optional
+        Float type of converted arrays.
+
+    Returns
+    -------
+    np.array
+    """
+    if scale == 1:
+        return array
+    return np.multiply(array, scale, dtype=dtype)
+
+
+def as_dtype(array, dtype=None, scale: float = 1.):
+    """
+    Convert a temperature sequence to dtype: RAW_DTYPE ⟵ raw integers (see np2centi()), float ⟵ degrees Celsius.
+
+    Parameters
+    ----------
+    array : np.array
+    dtype : str, optional
+        If None array is returned as it is.
+    scale : float, optional
+        Factor converting array values to degrees Celsius.
+
+    Returns
+    -------
+    np.array
+    """
+    if dtype is None:
+        return array
+    if np.dtype(dtype) == RAW_DTYPE:
+        return np2centi(array, scale)
+    return as_celsius(array, scale, dtype).astype(dtype, copy=False)
+
+
+def _stored_scale(array) -> float:
+    """
+    Scale of a sequence read from npz, npyd, tpac or pickle files, RAW_DTYPE arrays are stored raw integers (see write_tpa_file()).
+    """
+    return TEMPERATURE_SCALE if (array.dtype == RAW_DTYPE) else 1.
 
 
 def write_np2pickle(output_fp: str, array, timestamps: list) -> bool:
@@ -262,10 +1099,10 @@ def pickle2np(filepath: str):
     return frames, timestamps
 
 
-def write_np2csv(output_fp: str, array, timestamps: list) -> bool:
+def write_np2npz(output_fp: str, array, timestamps: list, header: str = None, compressed: bool = False) -> bool:
     """
-    Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to .CSV dataframe.
-    CSV should preferably represent the data collected without preprocessing, cropping or any data manipulation.  
+    Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to a .npz file,
+    frames, timestamps and header are stored together.
 
     Parameters
     ----------
@@ -275,77 +1112,1063 @@ def write_np2csv(output_fp: str, array, timestamps: list) -> bool:
         Temperatue distribution sequence, shaped [frames, height, width].
     timestamps : list
         List of timestamps of corresponding array frames.
+    header : str, optional
+        TXT header
+    compressed : bool, optional
+        If True, np.savez_compressed() is used. Compressed files cannot be memory-mapped.
     """
     ensure_parent_exists(output_fp)
-    # initialize csv template (and append frames later)
-    # prepend first row for compability with legacy format
-    first_row = pd.DataFrame({"HTPA 32x32d": []})
-    first_row.to_csv(output_fp, index=False, sep=PD_SEP)
-    headers = {PD_TIME_COL: [], PD_PTAT_COL: []}
-    df = pd.DataFrame(headers)
-    for idx in range(np.prod(array.shape[1:])):
-        df.insert(len(df.columns), "P%04d" % idx, [])
-    df.to_csv(output_fp, mode="a", index=False, sep=PD_SEP)
-
-    for idx in range(array.shape[0]):
-        frame = array[idx, ...]
-        timestamp = timestamps[idx]
-        temps = list(frame.flatten())
-        row_data = [timestamp, PD_NAN]
-        row_data.extend(temps)
-        row = pd.DataFrame([row_data])
-        row = row.astype(PD_DTYPE)
-        row.to_csv(output_fp, mode="a", header=False, sep=PD_SEP, index=False)
+    content = {NPZ_FRAMES_KEY: np.asarray(array),
+               NPZ_TIMESTAMPS_KEY: np.asarray(timestamps, dtype=np.float64),
+               NPZ_HEADER_KEY: np.array(header.rstrip() if header else "")}
+    # file object, otherwise NumPy appends .npz to extensions other than .npz (e.g. .NPZ)
+    with open(output_fp, "wb") as f:
+        (np.savez_compressed if compressed else np.savez)(f, **content)
     return True
 
 
-def csv2np(csv_fp: str):
+def npz2np(filepath: str, mmap_mode: str = None):
     """
-    Read and convert .CSV dataframe to a Heimann HTPA NumPy array shaped [frames, height, width]
+    Convert Heimann HTPA .npz written by write_np2npz() to NumPy array shaped [frames, height, width].
 
     Parameters
     ----------
-    csv_fp : str
-        Filepath to the csv file tor read.
+    filepath : str
+    mmap_mode : str, optional
+        As in np.load(). Frames are memory-mapped only if the file is not compressed.
 
     Returns
     -------
-    array : np.array
-        Temperatue distribution sequence, shape [frames, height, width].
-    timestamps : list
-        List of timestamps of corresponding array frames.
+    np.array
+        3D array of temperature distribution sequence, shaped [frames, height, width].
+    np.array
+        Timestamps.
     """
-    df = pd.read_csv(csv_fp, **READ_CSV_ARGS)
-    timestamps = df[PD_TIME_COL]
-    array = df.drop([PD_TIME_COL, PD_PTAT_COL], axis=1).to_numpy(dtype=DTYPE)
-    array = reshape_flattened_frames(array)
-    return array, timestamps
+    frames = None
+    if mmap_mode:
+        frames = _npz_memmap(filepath, NPZ_FRAMES_KEY + ".npy", mmap_mode)
+    with np.load(filepath) as data:
+        if frames is None:
+            frames = data[NPZ_FRAMES_KEY]
+        timestamps = data[NPZ_TIMESTAMPS_KEY]
+    return frames, timestamps
+
+
+def _npz_is_compressed(filepath: str) -> bool:
+    with zipfile.ZipFile(filepath) as zf:
+        return any(info.compress_type != zipfile.ZIP_STORED for info in zf.infolist())
 
 
-def apply_heatmap(array, cv_colormap: int = cv2.COLORMAP_JET) -> np.ndarray:
+def _npz_memmap(filepath: str, member: str, mmap_mode: str):
     """
-    Applies pseudocoloring (heatmap) to a sequence of thermal distribution. Same as np2pc().
-    np2pc() is preffered.
+    Memory-map a member of .npz, None if the member is compressed.
+    """
+    with zipfile.ZipFile(filepath) as zf:
+        info = zf.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(filepath, "rb") as f:
+        # zip local file header: 30 bytes, file name and extra field lengths at 26
+        f.seek(info.header_offset)
+        name_length, extra_length = struct.unpack("<HH", f.read(30)[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(filepath, dtype=dtype, mode=mmap_mode, shape=shape, order="F" if fortran_order else "C", offset=offset)
+
+
+def write_np2npyd(output_dir: str, array, timestamps: list, header: str = None) -> bool:
+    """
+    Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to a directory of .npy files
+    (NPYD_FRAMES_FN, NPYD_TIMESTAMPS_FN) and the header (NPYD_HEADER_FN).
 
     Parameters
     ----------
+    output_dir : str
+        Path to destination directory, e.g. *.npyd
     array : np.array
-         (frames, height, width)
-    cv_colormap : int, optional
-
-    Returns
+        Temperatue distribution sequence, shaped [frames, height, width].
+    timestamps : list
+        List of timestamps of corresponding array frames.
+    header : str, optional
+        TXT header
+    """
+    ensure_path_exists(output_dir)
+    np.save(os.path.join(output_dir, NPYD_FRAMES_FN), np.asarray(array))
+    np.save(os.path.join(output_dir, NPYD_TIMESTAMPS_FN),
+            np.asarray(timestamps, dtype=np.float64))
+    with open(os.path.join(output_dir, NPYD_HEADER_FN), "w") as f:
+        f.write(header.rstrip() if header else "")
+    return True
+
+
+def npyd2np(dir_path: str, mmap_mode: str = None):
+    """
+    Convert directory of .npy files written by write_np2npyd() to NumPy array shaped [frames, height, width].
+
+    Parameters
+    ----------
+    dir_path : str
+    mmap_mode : str, optional
+        As in np.load().
+
+    Returns
+    -------
+    np.array
+        3D array of temperature distribution sequence, shaped [frames, height, width].
+    np.array
+        Timestamps.
+    """
+    frames = np.load(os.path.join(dir_path, NPYD_FRAMES_FN), mmap_mode=mmap_mode)
+    timestamps = np.load(os.path.join(dir_path, NPYD_TIMESTAMPS_FN))
+    return frames, timestamps
+
+
+def _shuffle_bytes(array) -> bytes:
+    """
+    Byte-shuffle (group n-th bytes of all elements together) to improve compression of numeric arrays.
+    """
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8).reshape([-1, array.itemsize]).T.tobytes()
+
+
+def _unshuffle_bytes(buffer, dtype, count: int):
+    dtype = np.dtype(dtype)
+    shuffled = np.frombuffer(buffer, dtype=np.uint8).reshape([dtype.itemsize, count])
+    return np.ascontiguousarray(shuffled.T).view(dtype).reshape(-1)
+
+
+class TPA_Container():
+    """
+    Chunked compressed container for Heimann HTPA recordings (*.tpac).
+
+    The container is a single append-only file of records. Each record starts with TPAC_RECORD header.
+    Metadata records hold JSON (dtype, frame shape, header, session metadata), the latest one is valid.
+    Chunk records hold up to chunk_size frames compressed with zlib (byte-shuffled), 
+    their timestamps and optional per-frame metadata columns compressed separately.
+    Chunk index (frame counts and time spans of chunks) is rebuilt by skipping over record payloads when opening.
+    A record that is not completely written (e.g. recorder is still running) is ignored.
+
+    Attributes
+    ----------
+    filepath : str
+    mode : str
+        "r" - read, "w" - write (truncate), "a" - append (create if missing).
+    header : str
+        TXT header.
+    session : dict
+        Session metadata.
+
+    Methods
+    -------
+    append(frames, timestamps, columns=None)
+        buffer frames and write full chunks.
+    flush()
+        write buffered frames as a (possibly shorter) chunk.
+    read(start=None, stop=None, t_start=None, t_end=None, workers=None, columns=False)
+        read frames by frame index range or time range.
+    set_metadata(header=None, session=None)
+        append a metadata record.
+    close()
+    """
+
+    def __init__(self, filepath: str, mode: str = "r", chunk_size: int = None, header: str = None, session: dict = None, level: int = None):
+        assert mode in ["r", "w", "a"]
+        self.filepath = filepath
+        self.mode = mode
+        self.chunk_size = chunk_size if chunk_size else TPAC_CHUNK_FRAMES
+        self.level = TPAC_COMPRESSION_LEVEL if (level is None) else level
+        self.header = ""
+        self.session = {}
+        self.dtype = None
+        self.frame_shape = None
+        self._chunks = []
+        self._pending = []
+        self._metadata_changed = False
+        if (mode == "a") and not os.path.exists(filepath):
+            mode = "w"
+        if mode == "w":
+            ensure_parent_exists(filepath)
+            self._file = open(filepath, "w+b")
+            self._end = 0
+        else:
+            self._file = open(filepath, "rb" if (mode == "r") else "r+b")
+            self._scan()
+            if mode == "a":
+                # drop incomplete trailing record
+                self._file.truncate(self._end)
+        if (header is not None) or (session is not None):
+            assert mode != "r"
+            self.set_metadata(header=header, session=session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return sum(chunk["frames"] for chunk in self._chunks)
+
+    def _scan(self):
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        position = 0
+        while position + TPAC_RECORD.size <= size:
+            f.seek(position)
+            magic, kind, frames, columns_nbytes, frames_nbytes, timestamps_nbytes, t_first, t_last = TPAC_RECORD.unpack(
+                f.read(TPAC_RECORD.size))
+            if magic != TPAC_MAGIC:
+                raise ValueError("{} is not a valid TPA container (offset {})".format(
+                    self.filepath, position))
+            payload_offset = position + TPAC_RECORD.size
+            end = payload_offset + frames_nbytes + timestamps_nbytes + columns_nbytes
+            if end > size:
+                break
+            if kind == TPAC_METADATA_RECORD:
+                self._apply_metadata(json.loads(f.read(frames_nbytes).decode()))
+            else:
+                self._chunks.append({"offset": payload_offset, "frames": frames, "frames_nbytes": frames_nbytes,
+                                     "timestamps_nbytes": timestamps_nbytes, "columns_nbytes": columns_nbytes,
+                                     "t_first": t_first, "t_last": t_last})
+            position = end
+        self._end = position
+
+    def _apply_metadata(self, metadata):
+        self.header = metadata.get("header", "")
+        self.session = metadata.get("session", {})
+        if metadata.get("dtype"):
+            self.dtype = np.dtype(metadata["dtype"])
+            self.frame_shape = tuple(metadata["frame_shape"])
+        if metadata.get("chunk_size") and (self.mode == "r"):
+            self.chunk_size = metadata["chunk_size"]
+
+    def _write_record(self, kind, frames, payloads, t_first=np.nan, t_last=np.nan):
+        frames_payload, timestamps_payload, columns_payload = payloads
+        self._file.seek(self._end)
+        self._file.write(TPAC_RECORD.pack(TPAC_MAGIC, kind, frames, len(columns_payload), len(frames_payload),
+                                          len(timestamps_payload), t_first, t_last))
+        for payload in payloads:
+            self._file.write(payload)
+        offset = self._end + TPAC_RECORD.size
+        self._end = offset + sum(len(payload) for payload in payloads)
+        return offset
+
+    def _write_metadata(self):
+        metadata = {"version": 1, "header": self.header, "session": self.session,
+                    "dtype": self.dtype.str if self.dtype else None,
+                    "frame_shape": list(self.frame_shape) if self.frame_shape else None,
+                    "chunk_size": self.chunk_size, "shuffle": True}
+        self._write_record(TPAC_METADATA_RECORD, 0, [json.dumps(metadata).encode(), b"", b""])
+        self._metadata_changed = False
+
+    def set_metadata(self, header: str = None, session: dict = None):
+        """
+        Update header and/or session metadata (a new metadata record is appended).
+        """
+        assert self.mode != "r"
+        if header is not None:
+            self.header = header.rstrip()
+        if session is not None:
+            self.session = session
+        self._metadata_changed = True
+        if self.dtype is not None:
+            self._write_metadata()
+
+    def append(self, frames, timestamps, columns: dict = None):
+        """
+        Append frames shaped [frames, height, width], their timestamps and optional per-frame metadata columns 
+        (dict of 1D arrays). Full chunks are written immediately, the rest is buffered until flush().
+        """
+        assert self.mode != "r"
+        frames = np.asarray(frames)
+        if self.dtype is None:
+            self.dtype = frames.dtype
+            self.frame_shape = tuple(frames.shape[1:])
+            self._write_metadata()
+        assert (tuple(frames.shape[1:]) == self.frame_shape)
+        if self._metadata_changed:
+            self._write_metadata()
+        columns = {name: np.asarray(values) for name, values in (columns or {}).items()}
+        self._pending.append((frames.astype(self.dtype, copy=False),
+                              np.asarray(timestamps, dtype=np.float64), columns))
+        pending_n = sum(len(p[0]) for p in self._pending)
+        if pending_n >= self.chunk_size:
+            frames, timestamps, columns = self._concatenate_pending()
+            full_n = (pending_n // self.chunk_size) * self.chunk_size
+            for start in range(0, full_n, self.chunk_size):
+                stop = start + self.chunk_size
+                self._write_chunk(frames[start:stop], timestamps[start:stop],
+                                  {name: values[start:stop] for name, values in columns.items()})
+            self._pending = []
+            if full_n < pending_n:
+                self._pending.append((frames[full_n:], timestamps[full_n:],
+                                      {name: values[full_n:] for name, values in columns.items()}))
+            # make written chunks visible to readers of a live recording
+            self._file.flush()
+        return True
+
+    def _concatenate_pending(self):
+        frames = np.concatenate([p[0] for p in self._pending])
+        timestamps = np.concatenate([p[1] for p in self._pending])
+        names = self._pending[0][2].keys()
+        columns = {name: np.concatenate([p[2][name] for p in self._pending]) for name in names}
+        return frames, timestamps, columns
+
+    def _write_chunk(self, frames, timestamps, columns):
+        columns_payload = b""
+        if columns:
+            description = {name: [values.dtype.str, values.nbytes]
+                           for name, values in columns.items()}
+            description = json.dumps(description).encode()
+            columns_payload = zlib.compress(struct.pack("<I", len(description)) + description +
+                                            b"".join(np.ascontiguousarray(values).tobytes() for values in columns.values()), self.level)
+        payloads = [zlib.compress(_shuffle_bytes(frames), self.level),
+                    zlib.compress(timestamps.tobytes(), self.level),
+                    columns_payload]
+        t_first, t_last = (timestamps[0], timestamps[-1]) if len(timestamps) else (np.nan, np.nan)
+        offset = self._write_record(TPAC_CHUNK_RECORD, len(frames), payloads, t_first, t_last)
+        self._chunks.append({"offset": offset, "frames": len(frames), "frames_nbytes": len(payloads[0]),
+                             "timestamps_nbytes": len(payloads[1]), "columns_nbytes": len(payloads[2]),
+                             "t_first": t_first, "t_last": t_last})
+
+    def flush(self):
+        """
+        Write buffered frames and flush the file, so that readers can access them.
+        """
+        if self.mode == "r":
+            return True
+        if self._pending:
+            self._write_chunk(*self._concatenate_pending())
+            self._pending = []
+        if self._metadata_changed or (self._end == 0):
+            self._write_metadata()
+        self._file.flush()
+        return True
+
+    def close(self):
+        if self._file.closed:
+            return True
+        self.flush()
+        self._file.close()
+        return True
+
+    def timestamps(self):
+        """
+        Timestamps of all stored frames, only timestamp blocks of chunks are read.
+        """
+        return self._read_chunks(range(len(self._chunks)), frames=False)[1]
+
+    def _read_chunks(self, chunk_ids, frames=True, columns=False, workers=None):
+        chunk_ids = list(chunk_ids)
+        raw = []
+        for chunk_id in chunk_ids:
+            chunk = self._chunks[chunk_id]
+            if frames:
+                self._file.seek(chunk["offset"])
+                frames_payload = self._file.read(chunk["frames_nbytes"])
+            else:
+                # skip the frames block
+                self._file.seek(chunk["offset"] + chunk["frames_nbytes"])
+                frames_payload = None
+            timestamps_payload = self._file.read(chunk["timestamps_nbytes"])
+            columns_payload = self._file.read(chunk["columns_nbytes"]) if columns else None
+            raw.append((frames_payload, timestamps_payload, columns_payload))
+
+        def decompress(payload):
+            return zlib.decompress(payload) if payload else payload
+        payloads = [payload for record in raw for payload in record]
+        if workers and (workers > 1) and (len(chunk_ids) > 1):
+            # zlib releases the GIL
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                payloads = list(executor.map(decompress, payloads))
+        else:
+            payloads = [decompress(payload) for payload in payloads]
+        counts = [self._chunks[chunk_id]["frames"] for chunk_id in chunk_ids]
+        total = sum(counts)
+        timestamps = np.concatenate([np.frombuffer(payloads[3*i+1], dtype=np.float64) for i in range(len(chunk_ids))]) \
+            if chunk_ids else np.zeros(0, dtype=np.float64)
+        array = None
+        if frames:
+            array = np.empty([total, *self.frame_shape], dtype=self.dtype)
+            position = 0
+            for i, count in enumerate(counts):
+                elements = count * int(np.prod(self.frame_shape))
+                array[position:position+count] = _unshuffle_bytes(
+                    payloads[3*i], self.dtype, elements).reshape([count, *self.frame_shape])
+                position += count
+        columns_dict = None
+        if columns:
+            parts = collections.defaultdict(list)
+            for i in range(len(chunk_ids)):
+                payload = payloads[3*i+2]
+                if not payload:
+                    continue
+                description_length = struct.unpack("<I", payload[:4])[0]
+                description = json.loads(payload[4:4+description_length].decode())
+                position = 4 + description_length
+                for name, (dtype, nbytes) in description.items():
+                    parts[name].append(np.frombuffer(
+                        payload[position:position+nbytes], dtype=dtype))
+                    position += nbytes
+            columns_dict = {name: np.concatenate(values) for name, values in parts.items()}
+        return array, timestamps, columns_dict
+
+    def read(self, start: int = None, stop: int = None, t_start: float = None, t_end: float = None, workers: int = None, columns: bool = False):
+        """
+        Read frames [start:stop] or frames with timestamps in [t_start, t_end], 
+        only chunks that overlap the range are decompressed.
+
+        Parameters
+        ----------
+        start, stop : int, optional
+            Frame range, same semantics as in Python slicing.
+        t_start, t_end : float, optional
+            Time range, timestamps are assumed to be monotonic.
+        workers : int, optional
+            Number of threads decompressing chunks.
+        columns : bool, optional
+            If True per-frame metadata columns are returned too.
+
+        Returns
+        -------
+        np.array
+            3D array of temperature distribution sequence, shaped [frames, height, width].
+        np.array
+            Timestamps.
+        dict, optional
+            Per-frame metadata columns.
+        """
+        if self.dtype is None:
+            result = (np.zeros([0, 0, 0], dtype=DTYPE), np.zeros(0, dtype=np.float64))
+            return result + ({},) if columns else result
+        counts = np.array([chunk["frames"] for chunk in self._chunks], dtype=np.int64)
+        chunk_starts = np.concatenate([[0], np.cumsum(counts)])
+        start, stop, _ = slice(start, stop).indices(int(chunk_starts[-1]))
+        stop = max(start, stop)
+        if (t_start is not None) or (t_end is not None):
+            t_firsts = np.array([chunk["t_first"] for chunk in self._chunks])
+            t_lasts = np.array([chunk["t_last"] for chunk in self._chunks])
+            first_chunk = 0 if (t_start is None) else int(
+                np.searchsorted(t_lasts, t_start, side="left"))
+            last_chunk = len(self._chunks) if (t_end is None) else int(
+                np.searchsorted(t_firsts, t_end, side="right"))
+            first_chunk = max(first_chunk, int(np.searchsorted(chunk_starts, start, side="right")) - 1)
+            last_chunk = min(last_chunk, int(np.searchsorted(chunk_starts, stop, side="left")))
+        else:
+            first_chunk = int(np.searchsorted(chunk_starts, start, side="right")) - 1
+            last_chunk = int(np.searchsorted(chunk_starts, stop, side="left"))
+        first_chunk = max(first_chunk, 0)
+        last_chunk = max(first_chunk, last_chunk)
+        array, timestamps, columns_dict = self._read_chunks(
+            range(first_chunk, last_chunk), columns=columns, workers=workers)
+        offset = int(chunk_starts[first_chunk])
+        local_start, local_stop = max(start - offset, 0), max(stop - offset, 0)
+        if (t_start is not None) or (t_end is not None):
+            time_start, time_stop = time_range2slice(timestamps, t_start, t_end)
+            local_start, local_stop = max(local_start, time_start), max(min(local_stop, time_stop), local_start)
+        array = array[local_start:local_stop]
+        timestamps = timestamps[local_start:local_stop]
+        if columns:
+            columns_dict = {name: values[local_start:local_stop]
+                            for name, values in columns_dict.items()}
+            return array, timestamps, columns_dict
+        return array, timestamps
+
+
+def write_np2tpac(output_fp: str, array, timestamps: list, header: str = None, chunk_size: int = None, columns: dict = None) -> bool:
+    """
+    Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to a chunked compressed container (.tpac),
+    see TPA_Container.
+
+    Parameters
+    ----------
+    output_fp : str
+        Filepath to destination file, including the file name.
+    array : np.array
+        Temperatue distribution sequence, shaped [frames, height, width].
+    timestamps : list
+        List of timestamps of corresponding array frames.
+    header : str, optional
+        TXT header
+    chunk_size : int, optional
+        Frames per chunk, TPAC_CHUNK_FRAMES by default.
+    columns : dict, optional
+        Per-frame metadata columns (1D arrays).
+    """
+    with TPA_Container(output_fp, "w", chunk_size=chunk_size, header=header or "") as container:
+        container.append(array, timestamps, columns=columns)
+    return True
+
+
+def tpac2np(filepath: str, start: int = None, stop: int = None, t_start: float = None, t_end: float = None, workers: int = None):
+    """
+    Read Heimann HTPA chunked compressed container (.tpac) to NumPy array shaped [frames, height, width],
+    see TPA_Container.read().
+
+    Returns
+    -------
+    np.array
+        3D array of temperature distribution sequence, shaped [frames, height, width].
+    np.array
+        Timestamps.
+    """
+    with TPA_Container(filepath) as container:
+        return container.read(start, stop, t_start=t_start, t_end=t_end, workers=workers)
+
+
+def write_np2csv(output_fp: str, array, timestamps: list, scale: float = 1.) -> bool:
+    """
+    Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to .CSV dataframe.
+    CSV should preferably represent the data collected without preprocessing, cropping or any data manipulation.  
+    Frames are formatted in chunks of CSV_WRITE_CHUNK_FRAMES.
+
+    Parameters
+    ----------
+    output_fp : str
+        Filepath to destination file, including the file name.
+    array : np.array
+        Temperatue distribution sequence, shaped [frames, height, width].
+    timestamps : list
+        List of timestamps of corresponding array frames.
+    scale : float, optional
+        Factor converting array values to degrees Celsius, e.g. TEMPERATURE_SCALE for raw integers.
+    """
+    ensure_parent_exists(output_fp)
+    pixels_n = int(np.prod(array.shape[1:]))
+    columns = [PD_TIME_COL, PD_PTAT_COL] + \
+        ["P%04d" % idx for idx in range(pixels_n)]
+    with open(output_fp, "w", newline="") as f:
+        # prepend first row for compability with legacy format
+        f.write("HTPA 32x32d" + os.linesep)
+        f.write(PD_SEP.join(columns) + os.linesep)
+        for chunk_start in range(0, len(array), CSV_WRITE_CHUNK_FRAMES):
+            chunk = array[chunk_start:chunk_start+CSV_WRITE_CHUNK_FRAMES]
+            rows = np.empty([len(chunk), pixels_n + 2], dtype=PD_DTYPE)
+            rows[:, 0] = timestamps[chunk_start:chunk_start+len(chunk)]
+            rows[:, 1] = PD_NAN
+            rows[:, 2:] = as_celsius(chunk, scale).reshape([len(chunk), pixels_n])
+            f.write(_format_csv_rows(rows))
+    return True
+
+
+def _format_csv_rows(rows) -> str:
+    """
+    Format a 2D array as CSV rows the way pandas.DataFrame.to_csv() does,
+    each unique value is formatted only once.
+    """
+    if not rows.size:
+        return ""
+    values, inverse = np.unique(rows, return_inverse=True)
+    formatted = np.array(["" if np.isnan(value) else str(value)
+                          for value in values], dtype=object)
+    cells = formatted[inverse.reshape(rows.shape)].tolist()
+    return "".join(PD_SEP.join(row) + os.linesep for row in cells)
+
+
+def _csv_columns(csv_fp: str):
+    import pandas as pd
+    columns = list(pd.read_csv(csv_fp, nrows=0, **READ_CSV_ARGS).columns)
+    pixel_columns = [c for c in columns if c not in [PD_TIME_COL, PD_PTAT_COL]]
+    dtypes = {c: DTYPE for c in pixel_columns}
+    dtypes[PD_TIME_COL] = np.float64
+    return [PD_TIME_COL] + pixel_columns, dtypes
+
+
+def _df2np(df, pixel_columns):
+    timestamps = df[PD_TIME_COL].to_numpy(dtype=np.float64)
+    array = df[pixel_columns].to_numpy(dtype=DTYPE)
+    array = reshape_flattened_frames(array)
+    return array, timestamps
+
+
+def csv2np(csv_fp: str, chunksize: int = None):
+    """
+    Read and convert .CSV dataframe to a Heimann HTPA NumPy array shaped [frames, height, width]
+
+    Parameters
+    ----------
+    csv_fp : str
+        Filepath to the csv file tor read.
+    chunksize : int, optional
+        If given, the file is parsed in chunks of chunksize frames, see iter_csv2np().
+
+    Returns
+    -------
+    array : np.array
+        Temperatue distribution sequence, shape [frames, height, width].
+    timestamps : np.array
+        Timestamps of corresponding array frames.
+    """
+    import pandas as pd
+    if chunksize:
+        chunks = list(iter_csv2np(csv_fp, chunksize))
+        if chunks:
+            return np.concatenate([chunk[0] for chunk in chunks]), np.concatenate([chunk[1] for chunk in chunks])
+    usecols, dtypes = _csv_columns(csv_fp)
+    df = pd.read_csv(csv_fp, usecols=usecols, dtype=dtypes, **READ_CSV_ARGS)
+    return _df2np(df, usecols[1:])
+
+
+def iter_csv2np(csv_fp: str, chunksize: int):
+    """
+    Read .CSV dataframe in chunks of Heimann HTPA NumPy arrays shaped [frames, height, width]
+
+    Parameters
+    ----------
+    csv_fp : str
+        Filepath to the csv file tor read.
+    chunksize : int
+        Number of frames per chunk.
+
+    Yields
+    ------
+    array : np.array
+        Temperatue distribution sequence, shape [frames, height, width].
+    timestamps : np.array
+        Timestamps of corresponding array frames.
+    """
+    import pandas as pd
+    usecols, dtypes = _csv_columns(csv_fp)
+    with pd.read_csv(csv_fp, usecols=usecols, dtype=dtypes, chunksize=chunksize, **READ_CSV_ARGS) as reader:
+        for df in reader:
+            yield _df2np(df, usecols[1:])
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Parquet export requires pyarrow, install it with: pip install pyarrow")
+    return pyarrow
+
+
+def split_tpa_filename(filepath: str):
+    """
+    Split recording filename formatted as TPA_PREFIX_TEMPLATE ("YYYYMMDD_HHMM_ID{VIEW_IDENTIFIER}") into prefix and view ID.
+
+    Returns
+    -------
+    str
+        Prefix (filename if view ID is not found).
+    str
+        View ID ("" if not found).
+    """
+    name = remove_extension(os.path.basename(os.path.normpath(filepath)))
+    if "ID" not in name:
+        return name, ""
+    prefix, view = name.rsplit("ID", 1)
+    return prefix, view
+
+
+def split_tpa_header(header: str):
+    """
+    Split header formatted as "subject,label" into subject and label.
+
+    Returns
+    -------
+    str
+        Subject ("" if header is empty).
+    str
+        Label, the last comma-separated field ("" if missing).
+    """
+    fields = [field.strip() for field in (header or "").split(",")]
+    return fields[0], (fields[-1] if len(fields) > 1 else "")
+
+
+def _time_row_groups(timestamps, row_group_seconds: float):
+    """
+    Frame ranges of consecutive row groups spanning row_group_seconds each.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if not len(timestamps):
+        return []
+    if not row_group_seconds:
+        return [(0, len(timestamps))]
+    edges = np.arange(timestamps[0], timestamps[-1], row_group_seconds)[1:]
+    bounds = [0] + np.searchsorted(timestamps, edges, side="left").tolist() + [len(timestamps)]
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def write_np2parquet(output_fp: str, array, timestamps: list, layout: str = "wide", header: str = None, prefix: str = None, view: str = None, row_group_seconds: float = PARQUET_ROW_GROUP_SECONDS, scale: float = 1.) -> bool:
+    """
+    Convert and save Heimann HTPA NumPy array shaped [frames, height, width] to a Parquet table (requires pyarrow).
+
+    Layouts:
+    - "wide" ⟵ one row per frame: frame, timestamp and pixel columns named as in write_np2csv(),
+    - "long" ⟵ one row per pixel: frame, timestamp, pixel, temperature.
+    Both layouts include prefix, view, subject and label as categorical columns.
+    Each row group spans row_group_seconds, so that filters on timestamp skip whole row groups.
+
+    Parameters
+    ----------
+    output_fp : str
+        Filepath to destination file, including the file name.
+    array : np.array
+        Temperatue distribution sequence, shaped [frames, height, width].
+    timestamps : list
+        List of timestamps of corresponding array frames.
+    layout : str, optional
+        "wide" or "long".
+    header : str, optional
+        TXT header, subject and label are parsed with split_tpa_header().
+    prefix, view : str, optional
+        Recording prefix and view ID, parsed from output_fp by default (see split_tpa_filename()).
+    row_group_seconds : float, optional
+        Time span of a row group, if None the table is written as a single row group.
+    scale : float, optional
+        Factor converting array values to degrees Celsius, e.g. TEMPERATURE_SCALE for raw integers.
+    """
+    assert layout in PARQUET_LAYOUTS
+    pa = _import_pyarrow()
+    ensure_parent_exists(output_fp)
+    array = as_celsius(np.asarray(array), scale)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    frames_n = len(array)
+    pixels_n = int(np.prod(array.shape[1:]))
+    if (prefix is None) or (view is None):
+        parsed_prefix, parsed_view = split_tpa_filename(output_fp)
+        prefix = parsed_prefix if (prefix is None) else prefix
+        view = parsed_view if (view is None) else view
+    subject, label = split_tpa_header(header)
+    categories = {PARQUET_PREFIX_COL: prefix, PARQUET_VIEW_COL: view,
+                  PARQUET_SUBJECT_COL: subject, PARQUET_LABEL_COL: label}
+    pixel_names = ["P%04d" % idx for idx in range(pixels_n)]
+    if layout == "wide":
+        schema = pa.schema([(name, pa.dictionary(pa.int32(), pa.string())) for name in categories] +
+                           [(PARQUET_FRAME_COL, pa.int32()), (PARQUET_TIME_COL, pa.float64())] +
+                           [(name, pa.from_numpy_dtype(array.dtype)) for name in pixel_names])
+    else:
+        schema = pa.schema([(name, pa.dictionary(pa.int32(), pa.string())) for name in categories] +
+                           [(PARQUET_FRAME_COL, pa.int32()), (PARQUET_TIME_COL, pa.float64()),
+                            (PARQUET_PIXEL_COL, pa.int16()), (PARQUET_TEMPERATURE_COL, pa.from_numpy_dtype(array.dtype))])
+
+    def table(start, stop):
+        rows_per_frame = 1 if (layout == "wide") else pixels_n
+        rows_n = (stop - start) * rows_per_frame
+        columns = [pa.DictionaryArray.from_arrays(np.zeros(rows_n, dtype=np.int32), pa.array([value], type=pa.string()))
+                   for value in categories.values()]
+        frames = np.arange(start, stop, dtype=np.int32)
+        flattened = array[start:stop].reshape([stop - start, pixels_n])
+        if layout == "wide":
+            columns += [pa.array(frames), pa.array(timestamps[start:stop])]
+            columns += [pa.array(flattened[:, idx]) for idx in range(pixels_n)]
+        else:
+            columns += [pa.array(np.repeat(frames, pixels_n)), pa.array(np.repeat(timestamps[start:stop], pixels_n)),
+                        pa.array(np.tile(np.arange(pixels_n, dtype=np.int16), stop - start)), pa.array(flattened.reshape(-1))]
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    with pa.parquet.ParquetWriter(output_fp, schema) as writer:
+        for start, stop in _time_row_groups(timestamps, row_group_seconds):
+            rows_n = (stop - start) * (1 if (layout == "wide") else pixels_n)
+            writer.write_table(table(start, stop), row_group_size=max(rows_n, 1))
+        if not frames_n:
+            writer.write_table(table(0, 0))
+    return True
+
+
+def tpa_file2parquet(filepath: str, output_fp: str, layout: str = "wide", row_group_seconds: float = PARQUET_ROW_GROUP_SECONDS) -> bool:
+    """
+    Export a recording to Parquet, see write_np2parquet(). 
+    Prefix and view ID are parsed from filepath, subject and label from the header (formats in HEADER_READERS).
+    """
+    array, timestamps = read_tpa_file(filepath)
+    header = read_tpa_header(filepath) if (get_reader(filepath) in HEADER_READERS) else None
+    prefix, view = split_tpa_filename(filepath)
+    return write_np2parquet(output_fp, array, timestamps, layout=layout, header=header, prefix=prefix, view=view, row_group_seconds=row_group_seconds)
+
+
+def _tpa_file2parquet_job(args):
+    return tpa_file2parquet(*args)
+
+
+def export_dir2parquet(input_dir: str, output_dir: str, layout: str = "wide", extension: str = "txt", workers: int = None, row_group_seconds: float = PARQUET_ROW_GROUP_SECONDS) -> list:
+    """
+    Export all recordings with given extension in input_dir to output_dir, one Parquet file per recording.
+    The output directory can be loaded as one table, e.g. pandas.read_parquet(output_dir).
+    Recordings are exported in parallel processes.
+
+    Parameters
+    ----------
+    input_dir : str
+        Directory with recordings.
+    output_dir : str
+        Destination directory.
+    layout : str, optional
+        "wide" or "long", see write_np2parquet().
+    extension : str, optional
+        Extension of recordings to export (case insensitive).
+    workers : int, optional
+        Number of processes, os.cpu_count() by default, 1 exports serially.
+
+    Returns
+    -------
+    list
+        Filepaths of exported files.
+    """
+    _import_pyarrow()
+    ensure_path_exists(output_dir)
+    filepaths = sorted(fp for fp in glob.glob(os.path.join(input_dir, "*"))
+                       if os.path.splitext(fp)[1][1:].lower() == extension.lower())
+    output_fps = [os.path.join(output_dir, remove_extension(os.path.basename(fp)) + ".parquet")
+                  for fp in filepaths]
+    jobs = [(fp, output_fp, layout, row_group_seconds) for fp, output_fp in zip(filepaths, output_fps)]
+    if (workers == 1) or (len(jobs) < 2):
+        list(map(_tpa_file2parquet_job, jobs))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            list(executor.map(_tpa_file2parquet_job, jobs))
+    return output_fps
+
+
+def colormap_lut(cv_colormap: int = CV_COLORMAP_JET, lut_size: int = PSEUDOCOLOR_LUT_SIZE) -> np.ndarray:
+    """
+    BGR look-up table of an OpenCV colormap, shaped [lut_size, 3].
+    OpenCV colormaps have 256 entries, larger tables are linearly interpolated.
+    """
+    import cv2
+    key = (cv_colormap, lut_size)
+    if key not in _COLORMAP_LUTS:
+        lut = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape([256, 1]), cv_colormap).reshape([256, 3])
+        if lut_size != 256:
+            positions = np.linspace(0, 255, lut_size)
+            lut = np.stack([np.rint(np.interp(positions, np.arange(256), lut[:, channel]))
+                            for channel in range(3)], axis=-1).astype(np.uint8)
+        lut.flags.writeable = False
+        _COLORMAP_LUTS[key] = lut
+    return _COLORMAP_LUTS[key]
+
+
+class Pseudocolor():
+    """
+    LUT-based pseudocoloring (heatmap) of temperature sequences shaped [frames, height, width],
+    colors are looked up with a single gather into a (preallocated) uint8 array shaped [frames, height, width, 3].
+
+    Temperature range modes:
+    - "fixed" ⟵ t_min, t_max in degrees Celsius, colors are consistent across files and chunks,
+    - "file" ⟵ min/max of each array passed (same as apply_heatmap()) unless set with fit(),
+    - "running" ⟵ range grows with every chunk processed.
+    Values outside of the range are clipped.
+
+    Attributes
+    ----------
+    cv_colormap : int
+        OpenCV colormap.
+    t_min, t_max : float
+        Current temperature range [degrees Celsius].
+    mode : str
+        "fixed", "file" or "running".
+    lut_size : int
+        Number of colors, e.g. 256 or 4096.
+    scale : float
+        Factor converting input values to degrees Celsius (e.g. 0.01 for int16 centi-degrees).
+    
+    Methods
+    -------
+    fit(data)
+        set range to min/max of an array or an iterable of chunks.
+    __call__(array, out=None)
+        pseudocolor array.
+    iter(chunks, out=None)
+        pseudocolor chunks of a stream, yields views of one reused output buffer if out is not given.
+    """
+
+    def __init__(self, cv_colormap: int = CV_COLORMAP_JET, t_min: float = None, t_max: float = None, mode: str = None, lut_size: int = PSEUDOCOLOR_LUT_SIZE, scale: float = 1.):
+        if mode is None:
+            mode = "fixed" if ((t_min is not None) and (t_max is not None)) else "file"
+        assert mode in PSEUDOCOLOR_RANGE_MODES
+        if mode == "fixed":
+            assert (t_min is not None) and (t_max is not None)
+        assert 2 <= lut_size <= np.iinfo(np.uint16).max
+        self.cv_colormap = cv_colormap
+        self.t_min, self.t_max = t_min, t_max
+        self.mode = mode
+        self.lut_size = lut_size
+        self.scale = scale
+        self.lut = colormap_lut(cv_colormap, lut_size)
+        self._fitted = (mode == "fixed")
+        self._domain_luts = {}
+        self._buffers = {}
+
+    def fit(self, data):
+        """
+        Set temperature range to min/max of data (array or iterable of arrays, e.g. iter_csv2np()).
+        """
+        t_min, t_max = None, None
+        for chunk in ([data] if isinstance(data, np.ndarray) else data):
+            if not np.size(chunk):
+                continue
+            chunk_min, chunk_max = np.nanmin(chunk), np.nanmax(chunk)
+            t_min = chunk_min if (t_min is None) else min(t_min, chunk_min)
+            t_max = chunk_max if (t_max is None) else max(t_max, chunk_max)
+        self.t_min, self.t_max = self._to_celsius(t_min), self._to_celsius(t_max)
+        self._fitted = True
+        self._domain_luts = {}
+        return self
+
+    def _to_celsius(self, value):
+        if value is None:
+            return None
+        return value if (self.scale == 1) else value * self.scale
+
+    def _update_range(self, array):
+        if not array.size:
+            return
+        if (self.mode == "file") and not self._fitted:
+            self.t_min, self.t_max = self._to_celsius(array.min()), self._to_celsius(array.max())
+            self._domain_luts = {}
+        if self.mode == "running":
+            chunk_min, chunk_max = self._to_celsius(np.nanmin(array)), self._to_celsius(np.nanmax(array))
+            if (self.t_min is None) or (chunk_min < self.t_min) or (chunk_max > self.t_max):
+                self.t_min = chunk_min if (self.t_min is None) else min(self.t_min, chunk_min)
+                self.t_max = chunk_max if (self.t_max is None) else max(self.t_max, chunk_max)
+                self._domain_luts = {}
+
+    def _buffer(self, name, shape, dtype):
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if (buffer is None) or (buffer.dtype != dtype) or (buffer.size < size):
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    def _indices(self, array, out):
+        """
+        LUT indices of array values computed into out (uint8 or uint16).
+        """
+        dtype = array.dtype if np.issubdtype(array.dtype, np.floating) else np.dtype(DTYPE)
+        t_min, t_max = dtype.type(self.t_min / self.scale), dtype.type(self.t_max / self.scale)
+        if t_max <= t_min:
+            out.fill(0)
+            return out
+        buffer = self._buffer("indices", array.shape, dtype)
+        np.subtract(array, t_min, out=buffer)
+        np.divide(buffer, t_max - t_min, out=buffer)
+        np.multiply(buffer, self.lut_size - 1, out=buffer)
+        # fmax also maps NaNs to 0
+        np.fmax(buffer, 0, out=buffer)
+        np.minimum(buffer, self.lut_size - 1, out=buffer)
+        np.copyto(out, buffer, casting="unsafe")
+        return out
+
+    def _domain_lut(self, dtype):
+        """
+        LUT over all values of a small integer dtype (e.g. int16), indexed by its unsigned view.
+        """
+        if dtype not in self._domain_luts:
+            unsigned = np.dtype("u{}".format(dtype.itemsize))
+            domain = np.arange(np.iinfo(unsigned).max + 1, dtype=unsigned).view(dtype)
+            indices = self._indices(domain, np.empty(domain.shape, dtype=np.uint16))
+            self._domain_luts[dtype] = self.lut[indices]
+        return self._domain_luts[dtype]
+
+    def indices(self, array, out=None) -> np.ndarray:
+        """
+        LUT indices (palette indices) of array values, uint8 if lut_size is 256, uint16 otherwise.
+        """
+        array = np.asarray(array)
+        if out is None:
+            out = np.empty(array.shape, dtype=np.uint8 if (self.lut_size <= 256) else np.uint16)
+        self._update_range(array)
+        if not array.size:
+            return out
+        return self._indices(array, out)
+
+    def __call__(self, array, out=None) -> np.ndarray:
+        """
+        Pseudocolor array shaped [frames, height, width].
+
+        Parameters
+        ----------
+        array : np.array
+            Temperature sequence (float or integer).
+        out : np.array, optional
+            Preallocated uint8 output shaped [frames, height, width, 3].
+
+        Returns
+        -------
+        np.array
+            (frames, height, width, channels)
+        """
+        import cv2
+        array = np.asarray(array)
+        if out is None:
+            out = np.empty([*array.shape, 3], dtype=np.uint8)
+        assert out.shape == (*array.shape, 3) and (out.dtype == np.uint8)
+        self._update_range(array)
+        if not array.size:
+            return out
+        if np.issubdtype(array.dtype, np.integer) and (array.dtype.itemsize <= 2):
+            lut = self._domain_lut(array.dtype)
+            indices = array.view("u{}".format(array.dtype.itemsize))
+        elif self.lut_size == 256:
+            # same gather, OpenCV does it faster for uint8 indices
+            indices = self._indices(array, self._buffer("lut_indices", array.shape, np.uint8))
+            cv2.applyColorMap(indices.reshape([-1, 1]), self.lut.reshape([256, 1, 3]), dst=out.reshape([-1, 1, 3]))
+            return out
+        else:
+            lut = self.lut
+            indices = self._indices(array, self._buffer("lut_indices", array.shape, np.uint16))
+        np.take(lut, indices, axis=0, out=out)
+        return out
+
+    def iter(self, chunks, out=None):
+        """
+        Pseudocolor chunks of a stream (e.g. iter_csv2np() frames), 
+        "file" mode requires the range to be set with fit() first.
+
+        Parameters
+        ----------
+        chunks : iterable
+            Arrays shaped [frames, height, width].
+        out : np.array, optional
+            Preallocated uint8 output shaped [max_frames, height, width, 3], 
+            internal buffer is reused if not given. Consume (copy) each chunk before requesting the next one.
+
+        Yields
+        ------
+        np.array
+            (frames, height, width, channels), a view of the output buffer.
+        """
+        if (self.mode == "file") and not self._fitted:
+            raise ValueError(
+                "Set the temperature range with fit() before streaming in 'file' mode, or use 'fixed' or 'running' mode")
+        for chunk in chunks:
+            chunk = np.asarray(chunk)
+            if out is None:
+                chunk_out = self._buffer("out", [*chunk.shape, 3], np.uint8)
+            else:
+                chunk_out = out[:len(chunk)]
+            yield self(chunk, out=chunk_out)
+
+
+def apply_heatmap(array, cv_colormap: int = CV_COLORMAP_JET) -> np.ndarray:
+    """
+    Applies pseudocoloring (heatmap) to a sequence of thermal distribution. Same as np2pc().
+    np2pc() is preffered. Colors are normalized to min/max of the array, see Pseudocolor for fixed and running ranges.
+
+    Parameters
+    ----------
+    array : np.array
+         (frames, height, width)
+    cv_colormap : int, optional
+
+    Returns
     -------
     np.array
          (frames, height, width, channels)
     """
-    min, max = array.min(), array.max()
-    shape = array.shape
-    array_normalized = (255 * ((array - min) / (max - min))).astype(np.uint8)
-    heatmap_flat = cv2.applyColorMap(array_normalized.flatten(), cv_colormap)
-    return heatmap_flat.reshape([shape[0], shape[1], shape[2], 3])
+    return Pseudocolor(cv_colormap)(array)
 
 
-def np2pc(array, cv_colormap: int = cv2.COLORMAP_JET) -> np.ndarray:
+def np2pc(array, cv_colormap: int = CV_COLORMAP_JET) -> np.ndarray:
     """
     Applies pseudocoloring (heatmap) to a sequence of thermal distribution. Same as apply_heatmap().
     np2pc() is preffered.
@@ -370,71 +2193,431 @@ def save_frames(array, dir_name: str, extension: str = ".bmp") -> bool:
 
     Parameters
     ----------
-    array : np.array
-         (frames, height, width, channels)
-
-    Returns
-    -------
-    bool
-        True if success
+    array : np.array
+         (frames, height, width, channels)
+
+    Returns
+    -------
+    bool
+        True if success
+    """
+    import cv2
+    if not os.path.exists(dir_name):
+        os.mkdir(dir_name)
+    for idx, frame in enumerate(array):
+        cv2.imwrite(os.path.join(dir_name, "%d" % idx + extension), frame)
+    return True
+
+
+def flatten_frames(array):
+    """
+    Flattens array of shape [frames, height, width] into array of shape [frames, height*width]
+
+    Parameters
+    ----------
+    array : np.array
+         (frames, height, width)
+
+    Returns
+    -------
+    np.array
+        flattened array (frames, height, width)
+    """
+    _, height, width = array.shape
+    return array.reshape((-1, height * width))
+
+
+def write_pc2gif(array, fp: str, fps=10, loop: int = 0, duration=None):
+    """
+    Converts and saves NumPy array of pseudocolored thermopile sensor array data, shaped [frames, height, width, channels], into a .gif file
+
+    Parameters
+    ----------
+    array : np.array
+        Pseudocolored data (frames, height, width, channels).
+    fp : str
+        The filepath to write to.
+    fps : float, optional
+        Default 10, approx. equal to a typical thermopile sensor array FPS value.
+    loop : int, optional
+        The number of iterations. Default 0 (meaning loop indefinitely).
+    duration : float, list, optional
+        The duration (in seconds) of each frame. Either specify one value
+        that is used for all frames, or one value for each frame.
+        Note that in the GIF format the duration/delay is expressed in
+        hundredths of a second, which limits the precision of the duration. (from imageio doc)
+
+    Returns
+    -------
+    bool
+        True if success.
+    """
+    import imageio
+    ensure_parent_exists(fp)
+    if not duration:
+        duration = 1 / fps
+    with imageio.get_writer(fp, mode="I", duration=duration, loop=loop) as writer:
+        for frame in array:
+            writer.append_data(frame[:, :, ::-1])
+    return True
+
+
+def write_np2gif(fp: str, frames, fps=10, loop: int = 0, duration=None, cv_colormap: int = CV_COLORMAP_JET, t_min: float = None, t_max: float = None, pseudocolor=None) -> bool:
+    """
+    Pseudocolors and saves a temperature sequence as a .gif file with the colormap as a fixed global palette.
+    Frames are encoded as palette indices directly, without color quantization. 
+    Colors match np2pc() if the temperature range is not given.
+
+    Parameters
+    ----------
+    fp : str
+        The filepath to write to.
+    frames : np.array, iterable
+        Temperature sequence (frames, height, width) or an iterable of such chunks or of single frames (height, width).
+        For iterables, the temperature range (t_min, t_max or pseudocolor) is required.
+    fps : float, optional
+        Default 10, approx. equal to a typical thermopile sensor array FPS value.
+    loop : int, optional
+        The number of iterations. Default 0 (meaning loop indefinitely).
+    duration : float, list, optional
+        The duration (in seconds) of each frame, see timestamps2frame_durations(). Either specify one value
+        that is used for all frames, or one value for each frame.
+        Note that in the GIF format the duration/delay is expressed in hundredths of a second.
+    cv_colormap : int, optional
+    t_min, t_max : float, optional
+        Fixed temperature range.
+    pseudocolor : Pseudocolor, optional
+        Use a configured Pseudocolor instance (256 colors) instead of cv_colormap, t_min and t_max.
+
+    Returns
+    -------
+    bool
+        True if success.
+    """
+    from PIL import Image
+    if pseudocolor is None:
+        pseudocolor = Pseudocolor(cv_colormap, t_min=t_min, t_max=t_max)
+    assert pseudocolor.lut_size == 256
+    if isinstance(frames, np.ndarray):
+        if (pseudocolor.mode == "file") and not pseudocolor._fitted:
+            pseudocolor.fit(frames)
+        frames = [frames]
+    elif (pseudocolor.mode == "file") and not pseudocolor._fitted:
+        raise ValueError("Temperature range is required to write a gif from an iterable")
+    if not duration:
+        duration = 1 / fps
+    if np.ndim(duration):
+        duration = [int(round(1000 * d)) for d in duration]
+    else:
+        duration = int(round(1000 * duration))
+    palette = pseudocolor.lut[:, ::-1].reshape(-1).tolist()
+
+    def images():
+        for chunk in frames:
+            chunk = np.asarray(chunk)
+            if chunk.ndim == 2:
+                chunk = chunk[np.newaxis]
+            for frame in pseudocolor.indices(chunk):
+                image = Image.fromarray(frame)
+                image.putpalette(palette)
+                yield image
+    images = images()
+    first = next(images, None)
+    if first is None:
+        return False
+    ensure_parent_exists(fp)
+    first.save(fp, format="GIF", save_all=True, append_images=images,
+               duration=duration, loop=loop, optimize=False)
+    return True
+
+
+def upscale_nearest(array, scale: int) -> np.ndarray:
+    """
+    Nearest-neighbour upscaling of a sequence (frames, height, width[, channels]) by an integer factor.
+    """
+    # repeating columns first keeps the second repeat a copy of contiguous rows
+    return np.repeat(np.repeat(array, scale, axis=2), scale, axis=1)
+
+
+def _draw_video_overlay(frame, lines_top: list, lines_bottom: list):
+    """
+    Burn in text lines (black on white boxes) at the top and at the bottom of a BGR frame.
+    """
+    import cv2
+    height, width = frame.shape[:2]
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = max(width / 640, 0.3)
+    thickness = max(int(round(font_scale * 1.5)), 1)
+    (_, text_height), baseline = cv2.getTextSize("0", font, font_scale, thickness)
+    line_height = text_height + baseline + 4
+    positions = [(line, (idx + 1) * line_height - baseline - 2) for idx, line in enumerate(lines_top)]
+    positions += [(line, height - (len(lines_bottom) - idx - 1) * line_height - baseline - 2)
+                  for idx, line in enumerate(lines_bottom)]
+    for text, y in positions:
+        (text_width, _), _ = cv2.getTextSize(text, font, font_scale, thickness)
+        x = max((width - text_width) // 2, 0)
+        cv2.rectangle(frame, (x - 2, y - text_height - 2), (x + text_width + 2, y + baseline), (255, 255, 255), -1)
+        cv2.putText(frame, text, (x, y), font, font_scale, (0, 0, 0), thickness, cv2.LINE_AA)
+    return frame
+
+
+def write_np2video(fp: str, arrays, timestamps: list = None, fps: float = None, scale: int = VIDEO_SCALE, title: str = None, overlay: bool = True, cv_colormap: int = CV_COLORMAP_JET, t_min: float = None, t_max: float = None, fourcc: str = None, pseudocolor=None) -> bool:
+    """
+    Pseudocolors, upscales (nearest-neighbour) and saves a temperature sequence as a video file (.avi, .mp4) with cv2.VideoWriter.
+    Frame index and timestamp (and optionally a title) are burnt in.
+
+    Parameters
+    ----------
+    fp : str
+        The filepath to write to, extension selects the codec (see VIDEO_FOURCC_DICT).
+    arrays : np.array, list
+        Temperature sequence (frames, height, width) or a list of aligned sequences (views) shown side by side.
+    timestamps : list, optional
+        Timestamps of frames, used in the overlay and to deduce fps.
+    fps : float, optional
+        Frame rate, by default deduced from timestamps (10 if not given).
+    scale : int, optional
+        Upscaling factor, default VIDEO_SCALE.
+    title : str, optional
+        Text shown at the top, e.g. recording prefix.
+    overlay : bool, optional
+        If False, no text is burnt in.
+    cv_colormap : int, optional
+    t_min, t_max : float, optional
+        Fixed temperature range, by default min/max of the whole sequence (same as np2pc()).
+    fourcc : str, optional
+        FourCC code overriding VIDEO_FOURCC_DICT.
+    pseudocolor : Pseudocolor, optional
+        Use a configured Pseudocolor instance (e.g. with scale for raw integers) instead of cv_colormap, t_min and t_max.
+
+    Returns
+    -------
+    bool
+        True if success.
+    """
+    import cv2
+    if not isinstance(arrays, np.ndarray):
+        assert len(set(len(array) for array in arrays)) == 1, "Views are not aligned"
+        arrays = np.concatenate(arrays, axis=2)
+    frames_n, height, width = arrays.shape
+    if timestamps is not None:
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+    if not fps:
+        fps = 10
+        if (timestamps is not None) and (len(timestamps) > 1) and (timestamps[-1] > timestamps[0]):
+            fps = (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+    if not fourcc:
+        fourcc = VIDEO_FOURCC_DICT[os.path.splitext(fp)[1][1:].lower()]
+    # yuv420p requires even frame dimensions
+    video_height, video_width = 2 * ((height * scale + 1) // 2), 2 * ((width * scale + 1) // 2)
+    if pseudocolor is None:
+        pseudocolor = Pseudocolor(cv_colormap, t_min=t_min, t_max=t_max)
+    if (pseudocolor.mode == "file") and not pseudocolor._fitted:
+        pseudocolor.fit(arrays)
+    ensure_parent_exists(fp)
+    writer = cv2.VideoWriter(fp, cv2.VideoWriter_fourcc(*fourcc), fps, (video_width, video_height))
+    if not writer.isOpened():
+        raise IOError("Cannot open video writer for {} (fourcc {})".format(fp, fourcc))
+    frame = np.zeros([video_height, video_width, 3], dtype=np.uint8)
+    chunks = (arrays[chunk_start:chunk_start+VIDEO_CHUNK_FRAMES]
+              for chunk_start in range(0, frames_n, VIDEO_CHUNK_FRAMES))
+    frame_idx = 0
+    try:
+        for pc in pseudocolor.iter(chunks):
+            for upscaled_frame in upscale_nearest(pc, scale):
+                frame[:height * scale, :width * scale] = upscaled_frame
+                if overlay:
+                    text = "{}".format(frame_idx) if (timestamps is None) else "{} | t: {:.3f}".format(
+                        frame_idx, timestamps[frame_idx])
+                    _draw_video_overlay(frame, [title] if title else [], [text])
+                writer.write(frame)
+                frame_idx += 1
+    finally:
+        writer.release()
+    return True
+
+
+def tpa_file2video(filepaths, output_fp: str, crop: int = None, **kwargs) -> bool:
+    """
+    Export a recording (or a list of aligned recordings of different views) to a video file, see write_np2video().
+    The recording prefix is used as title by default.
+
+    Parameters
+    ----------
+    filepaths : str, list
+        Filepath or list of filepaths (views).
+    output_fp : str
+        The filepath to write to.
+    crop : int, optional
+        Crop a (crop, crop) patch from the center of each view, see crop_center().
     """
-    if not os.path.exists(dir_name):
-        os.mkdir(dir_name)
-    for idx, frame in enumerate(array):
-        cv2.imwrite(os.path.join(dir_name, "%d" % idx + extension), frame)
-    return True
+    if isinstance(filepaths, str):
+        filepaths = [filepaths]
+    samples = [read_tpa_file(filepath) for filepath in filepaths]
+    assert len(set(len(sample[1]) for sample in samples)) == 1, "Views are not aligned"
+    arrays = [sample[0] for sample in samples]
+    if crop:
+        arrays = [crop_center(array, crop, crop) for array in arrays]
+    timestamps = np.mean([np.asarray(sample[1], dtype=np.float64) for sample in samples], axis=0)
+    if "title" not in kwargs:
+        kwargs["title"] = split_tpa_filename(filepaths[0])[0].rstrip("_")
+    return write_np2video(output_fp, arrays, timestamps, **kwargs)
 
 
-def flatten_frames(array):
+def _tpa_file2video_job(job):
+    filepaths, output_fp, kwargs = job
+    return tpa_file2video(filepaths, output_fp, **kwargs)
+
+
+def tpa_files2videos(filepaths_list: list, output_fps: list = None, extension: str = "mp4", workers: int = None, **kwargs) -> list:
     """
-    Flattens array of shape [frames, height, width] into array of shape [frames, height*width]
+    Export recordings to video files in parallel processes, see tpa_file2video().
 
     Parameters
     ----------
-    array : np.array
-         (frames, height, width)
+    filepaths_list : list
+        Filepaths of recordings, an element can be a list of filepaths of aligned views.
+    output_fps : list, optional
+        Destination filepaths, by default the recording filepath (first view) with the extension changed.
+    extension : str, optional
+        Extension of default destination filepaths, "mp4" or "avi".
+    workers : int, optional
+        Number of processes, os.cpu_count() by default, 1 exports serially.
+    kwargs
+        Passed to tpa_file2video() and write_np2video().
 
     Returns
     -------
-    np.array
-        flattened array (frames, height, width)
+    list
+        Filepaths of written videos.
     """
-    _, height, width = array.shape
-    return array.reshape((-1, height * width))
+    if output_fps is None:
+        output_fps = [os.path.splitext(filepaths if isinstance(filepaths, str) else filepaths[0])[0] + "." + extension
+                      for filepaths in filepaths_list]
+    jobs = [(filepaths, output_fp, kwargs) for filepaths, output_fp in zip(filepaths_list, output_fps)]
+    if (workers == 1) or (len(jobs) < 2):
+        list(map(_tpa_file2video_job, jobs))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            list(executor.map(_tpa_file2video_job, jobs))
+    return output_fps
 
 
-def write_pc2gif(array, fp: str, fps=10, loop: int = 0, duration=None):
+def conversion_output_filepath(filepath: str, output_format: str, output_dir: str = None) -> str:
     """
-    Converts and saves NumPy array of pseudocolored thermopile sensor array data, shaped [frames, height, width, channels], into a .gif file
+    Destination of a recording converted to output_format, see CONVERSION_FORMATS_DICT.
+    "frames" is a directory of bitmaps named after the recording.
+    """
+    parent, fn = os.path.split(filepath)
+    return os.path.join(output_dir or parent, remove_extension(fn) + CONVERSION_FORMATS_DICT[output_format])
+
+
+def _is_up_to_date(output_fp: str, source_mtime: float) -> bool:
+    return os.path.exists(output_fp) and (os.path.getmtime(output_fp) >= source_mtime)
+
+
+def _write_conversion(output_format: str, output_fp: str, filepath: str, array, timestamps, header, crop, bins):
+    if output_format in ["gif", "mp4", "avi", "frames", "bmp"]:
+        array = crop_center(array, crop, crop) if crop else array
+    if output_format == "csv":
+        return write_np2csv(output_fp, array, timestamps)
+    if output_format == "gif":
+        return write_np2gif(output_fp, array, duration=timestamps2frame_durations(timestamps))
+    if output_format in ["mp4", "avi"]:
+        return write_np2video(output_fp, [array], timestamps, title=split_tpa_filename(filepath)[0].rstrip("_"))
+    if output_format == "frames":
+        return save_frames(np2pc(array), output_fp)
+    if output_format == "bmp":
+        import cv2
+        # colors normalized to the whole recording, same as frame 0 of "frames"
+        return cv2.imwrite(output_fp, Pseudocolor().fit(array)(array[:1])[0])
+    if output_format == "histogram":
+        return save_temperature_histogram(array, fp=output_fp, bins=bins, mu=True, sigma=True)
+    if output_format == "parquet":
+        prefix, view = split_tpa_filename(filepath)
+        return write_np2parquet(output_fp, array, timestamps, header=header, prefix=prefix, view=view)
+    return write_tpa_file(output_fp, array, timestamps, header=header if (get_reader(output_fp) in HEADER_READERS) else None)
+
+
+def _convert_tpa_file_job(job):
+    filepath, output_formats, output_dir, overwrite, crop, bins = job
+    report = {"converted": [], "skipped": [], "failed": []}
+    try:
+        source_mtime = os.path.getmtime(filepath)
+        pending = []
+        for output_format in output_formats:
+            output_fp = conversion_output_filepath(filepath, output_format, output_dir)
+            if os.path.abspath(output_fp) == os.path.abspath(filepath):
+                continue
+            if (not overwrite) and _is_up_to_date(output_fp, source_mtime):
+                report["skipped"].append((filepath, output_format, output_fp))
+            else:
+                pending.append((output_format, output_fp))
+        if not pending:
+            return report
+        # the source is parsed once for all outputs
+        array, timestamps = read_tpa_file(filepath)
+        header = read_tpa_header(filepath) if (get_reader(filepath) in HEADER_READERS) else None
+    except Exception as e:
+        report["failed"].append({"filepath": filepath, "format": None, "error": repr(e)})
+        return report
+    for output_format, output_fp in pending:
+        try:
+            if output_format == "frames" and overwrite and os.path.isdir(output_fp):
+                shutil.rmtree(output_fp)
+            _write_conversion(output_format, output_fp, filepath, array, timestamps, header, crop, bins)
+            report["converted"].append((filepath, output_format, output_fp))
+        except Exception as e:
+            report["failed"].append({"filepath": filepath, "format": output_format, "error": repr(e)})
+    return report
+
+
+def convert_tpa_files(filepaths: list, output_formats: list, workers: int = None, overwrite: bool = False, output_dir: str = None, crop: int = None, bins=None) -> dict:
+    """
+    Convert recordings to several formats at once, see CONVERSION_FORMATS. 
+    Each recording is parsed once and written to all requested formats; recordings are converted in parallel processes.
+    Outputs newer than their source are skipped before parsing. Errors are isolated per recording and format.
 
     Parameters
     ----------
-    array : np.array
-        Pseudocolored data (frames, height, width, channels).
-    fp : str
-        The filepath to write to.
-    fps : float, optional
-        Default 10, approx. equal to a typical thermopile sensor array FPS value.
-    loop : int, optional
-        The number of iterations. Default 0 (meaning loop indefinitely).
-    duration : float, list, optional
-        The duration (in seconds) of each frame. Either specify one value
-        that is used for all frames, or one value for each frame.
-        Note that in the GIF format the duration/delay is expressed in
-        hundredths of a second, which limits the precision of the duration. (from imageio doc)
+    filepaths : list
+        Recordings of any supported extension.
+    output_formats : list
+        Formats from CONVERSION_FORMATS, e.g. ["csv", "gif", "npz"].
+    workers : int, optional
+        Number of processes, os.cpu_count() by default, 1 converts serially.
+    overwrite : bool, optional
+        If True outputs are written even if up to date.
+    output_dir : str, optional
+        Destination directory, the directory of each recording by default.
+    crop : int, optional
+        Crop a (crop, crop) patch from the center for gif, videos, frames and bmp (csv and binary formats are never cropped).
+    bins : np.array, optional
+        Bins of "histogram", see save_temperature_histogram().
 
     Returns
     -------
-    bool
-        True if success.
+    dict
+        Summary: "converted" and "skipped" are lists of (filepath, format, output filepath), 
+        "failed" a list of dicts with filepath, format (None if the recording could not be read) and error.
     """
-    ensure_parent_exists(fp)
-    if not duration:
-        duration = 1 / fps
-    with imageio.get_writer(fp, mode="I", duration=duration, loop=loop) as writer:
-        for frame in array:
-            writer.append_data(frame[:, :, ::-1])
-    return True
+    for output_format in output_formats:
+        if output_format not in CONVERSION_FORMATS:
+            raise ValueError("Unsupported conversion format: {}".format(output_format))
+    if output_dir:
+        ensure_path_exists(output_dir)
+    crop = None if (crop == -1) else crop
+    jobs = [(fp, list(output_formats), output_dir, overwrite, crop, bins) for fp in filepaths]
+    if (workers == 1) or (len(jobs) < 2):
+        reports = list(map(_convert_tpa_file_job, jobs))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            reports = list(executor.map(_convert_tpa_file_job, jobs))
+    summary = {"converted": [], "skipped": [], "failed": []}
+    for report in reports:
+        for key in summary:
+            summary[key] += report[key]
+    return summary
 
 
 def timestamps2frame_durations(timestamps: list, last_frame_duration=None) -> list:
@@ -520,15 +2703,90 @@ def crop_center(array, crop_height=None, crop_width=None):
     return array[:, start_y:start_y+crop_height, start_x:start_x+crop_width]
 
 
-def match_timesteps(*timestamps_lists):
+def match_nearest(reference, timestamps, chunk_size: int = None) -> np.ndarray:
+    """
+    Indices of timestamps nearest to each reference timestamp, O((N + M) log M).
+    Gives the same result as argmin over the full distance matrix (scipy cdist): 
+    timestamps do not have to be sorted and ties resolve to the lowest index.
+
+    Parameters
+    ---------
+    reference : list, np.array
+        Timestamps to match (N).
+    timestamps : list, np.array
+        Timestamps to search (M).
+    chunk_size : int, optional
+        If given, reference is processed in chunks of chunk_size to bound temporary memory.
+
+    Returns
+    -------
+    np.array
+        Indices of timestamps, shape (N,).
+    """
+    reference = np.asarray(reference, dtype=np.float64).reshape(-1)
+    timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+    indices = np.zeros(len(reference), dtype=np.int64)
+    if not (len(reference) and len(timestamps)):
+        if len(reference):
+            raise ValueError("Cannot match timestamps to an empty sequence")
+        return indices
+    nans = np.flatnonzero(np.isnan(timestamps))
+    if len(nans):
+        # argmin returns the first NaN distance
+        indices[:] = nans[0]
+        with np.errstate(invalid="ignore"):
+            for row in np.flatnonzero(~np.isfinite(reference)):
+                indices[row] = np.abs(reference[row] - timestamps).argmin()
+        return indices
+    order = np.argsort(timestamps, kind="stable")
+    sorted_ts = timestamps[order]
+    positions = np.arange(len(sorted_ts))
+    # equal values form runs, the first element of a run has the lowest original index (stable sort)
+    run_first = np.r_[True, sorted_ts[1:] != sorted_ts[:-1]]
+    run_start = np.maximum.accumulate(np.where(run_first, positions, 0))
+    run_last = np.r_[sorted_ts[1:] != sorted_ts[:-1], True]
+    run_stop = np.minimum.accumulate(np.where(run_last, positions + 1, len(sorted_ts))[::-1])[::-1]
+    chunk_size = chunk_size if chunk_size else len(reference)
+    # inf - inf is NaN, same as in the distance matrix
+    with np.errstate(invalid="ignore"):
+        for chunk_start in range(0, len(reference), chunk_size):
+            query = reference[chunk_start:chunk_start+chunk_size]
+            right = np.searchsorted(sorted_ts, query, side="left")
+            left = np.maximum(right - 1, 0)
+            right = np.minimum(right, len(sorted_ts) - 1)
+            left_distance = np.abs(query - sorted_ts[left])
+            right_distance = np.abs(query - sorted_ts[right])
+            left_idx = order[run_start[left]]
+            right_idx = order[run_start[right]]
+            best_distance = np.minimum(left_distance, right_distance)
+            result = np.where(left_distance < right_distance, left_idx,
+                              np.where(right_distance < left_distance, right_idx, np.minimum(left_idx, right_idx)))
+            # rows that need the full comparison: non-finite queries
+            # and rounding ties with values beyond the neighbouring runs
+            outer_left = run_start[left] - 1
+            outer_right = run_stop[right]
+            exhaustive = ~np.isfinite(query)
+            exhaustive |= (outer_left >= 0) & (np.abs(query - sorted_ts[np.maximum(outer_left, 0)]) == best_distance)
+            exhaustive |= (outer_right < len(sorted_ts)) & \
+                (np.abs(query - sorted_ts[np.minimum(outer_right, len(sorted_ts) - 1)]) == best_distance)
+            for row in np.flatnonzero(exhaustive):
+                result[row] = np.abs(query[row] - timestamps).argmin()
+            indices[chunk_start:chunk_start+len(query)] = result
+    return indices
+
+
+def match_timesteps(*timestamps_lists, chunk_size: int = None):
     """
     Aligns timesteps of given timestamps.
+    Each timestep of the shortest list is matched with the nearest timestep of other lists, see match_nearest().
 
 
     Parameters
     ---------
     *timestamps_list : list, np.array
         lists-like data containing timestamps 
+    chunk_size : int, optional
+        Process timestamps in chunks of chunk_size to bound memory, see match_nearest().
     Returns
     -------
     list
@@ -541,7 +2799,7 @@ def match_timesteps(*timestamps_lists):
         idx1, idx2, idx3 = match_timesteps(ts1, ts2, ts3)
     now ts1[idx1], ts2[idx2] and ts3[idx3] will be aligned
     """
-    ts_list = [np.array(ts).reshape(-1, 1) for ts in timestamps_lists]
+    ts_list = [np.asarray(ts, dtype=np.float64).reshape(-1) for ts in timestamps_lists]
     min_len_idx = np.array([len(ts) for ts in ts_list]).argmin()
     min_len_ts = ts_list[min_len_idx]
     indices_list = [None] * len(ts_list)
@@ -549,14 +2807,31 @@ def match_timesteps(*timestamps_lists):
         if (idx == min_len_idx):
             indices_list[idx] = list(range(len(min_len_ts)))
         else:
-            indices_list[idx] = list(cdist(min_len_ts, ts).argmin(axis=-1))
+            indices_list[idx] = list(match_nearest(min_len_ts, ts, chunk_size=chunk_size))
     return indices_list
 
 
+def timesteps_max_errors(*timestamps_lists) -> list:
+    """
+    For each list, the maximum absolute error of matching it (nearest timestep, see match_nearest()) to all other lists.
+    """
+    ts_list = [np.asarray(ts, dtype=np.float64).reshape(-1) for ts in timestamps_lists]
+    max_error_list = [0] * len(ts_list)
+    for idx, ts in enumerate(ts_list):
+        for idx2, ts2 in enumerate(ts_list):
+            if (idx == idx2) or not len(ts):
+                continue
+            max_error = np.abs(ts - ts2[match_nearest(ts, ts2)]).max()
+            if (max_error > max_error_list[idx]):
+                max_error_list[idx] = max_error
+    return max_error_list
+
+
 def match_timesteps2(*timestamps_lists):
-    #XXX Not finished
     """
     Aligns timesteps of given timestamps. 
+    Unlike match_timesteps(), the reference is the list with the lowest maximum matching error to other lists 
+    (see timesteps_max_errors()), each of its timesteps is matched with the nearest timestep of other lists.
 
 
     Parameters
@@ -572,34 +2847,420 @@ def match_timesteps2(*timestamps_lists):
         ts1 = [1, 2, 3, 4, 5]
         ts2 = [1.1, 2.1, 2.9, 3.6, 5.1, 6, 6.1]
         ts3 = [0.9, 1.2, 2, 3, 4.1, 4.2, 4.3, 4.9]
-        idx1, idx2, idx3 = match_timesteps(ts1, ts2, ts3)
+        idx1, idx2, idx3 = match_timesteps2(ts1, ts2, ts3)
     now ts1[idx1], ts2[idx2] and ts3[idx3] will be aligned
     """
-    ts_list = [np.array(ts).reshape(-1, 1) for ts in timestamps_lists]
-    #min_len_idx = np.array([len(ts) for ts in ts_list]).argmin()
-    #min_len_ts = ts_list[min_len_idx]
-    max_error_list = [0] * len(ts_list)
-    for idx, ts in enumerate(ts_list):
-        for idx2, ts2 in enumerate(ts_list):
-            if (idx == idx2):
-                continue
-            tmp_indexes = list(cdist(ts, ts2).argmin(axis=-1))
-            diff = ts - ts2[tmp_indexes]
-            max_error = np.abs(np.max(diff))
-            current_max = max_error_list[idx]
-            if (max_error > current_max):
-                max_error_list[idx] = max_error
-    min_error_idx = np.argmin(max_error_list)
-    indices_list = [None] * len(ts_list)
+    ts_list = [np.asarray(ts, dtype=np.float64).reshape(-1) for ts in timestamps_lists]
+    min_error_idx = int(np.argmin(timesteps_max_errors(*ts_list)))
     min_error_ts = ts_list[min_error_idx]
+    indices_list = [None] * len(ts_list)
     for idx, ts in enumerate(ts_list):
         if (idx == min_error_idx):
             indices_list[idx] = list(range(len(min_error_ts)))
         else:
-            indices_list[idx] = list(cdist(min_error_ts, ts).argmin(axis=-1))
+            indices_list[idx] = list(match_nearest(min_error_ts, ts))
+    return indices_list
+
+
+def _match_monotonic_band(reference, timestamps, nearest, band: int, max_error: float = None):
+    """
+    Banded dynamic program: strictly increasing indices j_0 < j_1 < ... of timestamps 
+    minimizing sum |reference[i] - timestamps[j_i]|, j_i within band of the nearest timestep.
+    Pairs with error above max_error are not allowed. Returns None if no matching exists in the band.
+    """
+    n, m = len(reference), len(timestamps)
+    rows = np.arange(n)
+    lo = np.maximum(nearest - band, rows)
+    hi = np.minimum(nearest + band, m - n + rows)
+    if (lo > hi).any():
+        return None
+    costs, backpointers = [], []
+    previous_cost, previous_lo = None, None
+    for i in range(n):
+        js = np.arange(lo[i], hi[i] + 1)
+        error = np.abs(reference[i] - timestamps[js])
+        if max_error is not None:
+            error[error > max_error] = np.inf
+        if i == 0:
+            cost = error
+            backpointer = np.full(len(js), -1)
+        else:
+            # best predecessor j' < j: running minimum over the previous row
+            running_min = np.minimum.accumulate(previous_cost)
+            new_min = previous_cost < np.r_[np.inf, running_min[:-1]]
+            running_argmin = np.maximum.accumulate(np.where(new_min, np.arange(len(previous_cost)), 0))
+            k = js - 1 - previous_lo
+            valid = k >= 0
+            k = np.clip(k, 0, len(previous_cost) - 1)
+            cost = np.where(valid, error + running_min[k], np.inf)
+            backpointer = previous_lo + running_argmin[k]
+        if not np.isfinite(cost).any():
+            return None
+        costs.append(cost)
+        backpointers.append(backpointer)
+        previous_cost, previous_lo = cost, lo[i]
+    indices = np.empty(n, dtype=np.int64)
+    indices[-1] = lo[-1] + int(np.argmin(costs[-1]))
+    for i in range(n - 1, 0, -1):
+        indices[i - 1] = backpointers[i][indices[i] - lo[i]]
+    return indices
+
+
+def _min_max_error(reference, timestamps, candidates):
+    """
+    Lowest threshold from sorted candidates that allows a strictly increasing one-to-one matching 
+    with all errors below it (greedy earliest matching is optimal for feasibility).
+    """
+    reference, timestamps = reference.tolist(), timestamps.tolist()
+
+    def feasible(threshold):
+        j = 0
+        for t in reference:
+            j = bisect.bisect_left(timestamps, t - threshold, j)
+            if (j == len(timestamps)) or (timestamps[j] - t > threshold):
+                return False
+            j += 1
+        return True
+    low, high = 0, len(candidates) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if feasible(candidates[middle]):
+            high = middle
+        else:
+            low = middle + 1
+    return candidates[low]
+
+
+def match_monotonic(reference, timestamps, criterion: str = "sum", band: int = MONOTONIC_MATCHING_BAND) -> np.ndarray:
+    """
+    Monotonic one-to-one matching of sorted timestamps: every reference timestep gets a different timestep,
+    indices are strictly increasing, so no frames are duplicated. 
+    Solved with a dynamic program limited to a band around the nearest timesteps (near-linear cost), 
+    the band is widened automatically only if no matching exists inside it.
+    The result is optimal among matchings that stay within the band, i.e. each reference timestep is matched
+    at most band frames away from its nearest timestep; a matching that needs larger shifts (e.g. long runs of
+    dropped frames in the reference) may be missed, so set band to at least the longest expected drift
+    in frames between the sequences (band >= M covers all matchings, at quadratic cost).
+
+    Parameters
+    ---------
+    reference : list, np.array
+        Sorted timestamps to match (N).
+    timestamps : list, np.array
+        Sorted timestamps to search (M >= N).
+    criterion : str, optional
+        "sum" minimizes total absolute time error, 
+        "max" minimizes maximum absolute time error (ties broken by total error), both within the band.
+    band : int, optional
+        Half-width of the band around the nearest timesteps, in frames.
+
+    Returns
+    -------
+    np.array
+        Indices of timestamps, shape (N,).
+    """
+    assert criterion in MONOTONIC_MATCHING_CRITERIA
+    reference = np.asarray(reference, dtype=np.float64).reshape(-1)
+    timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+    n, m = len(reference), len(timestamps)
+    if n > m:
+        raise ValueError("One-to-one matching requires the reference to be the shortest sequence")
+    if (np.diff(reference) < 0).any() or (np.diff(timestamps) < 0).any():
+        raise ValueError("Monotonic matching requires sorted timestamps")
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    nearest = match_nearest(reference, timestamps)
+    max_error = None
+    if criterion == "max":
+        # candidate thresholds: errors of pairs within the band of each reference timestep
+        offsets = np.arange(-band, band + 1)
+        pairs = np.clip(nearest[:, np.newaxis] + offsets, 0, m - 1)
+        candidates = np.unique(np.abs(reference[:, np.newaxis] - timestamps[pairs]))
+        candidates = np.r_[candidates, np.abs(reference[:, np.newaxis] - timestamps[[0, -1]]).max()]
+        max_error = _min_max_error(reference, timestamps, candidates)
+    while True:
+        indices = _match_monotonic_band(reference, timestamps, nearest, band, max_error)
+        if (indices is not None) or (band >= m):
+            break
+        band = max(2 * band, 1)
+    if indices is None:
+        raise ValueError("No monotonic matching found")
+    return indices
+
+
+def match_timesteps_monotonic(*timestamps_lists, criterion: str = "sum", band: int = MONOTONIC_MATCHING_BAND):
+    """
+    Aligns timesteps of given timestamps without duplicating frames. 
+    The reference is the shortest list (if several, the one with the lowest maximum matching error, see match_timesteps2()),
+    other lists are matched one-to-one and monotonically, see match_monotonic().
+
+
+    Parameters
+    ---------
+    *timestamps_list : list, np.array
+        lists-like data containing sorted timestamps 
+    criterion : str, optional
+        "sum" (total time error) or "max" (maximum time error) minimized for each list.
+    band : int, optional
+        Half-width of the dynamic programming band, in frames, matchings are optimal only within it (see match_monotonic()).
+    Returns
+    -------
+    list
+        list of indices of timesteps corresponding to input lists so that input lists are aligned
+    """
+    ts_list = [np.asarray(ts, dtype=np.float64).reshape(-1) for ts in timestamps_lists]
+    lengths = np.array([len(ts) for ts in ts_list])
+    candidates = np.flatnonzero(lengths == lengths.min())
+    if len(candidates) > 1:
+        max_errors = timesteps_max_errors(*ts_list)
+        reference_idx = candidates[np.argmin([max_errors[idx] for idx in candidates])]
+    else:
+        reference_idx = candidates[0]
+    reference = ts_list[reference_idx]
+    indices_list = [None] * len(ts_list)
+    for idx, ts in enumerate(ts_list):
+        if (idx == reference_idx):
+            indices_list[idx] = list(range(len(reference)))
+        else:
+            indices_list[idx] = list(match_monotonic(reference, ts, criterion=criterion, band=band))
     return indices_list
 
 
+def uniform_time_grid(t_start: float, t_end: float, fps: float) -> np.ndarray:
+    """
+    Uniform timestamps t_start + k / fps within [t_start, t_end].
+
+    Parameters
+    ---------
+    t_start, t_end : float
+        Time range [s].
+    fps : float
+        Target frame rate.
+
+    Returns
+    -------
+    np.array
+        Timestamps of the grid.
+    """
+    if fps <= 0:
+        raise ValueError("fps must be positive")
+    if t_end < t_start:
+        return np.zeros(0)
+    grid = t_start + np.arange(int(np.floor((t_end - t_start) * fps)) + 2) / fps
+    return grid[grid <= t_end]
+
+
+def _interpolate_frames(array, timestamps, grid, method: str, max_gap: float, fill_value, out):
+    """
+    Interpolates array [frames, ...] sampled at sorted timestamps at grid timestamps into out [len(grid), ...].
+    Returns mask of valid grid timestamps (within timestamps and not inside a gap longer than max_gap).
+    """
+    n = len(timestamps)
+    last = max(n - 2, 0)
+    i0 = np.clip(np.searchsorted(timestamps, grid, side="right") - 1, 0, last)
+    i1 = np.minimum(i0 + 1, n - 1)
+    t0, t1 = timestamps[i0], timestamps[i1]
+    dt = t1 - t0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(dt > 0, (grid - t0) / dt, 0.)
+    valid = (grid >= timestamps[0]) & (grid <= timestamps[-1])
+    if max_gap is not None:
+        valid &= dt <= max_gap
+    expand = (slice(None),) + (np.newaxis,) * (array.ndim - 1)
+    if method == "nearest":
+        # ties pick the earlier frame, as in match_nearest()
+        out[...] = array[np.where(w > 0.5, i1, i0)]
+    elif method == "linear":
+        np.multiply(array[i0], (1 - w)[expand], out=out)
+        out += array[i1] * w[expand]
+    else:
+        # cubic Hermite spline, tangents from neighbouring frames (one-sided at edges and gaps)
+        def tangents(idx):
+            left, right = np.maximum(idx - 1, 0), np.minimum(idx + 1, n - 1)
+            if max_gap is not None:
+                left = np.where(timestamps[idx] - timestamps[left] > max_gap, idx, left)
+                right = np.where(timestamps[right] - timestamps[idx] > max_gap, idx, right)
+            span = timestamps[right] - timestamps[left]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scale = np.where(span > 0, dt / span, 0.)
+            return (array[right] - array[left]) * scale[expand]
+        w2, w3 = w * w, w * w * w
+        h00, h10 = 2 * w3 - 3 * w2 + 1, w3 - 2 * w2 + w
+        h01, h11 = -2 * w3 + 3 * w2, w3 - w2
+        np.multiply(array[i0], h00[expand], out=out)
+        out += tangents(i0) * h10[expand]
+        out += array[i1] * h01[expand]
+        out += tangents(i1) * h11[expand]
+    out[~valid] = fill_value
+    return valid
+
+
+def resample_uniform(array, timestamps, fps: float, method: str = "linear", t_start: float = None, t_end: float = None, max_gap: float = RESAMPLING_MAX_GAP, fill_value=np.nan, chunk_size: int = RESAMPLING_CHUNK_FRAMES, scale: float = 1.):
+    """
+    Resamples a sequence onto a uniform time grid at a target frame rate, vectorized over [frames, height, width].
+    Frames of the grid outside of the recorded range or inside a gap between recorded frames longer than max_gap 
+    are marked invalid and filled with fill_value.
+
+    Parameters
+    ---------
+    array : np.array
+        Sequence [frames, height, width].
+    timestamps : list, np.array
+        Sorted timestamps of the frames.
+    fps : float
+        Target frame rate.
+    method : str, optional
+        "nearest", "linear" or "cubic" (cubic Hermite spline), see RESAMPLING_METHODS.
+    t_start, t_end : float, optional
+        Time range of the grid, defaults to the first and the last timestamp.
+    max_gap : float, optional
+        Longest interval between recorded frames [s] to interpolate over, None for no limit.
+    fill_value : float, optional
+        Value of invalid frames.
+    chunk_size : int, optional
+        Number of grid frames interpolated at once (bounds temporary memory).
+    scale : float, optional
+        Factor converting array values to degrees Celsius (e.g. TEMPERATURE_SCALE for raw integers), frames are resampled in degrees Celsius.
+
+    Returns
+    -------
+    tuple
+        (resampled array [grid frames, height, width], grid timestamps, mask of valid grid frames)
+    """
+    assert method in RESAMPLING_METHODS
+    timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+    if len(timestamps) != len(array):
+        raise ValueError("Frames and timestamps have different lengths")
+    if not len(timestamps):
+        raise ValueError("Cannot resample an empty sequence")
+    if (np.diff(timestamps) < 0).any():
+        raise ValueError("Resampling requires sorted timestamps")
+    t_start = timestamps[0] if t_start is None else t_start
+    t_end = timestamps[-1] if t_end is None else t_end
+    grid = uniform_time_grid(t_start, t_end, fps)
+    array = as_celsius(array, scale)
+    dtype = np.result_type(array.dtype, np.float32)
+    resampled = np.empty((len(grid),) + array.shape[1:], dtype=dtype)
+    valid = np.zeros(len(grid), dtype=bool)
+    for start in range(0, len(grid), chunk_size):
+        stop = start + chunk_size
+        valid[start:stop] = _interpolate_frames(
+            array, timestamps, grid[start:stop], method, max_gap, fill_value, resampled[start:stop])
+    return resampled, grid, valid
+
+
+class TPA_Uniform_Resampler():
+    """
+    Chunk-wise resampling of a stream onto a uniform time grid, see resample_uniform().
+    Chunks of frames are pushed as they arrive and grid frames are returned as soon as they are fully determined,
+    results are the same as resampling the whole sequence at once. Only the few last frames are kept in memory.
+
+    Attributes
+    ----------
+    fps : float
+        Target frame rate.
+    method : str
+        "nearest", "linear" or "cubic".
+    t_start : float
+        First timestamp of the grid, defaults to the first timestamp pushed.
+    max_gap : float
+        Longest interval between recorded frames [s] to interpolate over.
+    scale : float
+        Factor converting pushed values to degrees Celsius.
+
+    Methods
+    -------
+    push(frames, timestamps)
+        add a chunk, returns (resampled frames, grid timestamps, valid mask) determined so far.
+    flush()
+        returns remaining grid frames up to the last timestamp pushed.
+    """
+
+    def __init__(self, fps: float, method: str = "linear", t_start: float = None, max_gap: float = RESAMPLING_MAX_GAP, fill_value=np.nan, scale: float = 1.):
+        assert method in RESAMPLING_METHODS
+        if fps <= 0:
+            raise ValueError("fps must be positive")
+        self.fps = fps
+        self.method = method
+        self.t_start = t_start
+        self.max_gap = max_gap
+        self.fill_value = fill_value
+        self.scale = scale
+        self._frames = None
+        self._timestamps = np.zeros(0)
+        self._k = 0
+        # frames needed after the interval of a grid timestamp
+        self._lookahead = 2 if (method == "cubic") else 1
+
+    def _grid(self, count):
+        return self.t_start + np.arange(self._k, self._k + count) / self.fps
+
+    def _emit(self, limit, inclusive):
+        ts = self._timestamps
+        if not len(ts):
+            return self._empty()
+        grid_end = self.t_start + self._k / self.fps
+        count = max(int(np.floor((limit - grid_end) * self.fps)) + 2, 0)
+        grid = self._grid(count)
+        grid = grid[(grid <= limit) if inclusive else (grid < limit)]
+        array = self._frames
+        dtype = np.result_type(array.dtype, np.float32)
+        resampled = np.empty((len(grid),) + array.shape[1:], dtype=dtype)
+        valid = _interpolate_frames(array, ts, grid, self.method, self.max_gap, self.fill_value, resampled)
+        # keep the frame before the interval of the next grid timestamp (cubic tangents)
+        self._k += len(grid)
+        next_t = self.t_start + self._k / self.fps
+        keep = max(np.searchsorted(ts, next_t, side="right") - 2, 0)
+        self._frames, self._timestamps = self._frames[keep:], ts[keep:]
+        return resampled, grid, valid
+
+    def _empty(self):
+        shape = (0,) if self._frames is None else (0,) + self._frames.shape[1:]
+        return np.zeros(shape, dtype=np.float32), np.zeros(0), np.zeros(0, dtype=bool)
+
+    def push(self, frames, timestamps):
+        """
+        Parameters
+        ----------
+        frames : np.array
+            Chunk [frames, height, width].
+        timestamps : list, np.array
+            Sorted timestamps of the chunk, later than previously pushed ones.
+
+        Returns
+        -------
+        tuple
+            (resampled frames, grid timestamps, valid mask), may be empty.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+        if len(timestamps) != len(frames):
+            raise ValueError("Frames and timestamps have different lengths")
+        if not len(timestamps):
+            return self._empty()
+        merged = np.r_[self._timestamps, timestamps]
+        if (np.diff(merged) < 0).any():
+            raise ValueError("Resampling requires sorted timestamps")
+        if self.t_start is None:
+            self.t_start = timestamps[0]
+        frames = as_celsius(frames, self.scale)
+        self._frames = frames if self._frames is None else np.concatenate([self._frames, frames])
+        self._timestamps = merged
+        if len(merged) <= self._lookahead:
+            return self._empty()
+        return self._emit(merged[-self._lookahead], inclusive=False)
+
+    def flush(self):
+        """
+        Returns
+        -------
+        tuple
+            (resampled frames, grid timestamps, valid mask) of the remaining grid up to the last timestamp pushed.
+        """
+        if not len(self._timestamps):
+            return self._empty()
+        return self._emit(self._timestamps[-1], inclusive=True)
+
+
 def resample_np_tuples(arrays, indices=None, step=None):
     """
     Resampling for 3D arrays.
@@ -625,11 +3286,12 @@ def resample_np_tuples(arrays, indices=None, step=None):
             resampled_arrays.append(array[ids])
         return resampled_arrays
     if step:
-        return [array[range(0, len(array), step)] for array in arrays]
+        # basic slicing, arrays are views of the input
+        return [array[::step] for array in arrays]
     return arrays
 
 
-def save_temperature_histogram(array, fp="histogram.png", bins=None, xlabel='Temperature grad. C', ylabel='Number of pixels', title='Histogram of temperature', grid=True, mu=False, sigma=False):
+def save_temperature_histogram(array, fp="histogram.png", bins=None, xlabel='Temperature grad. C', ylabel='Number of pixels', title='Histogram of temperature', grid=True, mu=False, sigma=False, scale: float = 1.):
     """
     Saves a histogram of measured temperatures
 
@@ -642,8 +3304,11 @@ def save_temperature_histogram(array, fp="histogram.png", bins=None, xlabel='Tem
         filepath to save plotted histogram to
     bins, xlabel, ylabel, title, grid
         as in pyplot
+    scale : float
+        factor converting array values to degrees Celsius
     """
-    data = array.flatten()
+    import matplotlib.pyplot as plt
+    data = as_celsius(array, scale).flatten()
     hist = plt.hist(data, bins=bins)
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
@@ -656,6 +3321,234 @@ def save_temperature_histogram(array, fp="histogram.png", bins=None, xlabel='Tem
     return True
 
 
+class TPA_Histogram():
+    """
+    Streaming temperature histogram over fixed bins with running statistics. 
+    Chunks are counted with np.bincount (uniform bins) and partial histograms of chunks, files or processes are merged,
+    mean and variance are merged with numerically stable pairwise updates (Chan et al.).
+    Non-finite values are ignored, values outside of the bins are counted in underflow and overflow.
+
+    Attributes
+    ----------
+    edges : np.array
+        Bin edges, the last bin includes its right edge (as in np.histogram).
+    counts : np.array
+        Number of values in each bin.
+    underflow, overflow : int
+        Number of values below and above the bins.
+    n : int
+        Number of finite values.
+    mean, min, max : float
+        Statistics of finite values.
+
+    Methods
+    -------
+    update(array)
+        add values of an array of any shape.
+    merge(other)
+        add a histogram with the same bins.
+    var(), std()
+        variance and standard deviation of finite values.
+    save(fp, ...)
+        plot the histogram with matplotlib.
+    """
+
+    def __init__(self, bins=None):
+        """
+        Parameters
+        ----------
+        bins : np.array, optional
+            Bin edges (sorted), np.arange(HISTOGRAM_START, HISTOGRAM_STOP + HISTOGRAM_STEP / 2, HISTOGRAM_STEP) by default.
+        """
+        if bins is None:
+            bins = np.arange(HISTOGRAM_START, HISTOGRAM_STOP + HISTOGRAM_STEP / 2, HISTOGRAM_STEP)
+        self.edges = np.asarray(bins, dtype=np.float64)
+        if (len(self.edges) < 2) or (np.diff(self.edges) <= 0).any():
+            raise ValueError("Bins must be at least 2 increasing edges")
+        widths = np.diff(self.edges)
+        self._uniform = np.allclose(widths, widths[0])
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+        self.n = 0
+        self.mean = 0.
+        self._m2 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _bin_indices(self, data):
+        edges, bins = self.edges, len(self.counts)
+        if not self._uniform:
+            return np.searchsorted(edges, data, side="right") - 1
+        # same rounding corrections as np.histogram for uniform bins
+        indices = ((data - edges[0]) * (bins / (edges[-1] - edges[0]))).astype(np.int64)
+        indices[indices == bins] -= 1
+        inside = (indices >= 0) & (indices < bins)
+        clipped = np.clip(indices, 0, bins - 1)
+        indices -= inside & (data < edges[clipped])
+        indices += inside & (data >= edges[clipped + 1]) & (indices != bins - 1)
+        return indices
+
+    def update(self, array, scale: float = 1.):
+        """
+        Parameters
+        ----------
+        array : np.array
+            Values, e.g. [frames, height, width].
+        scale : float, optional
+            Factor converting values to degrees Celsius, e.g. TEMPERATURE_SCALE for raw integers.
+        """
+        data = np.asarray(as_celsius(array, scale, np.float64), dtype=np.float64).reshape(-1)
+        data = data[np.isfinite(data)]
+        if not len(data):
+            return self
+        below, above = data < self.edges[0], data > self.edges[-1]
+        self.underflow += int(below.sum())
+        self.overflow += int(above.sum())
+        inside = data[~(below | above)]
+        self.counts += np.bincount(self._bin_indices(inside), minlength=len(self.counts))
+        mean = data.mean()
+        m2 = np.square(data - mean).sum()
+        self._merge_moments(len(data), mean, m2)
+        self.min, self.max = min(self.min, data.min()), max(self.max, data.max())
+        return self
+
+    def _merge_moments(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+
+    def merge(self, other):
+        """
+        Parameters
+        ----------
+        other : TPA_Histogram
+            Histogram with the same bins.
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different bins cannot be merged")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        if other.n:
+            self._merge_moments(other.n, other.mean, other._m2)
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def var(self, ddof: int = 0) -> float:
+        return self._m2 / (self.n - ddof) if (self.n > ddof) else np.nan
+
+    def std(self, ddof: int = 0) -> float:
+        return np.sqrt(self.var(ddof))
+
+    def save(self, fp="histogram.png", xlabel='Temperature grad. C', ylabel='Number of pixels', title='Histogram of temperature', grid=True, mu=False, sigma=False):
+        """
+        Saves the plotted histogram, see save_temperature_histogram().
+        """
+        import matplotlib.pyplot as plt
+        # bin counts as weights of the left edges, plt.stairs() needs matplotlib>=3.4
+        plt.hist(self.edges[:-1], self.edges, weights=self.counts)
+        plt.xlabel(xlabel)
+        plt.ylabel(ylabel)
+        text = r'{}{}{}'.format(r'$\mu={0:.2f} \degree C$'.format(self.mean) if mu else '', ', ' if (
+            mu and sigma) else '', r'$\sigma={0:.2f} \degree C$'.format(self.std()) if sigma else '')
+        plt.title("{} {}".format(title, text))
+        plt.grid(grid)
+        plt.savefig(fp)
+        plt.close('all')
+        return True
+
+
+def tpa_file_histogram(filepath: str, bins=None, chunk_frames: int = HISTOGRAM_CHUNK_FRAMES) -> TPA_Histogram:
+    """
+    Histogram and statistics of temperatures in a recording, see TPA_Histogram.
+
+    Parameters
+    ----------
+    filepath : str
+        Recording of any supported extension.
+    bins : np.array, optional
+        Bin edges.
+    chunk_frames : int, optional
+        Frames read and counted at once, see iter_tpa_file() (bounds memory).
+
+    Returns
+    -------
+    TPA_Histogram
+    """
+    histogram = TPA_Histogram(bins)
+    # degrees Celsius also for raw files
+    for array, _ in iter_tpa_file(filepath, chunk_frames, dtype=DTYPE):
+        histogram.update(array)
+    return histogram
+
+
+def _tpa_files_histogram_job(args):
+    filepaths, bins = args
+    histogram = TPA_Histogram(bins)
+    for fp in filepaths:
+        histogram.merge(tpa_file_histogram(fp, bins))
+    return histogram
+
+
+def tpa_files_histogram(filepaths: list, bins=None, workers: int = None) -> TPA_Histogram:
+    """
+    Histogram and statistics of temperatures across many recordings, 
+    files are counted in parallel processes and partial histograms merged.
+
+    Parameters
+    ----------
+    filepaths : list
+        Recordings of any supported extension.
+    bins : np.array, optional
+        Bin edges.
+    workers : int, optional
+        Number of processes, os.cpu_count() by default, 1 counts serially.
+
+    Returns
+    -------
+    TPA_Histogram
+    """
+    filepaths = list(filepaths)
+    if (workers == 1) or (len(filepaths) < 2):
+        return _tpa_files_histogram_job((filepaths, bins))
+    histogram = TPA_Histogram(bins)
+    workers = workers or os.cpu_count() or 1
+    # one batch of files per job, few partial histograms to send back
+    batches = [filepaths[idx::workers * 4] for idx in range(min(workers * 4, len(filepaths)))]
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for partial in executor.map(_tpa_files_histogram_job, [(batch, bins) for batch in batches]):
+            histogram.merge(partial)
+    return histogram
+
+
+def tpa_dir_histogram(input_dir: str, extension: str = "txt", bins=None, workers: int = None) -> TPA_Histogram:
+    """
+    Histogram and statistics of temperatures of all recordings with given extension in input_dir (recursively, e.g. a dataset),
+    see tpa_files_histogram().
+
+    Parameters
+    ----------
+    input_dir : str
+        Directory with recordings.
+    extension : str, optional
+        Extension of recordings (case insensitive).
+    bins : np.array, optional
+        Bin edges.
+    workers : int, optional
+        Number of processes.
+
+    Returns
+    -------
+    TPA_Histogram
+    """
+    filepaths = sorted(fp for fp in glob.glob(os.path.join(input_dir, "**", "*"), recursive=True)
+                       if os.path.isfile(fp) and (os.path.splitext(fp)[1][1:].lower() == extension.lower()))
+    return tpa_files_histogram(filepaths, bins, workers)
+
+
 def resample_timestamps(timestamps, indices=None, step=None):
     """
     Resampling for 3D arrays.
@@ -677,9 +3570,211 @@ def resample_timestamps(timestamps, indices=None, step=None):
     return [list(ts) for ts in resample_np_tuples(ts_array, indices, step)]
 
 
+def _txt_line_regex(tokens: int):
+    # integer values, "t:" and the timestamp
+    return re.compile(rb"(?:[+-]?\d+ ){%d}t: +(\S+)\s*" %(tokens - 2))
+
+
+def _split_txt_line(line: bytes, tokens: int, regex):
+    """
+    Returns the timestamp token of a well-formed frame line, None otherwise.
+    Most lines are accepted with a few byte-string scans, the rest is checked with the regex.
+    """
+    values, sep, timestamp = line.rpartition(b" t: ")
+    if sep and (values.count(b" ") == tokens - 3) and not values.translate(None, b"0123456789- "):
+        # every "-" starts a value, no empty values
+        unsigned = values.replace(b" -", b" ")
+        if unsigned[:1] == b"-":
+            unsigned = unsigned[1:]
+        if unsigned and (b"-" not in unsigned) and (b"  " not in unsigned) and (unsigned[:1] != b" ") and (unsigned[-1:] != b" "):
+            timestamp = timestamp.strip()
+            if timestamp and (len(timestamp.split()) == 1):
+                return timestamp
+    match = regex.fullmatch(line)
+    return None if (match is None) else match.group(1)
+
+
+def _txt_line_issue(line: bytes, tokens: int):
+    """
+    Diagnose a frame line that does not match the expected format, returns (kind, message).
+    """
+    split = line.split()
+    if (len(split) < tokens) and (b"t:" not in split[-2:]):
+        return "truncated", "line has {} tokens out of {} and no timestamp".format(len(split), tokens)
+    if len(split) != tokens:
+        return "value_count", "line has {} tokens, expected {}".format(len(split), tokens)
+    for position, value in enumerate(split[:-2]):
+        try:
+            int(value)
+        except ValueError:
+            return "non_integer", "value {} ({!r}) is not an integer".format(position, value.decode(errors="replace"))
+    if split[-2] != b"t:":
+        return "value_count", "timestamp marker missing"
+    return "timestamp", "timestamp {!r} is not a number".format(split[-1].decode(errors="replace"))
+
+
+def validate_txt(filepath: str, array_size: int = 32, tokens: int = None, block_size: int = TXT_VALIDATION_BLOCK_BYTES) -> dict:
+    """
+    Validate Heimann HTPA .txt in one pass, reading blocks of lines. Every malformed line is reported:
+    wrong number of values ("value_count"), non-integer values ("non_integer"), lines cut before the timestamp ("truncated"),
+    unparsable timestamps ("timestamp") and timestamps not greater than the previous valid one ("non_monotonic").
+
+    Parameters
+    ----------
+    filepath : str
+    array_size : int, optional
+    tokens : int, optional
+        Number of space-separated tokens in a frame line (values, "t:" and the timestamp), 
+        the most common number in the first block by default.
+    block_size : int, optional
+        Approximate number of bytes read at once.
+
+    Returns
+    -------
+    dict
+        JSON-serializable report: filepath, ok, frames (frame lines), valid (valid frame lines), tokens 
+        and issues, a list of dicts with line (1-based line number in the file), kind and message.
+    """
+    issues = []
+    frames, valid = 0, 0
+    previous_t = -np.inf
+    regex = None
+    with open(filepath, "rb") as f:
+        f.readline()
+        line_n = 1
+        while True:
+            lines = f.readlines(block_size)
+            if not lines:
+                break
+            if regex is None:
+                if tokens is None:
+                    counts = collections.Counter(len(line.split()) for line in lines if line.strip())
+                    tokens = counts.most_common(1)[0][0] if counts else array_size ** 2 + 2
+                regex = _txt_line_regex(tokens)
+            for line in lines:
+                line_n += 1
+                if not line.strip():
+                    continue
+                frames += 1
+                timestamp = _split_txt_line(line, tokens, regex)
+                kind = None
+                if timestamp is None:
+                    kind, message = _txt_line_issue(line, tokens)
+                else:
+                    try:
+                        t = float(timestamp)
+                    except ValueError:
+                        t = np.nan
+                    if not np.isfinite(t):
+                        kind, message = "timestamp", "timestamp {!r} is not a number".format(timestamp.decode(errors="replace"))
+                    else:
+                        if not (t > previous_t):
+                            kind, message = "non_monotonic", "timestamp {} follows {}".format(t, previous_t)
+                        else:
+                            previous_t = t
+                if kind is None:
+                    valid += 1
+                else:
+                    issues.append({"line": line_n, "kind": kind, "message": message})
+    if (tokens is not None) and (tokens - 2 < array_size ** 2):
+        issues.insert(0, {"line": None, "kind": "value_count",
+                          "message": "lines have {} values, expected at least {}".format(tokens - 2, array_size ** 2)})
+    return {"filepath": filepath, "ok": not issues, "frames": frames, "valid": valid, "tokens": tokens, "issues": issues}
+
+
+def validate_txt_files(filepaths: list, array_size: int = 32, workers: int = None) -> list:
+    """
+    Validate many Heimann HTPA .txt files in parallel processes, see validate_txt().
+
+    Parameters
+    ----------
+    filepaths : list
+    array_size : int, optional
+    workers : int, optional
+        Number of processes, os.cpu_count() by default, 1 validates serially.
+
+    Returns
+    -------
+    list
+        Reports in the order of filepaths.
+    """
+    filepaths = list(filepaths)
+    sizes = [array_size] * len(filepaths)
+    if (workers == 1) or (len(filepaths) < 2):
+        return list(map(validate_txt, filepaths, sizes))
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(validate_txt, filepaths, sizes))
+
+
+def repair_txt(filepath: str, output_fp: str, mode: str = "drop", array_size: int = 32, report: dict = None) -> dict:
+    """
+    Write a cleaned copy of Heimann HTPA .txt without the malformed lines found by validate_txt(). 
+    Valid lines are copied unchanged.
+
+    Parameters
+    ----------
+    filepath : str
+    output_fp : str
+    mode : str, optional
+        "drop" removes broken frames, "interpolate" replaces broken frames that have a valid, monotonic timestamp 
+        with values linearly interpolated between the neighbouring valid frames (others are dropped), see TXT_REPAIR_MODES.
+    array_size : int, optional
+    report : dict, optional
+        Report of validate_txt() if already computed.
+
+    Returns
+    -------
+    dict
+        The validation report with "repaired" (line numbers of interpolated frames) and "dropped" (line numbers of removed frames).
+    """
+    assert mode in TXT_REPAIR_MODES
+    if report is None:
+        report = validate_txt(filepath, array_size)
+    broken = {issue["line"] for issue in report["issues"] if issue["line"] is not None}
+    regex = _txt_line_regex(report["tokens"])
+    with open(filepath, "rb") as f:
+        lines = f.readlines()
+    # frame lines: (line number, timestamp)
+    frames = []
+    for line_n, line in enumerate(lines[1:], start=2):
+        if not line.strip():
+            continue
+        if line_n not in broken:
+            frames.append((line_n, float(_split_txt_line(line, report["tokens"], regex))))
+        elif mode == "interpolate":
+            frames.append((line_n, _parse_txt_timestamp(line)))
+    output, repaired = [], []
+    valid_lines = [line_n for line_n, _ in frames if line_n not in broken]
+    valid_ts = [t for line_n, t in frames if line_n not in broken]
+    previous_t = -np.inf
+    for line_n, t in frames:
+        if line_n not in broken:
+            output.append(lines[line_n - 1].rstrip(b"\r\n"))
+            previous_t = t
+            continue
+        after = bisect.bisect_right(valid_ts, t)
+        if not (np.isfinite(t) and (t > previous_t) and (0 < after < len(valid_ts))):
+            continue
+        t0, t1 = valid_ts[after - 1], valid_ts[after]
+        v0, v1 = [np.array(lines[valid_lines[idx] - 1].split()[:-2], dtype=np.int64) for idx in (after - 1, after)]
+        w = (t - t0) / (t1 - t0)
+        values = np.rint(v0 + (v1 - v0) * w).astype(np.int64)
+        output.append(" ".join(map(str, values)).encode() + b" t: " + lines[line_n - 1].split()[-1])
+        repaired.append(line_n)
+        previous_t = t
+    newline = b"\r\n" if lines[0].endswith(b"\r\n") else b"\n"
+    ensure_parent_exists(output_fp)
+    with open(output_fp, "wb") as f:
+        f.write(lines[0] + b"".join(line + newline for line in output))
+    report = dict(report)
+    report["repaired"] = repaired
+    report["dropped"] = sorted(broken - set(repaired))
+    return report
+
+
 def debug_HTPA32x32d_txt(filepath: str, array_size=32):
     """
-    Debug Heimann HTPA .txt by attempting to convert to NumPy array shaped [frames, height, width].
+    Debug Heimann HTPA .txt, prints every malformed line found by validate_txt().
 
     Parameters
     ----------
@@ -689,48 +3784,12 @@ def debug_HTPA32x32d_txt(filepath: str, array_size=32):
     Returns
     -------
     int
-        line that raises error, -1 if no error
+        first line that raises error, -1 if no error
     """
-    with open(filepath) as f:
-        line_n = 1
-        _ = f.readline()
-        line = "dummy line"
-        frames = []
-        timestamps = []
-        while line:
-            line_n += 1
-            line = f.readline()
-            if line:
-                try:
-                    split = line.split(" ")
-                    frame = split[0: array_size ** 2]
-                    timestamp = split[-1]
-                    frame = np.array([int(T) for T in frame], dtype=DTYPE)
-                    frame = frame.reshape([array_size, array_size], order="F")
-                    frame *= 1e-2
-                    frames.append(frame)
-                    timestamps.append(float(timestamp))
-                except:
-                    split = line.split(" ")
-                    frame = split[0: array_size ** 2]
-                    timestamp = split[-1]
-                    T_idx = 0
-                    for T in frame:
-                        try:
-                            _ = int(T)
-                        except:
-                            break
-                        T_idx += 1
-                    print("{} caused error at line {} (t: {}), bit {} (= {})".format(
-                        filepath, line_n, timestamp, T_idx, frame[T_idx]))
-                    for idx in range(-3, 3 + 1):
-                        try:
-                            print("bit {}: {}".format(
-                                T_idx-idx, frame[T_idx-idx]))
-                        except:
-                            pass
-                    return line_n
-        frames = np.array(frames)
-        # the array needs rotating 90 CW
-        frames = np.rot90(frames, k=-1, axes=(1, 2))
-    return -1
+    report = validate_txt(filepath, array_size)
+    for issue in report["issues"]:
+        print("{} caused error at line {}: {} ({})".format(filepath, issue["line"], issue["kind"], issue["message"]))
+    if report["ok"]:
+        return -1
+    lines = [issue["line"] for issue in report["issues"] if issue["line"] is not None]
+    return min(lines) if lines else 1
@@ -4,6 +4,7 @@ Call python converter.py --help to learn more.
 '''
 import argparse
 import glob
+import json
 import os
 import HTPA32x32d.tools as tools
 
@@ -17,6 +18,9 @@ if __name__ == "__main__":
     parser.add_argument(
         "--gif", "-g", dest="gif", help="Write gifs", action="store_true"
     )
+    parser.add_argument(
+        "--video", "-v", dest="video", help="Write upscaled mp4 videos with frame index and timestamp overlay", action="store_true"
+    )
     parser.add_argument(
         "--csv", "-c", dest="csv", help="Write csvs", action="store_true"
     )
@@ -30,9 +34,22 @@ if __name__ == "__main__":
     parser.add_argument(
         "--debug",
         dest="debug",
-        help="Debug txts",
+        help="Debug txts, every malformed line is reported",
         action="store_true",
     )
+    parser.add_argument(
+        "--report",
+        dest="report",
+        help="With --debug: write JSON validation reports to a given filepath",
+        default=None,
+    )
+    parser.add_argument(
+        "--repair",
+        dest="repair",
+        help="With --debug: write cleaned copies of corrupted txts (FILENAME_REPAIRED.TXT), broken frames are dropped or interpolated",
+        choices=tools.TXT_REPAIR_MODES,
+        default=None,
+    )
     parser.add_argument(
         "--crop",
         dest="crop",
@@ -40,12 +57,26 @@ if __name__ == "__main__":
         type=int,
         default=-1
     )
+    parser.add_argument(
+        "--formats",
+        dest="formats",
+        help="Comma-separated additional formats, e.g. npz,tpac,parquet (see tools.CONVERSION_FORMATS)",
+        default=None,
+    )
     parser.add_argument(
         "--overwrite",
         dest="overwrite",
-        help="Overwrite file if it exists",
+        help="Overwrite file even if it is up to date",
         action="store_true",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        help="Number of parallel processes (default: number of CPUs)",
+        type=int,
+        default=None,
+    )
     args = parser.parse_args()
     dir_path, file_path = None, None
     if os.path.isdir(args.object):
@@ -53,57 +84,39 @@ if __name__ == "__main__":
     elif os.path.isfile(args.object):
         file_path = os.path.abspath(args.object)
 
-    def txtFunctions(txt_fp, gif=False, csv=False, bmp=False, crop=-1, overwrite=False, **args):
-        def init(txt_fp, ext):
-            parent, txt_fn = os.path.split(txt_fp)
-            fn = txt_fn.split(".TXT")[0]
-            txt_fn = fn + ".TXT"
-            ext_fn = fn + ext
-            ext_fp = os.path.join(parent, ext_fn)
-            if os.path.exists(ext_fp):
-                if not overwrite:
-                    print("{} already exists, aborting conversion".format(ext_fn))
-                    return None
-            print("Converting {} to {}".format(txt_fn, ext_fn))
-            return ext_fp
-
-        array, timestamps = tools.txt2np(txt_fp)
-        # NO CROPPING HERE! CSV SHOULD NOT BE CROPPED!
-        if csv:
-            csv_fp = init(txt_fp, ".csv")
-            if csv_fp:
-                tools.write_np2csv(csv_fp, array, timestamps)
-
-        cropped_array = tools.crop_center(array, crop, crop)
-        if gif:
-            gif_fp = init(txt_fp, ".gif")
-            if gif_fp:
-                pc = tools.np2pc(cropped_array)
-                tools.write_pc2gif(
-                    pc, gif_fp, duration=tools.timestamps2frame_durations(timestamps))
-        if bmp:
-            parent, txt_fn = os.path.split(txt_fp)
-            fn = txt_fn.split(".TXT")[0]
-            dest = fn
-            if init(txt_fp, ""):
-                print("Extracting frames...")
-                tools.save_frames(tools.np2pc(cropped_array),
-                                  os.path.join(parent, dest))
-        return
+    txt_fps = sorted(glob.glob(os.path.join(dir_path, "*.TXT"))) if dir_path else [file_path]
 
     if args.debug:
-        if dir_path:
-            for txt_fp in glob.glob(os.path.join(dir_path, "*.TXT")):
-                tools.debug_HTPA32x32d_txt(txt_fp)
-        if file_path:
-            txt_fp = file_path
-            tools.debug_HTPA32x32d_txt(txt_fp)
+        # files are validated in parallel processes
+        reports = tools.validate_txt_files(txt_fps, workers=args.jobs)
+        for report in reports:
+            for issue in report["issues"]:
+                print("{} caused error at line {}: {} ({})".format(
+                    report["filepath"], issue["line"], issue["kind"], issue["message"]))
+            if args.repair and not report["ok"]:
+                parent, txt_fn = os.path.split(report["filepath"])
+                repaired_fp = os.path.join(parent, txt_fn.split(".TXT")[0] + "_REPAIRED.TXT")
+                repaired = tools.repair_txt(report["filepath"], repaired_fp, mode=args.repair, report=report)
+                print("Writing {} ({} frames repaired, {} dropped)".format(
+                    repaired_fp, len(repaired["repaired"]), len(repaired["dropped"])))
+        print("{} out of {} files OK".format(sum(report["ok"] for report in reports), len(reports)))
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(reports, f, indent=2)
         exit()
 
-    if dir_path:
-        for txt_fp in glob.glob(os.path.join(dir_path, "*.TXT")):
-            txtFunctions(txt_fp, **vars(args))
-
-    if file_path:
-        txt_fp = file_path
-        txtFunctions(txt_fp, **vars(args))
+    output_formats = [output_format for flag, output_format in [
+        (args.csv, "csv"), (args.gif, "gif"), (args.video, "mp4"), (args.bmp, "frames")] if flag]
+    if args.formats:
+        output_formats += args.formats.split(",")
+    # each file is parsed once for all formats, files are converted in parallel processes
+    summary = tools.convert_tpa_files(txt_fps, output_formats, workers=args.jobs,
+                                      overwrite=args.overwrite, crop=args.crop)
+    for src, output_format, output_fp in summary["skipped"]:
+        print("{} is up to date, skipping".format(os.path.basename(output_fp)))
+    for src, output_format, output_fp in summary["converted"]:
+        print("Converted {} to {}".format(os.path.basename(src), os.path.basename(output_fp)))
+    for failure in summary["failed"]:
+        print("[ERROR] {} ({}): {}".format(failure["filepath"], failure["format"], failure["error"]))
+    print("{} converted, {} skipped, {} failed".format(
+        len(summary["converted"]), len(summary["skipped"]), len(summary["failed"])))
@@ -5,8 +5,7 @@ Call python img_converter.py --help to learn more.
 import argparse
 import glob
 import os
-import tools
-import cv2
+import HTPA32x32d.tools as tools
 import numpy as np
 
 
@@ -30,6 +29,13 @@ if __name__ == "__main__":
         help="Calculate and write histogram",
         action="store_true",
     )
+    parser.add_argument(
+        "--merged",
+        "-m",
+        dest="merged",
+        help="Calculate and write one histogram of all files in the directory",
+        action="store_true",
+    )
     parser.add_argument(
         "--bins",
         dest="bins",
@@ -46,9 +52,17 @@ if __name__ == "__main__":
     parser.add_argument(
         "--overwrite",
         dest="overwrite",
-        help="Overwrite file if it exists",
+        help="Overwrite file even if it is up to date",
         action="store_true",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        help="Number of parallel processes (default: number of CPUs)",
+        type=int,
+        default=None,
+    )
     args = parser.parse_args()
     dir_path, file_path = None, None
     if os.path.isdir(args.object):
@@ -56,43 +70,25 @@ if __name__ == "__main__":
     elif os.path.isfile(args.object):
         file_path = os.path.abspath(args.object)
 
-    def txtFunctions(txt_fp, bmp=False, histogram = False, crop=-1, overwrite=False, bins = None, mu = True, sigma = True, **args):
-        def init(txt_fp, ext, suffix = None):
-            parent, txt_fn = os.path.split(txt_fp)
-            if not suffix:
-                suffix = ""
-            fn = txt_fn.split(".TXT")[0] + suffix
-            txt_fn = fn + ".TXT"
-            ext_fn = fn + ext
-            ext_fp = os.path.join(parent, ext_fn)
-            if os.path.exists(ext_fp):
-                if not overwrite:
-                    print("{} already exists, aborting conversion".format(ext_fn))
-                    return None
-            print("Converting {} to {}".format(txt_fn, ext_fn))
-            return ext_fp
-
-        array, timestamps = tools.txt2np(txt_fp)
-        cropped_array = tools.crop_center(array, crop, crop)
-
-        if bmp:
-            bmp_fp = init(txt_fp, ".bmp")
-            if bmp_fp:
-                pc_img = tools.np2pc(cropped_array)[0]
-                cv2.imwrite(bmp_fp, pc_img) 
-        if histogram:
-            hist_fp = init(txt_fp, ".png", suffix = "_histogram")
-            if hist_fp:
-                tools.save_temperature_histogram(array, fp=hist_fp, bins=bins, mu = mu, sigma = sigma)            
-        return
-
     if args.bins:
         args.bins=np.arange(*[float(val) for val in args.bins.split(',')])        
 
-    if dir_path:
-        for txt_fp in glob.glob(os.path.join(dir_path, "*.TXT")):
-            txtFunctions(txt_fp, **vars(args))
-    if file_path:
-        txt_fp = file_path
-        txtFunctions(txt_fp, **vars(args))
-
+    txt_fps = sorted(glob.glob(os.path.join(dir_path, "*.TXT"))) if dir_path else [file_path]
+    output_formats = [output_format for flag, output_format in [
+        (args.bmp, "bmp"), (args.histogram, "histogram")] if flag]
+    # each file is parsed once for all formats, files are converted in parallel processes
+    summary = tools.convert_tpa_files(txt_fps, output_formats, workers=args.jobs,
+                                      overwrite=args.overwrite, crop=args.crop, bins=args.bins)
+    for src, output_format, output_fp in summary["skipped"]:
+        print("{} is up to date, skipping".format(os.path.basename(output_fp)))
+    for src, output_format, output_fp in summary["converted"]:
+        print("Converted {} to {}".format(os.path.basename(src), os.path.basename(output_fp)))
+    for failure in summary["failed"]:
+        print("[ERROR] {} ({}): {}".format(failure["filepath"], failure["format"], failure["error"]))
+    if dir_path and args.merged:
+        hist_fp = os.path.join(dir_path, "histogram.png")
+        if os.path.exists(hist_fp) and not args.overwrite:
+            print("{} already exists, aborting".format(hist_fp))
+        else:
+            print("Writing histogram of {} files to {}".format(len(txt_fps), hist_fp))
+            tools.tpa_files_histogram(txt_fps, bins=args.bins, workers=args.jobs).save(hist_fp, mu=True, sigma=True)
@@ -21,4 +21,7 @@ setup(name='HTPA32x32d',
         "Pillow>=7.1.2",
         "scipy>=1.4.1",
       ],
+      extras_require={
+        "parquet": ["pyarrow>=1.0.0"],
+      },
       packages=find_packages())
@@ -7,9 +7,24 @@ import json
 import glob
 import pickle
 import shutil
+import importlib.util
+import unittest.mock
+import concurrent.futures
+import subprocess
+import sys
+import imageio
+import PIL.Image
+from scipy.spatial.distance import cdist
 
 from HTPA32x32d import tools
 from HTPA32x32d import dataset
+from HTPA32x32d import stats
+from HTPA32x32d import background
+try:
+    import pyarrow.parquet
+except ImportError:
+    pass
+
 dataset.VERBOSE = True
 
 TESTING_DIR = os.path.join("tests", "testing")
@@ -114,6 +129,17 @@ class Test_csv2np(unittest.TestCase):
         self.assertTrue(np.array_equal(timestamps, expected_timestamps))
 
 
+    def test_chunks(self):
+        expected_array, expected_timestamps = tools.csv2np(EXPECTED_CSV_FP)
+        array, timestamps = tools.csv2np(EXPECTED_CSV_FP, chunksize=2)
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertTrue(np.array_equal(timestamps, expected_timestamps))
+        chunks = list(tools.iter_csv2np(EXPECTED_CSV_FP, chunksize=2))
+        self.assertEqual([len(chunk[0]) for chunk in chunks], [2, 1])
+        self.assertEqual(array.dtype, np.dtype(tools.DTYPE))
+        self.assertTrue(isinstance(timestamps, np.ndarray))
+
+
 class Testwrite_np2pickle(unittest.TestCase):
     def test_Result(self):
         expected_array = np.load(EXPECTED_NP_FP)
@@ -143,6 +169,19 @@ class Testwrite_np2txt(unittest.TestCase):
         _cleanup([txt_fp])
 
 
+    def test_out_of_range_values(self):
+        expected_array = np.array([[[-1025, 15050], [5, -50]],
+                                   [[9999, 10000], [0, 32767]]], dtype=tools.DTYPE)
+        expected_array *= 1e-2
+        expected_timestamps = [1.5, 1.625]
+        txt_fp = os.path.join(TMP_PATH, "file.txt")
+        tools.write_np2txt(txt_fp, expected_array, expected_timestamps)
+        array, timestamps = tools.txt2np(txt_fp, array_size=2)
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertEqual(timestamps, expected_timestamps)
+        _cleanup([txt_fp])
+
+
 class Testwrite_pc2gif(unittest.TestCase):
     def test_Defaults(self):
         gif_fp = os.path.join(TMP_PATH, "tmp.gif")
@@ -172,6 +211,456 @@ class Testwrite_pc2gif(unittest.TestCase):
         self.assertTrue(os.path.exists(gif_fp))
         _cleanup([gif_fp])
 
+class Testwrite_np2gif(unittest.TestCase):
+    def test_colors(self):
+        _init()
+        gif_fp = os.path.join(TMP_PATH, "tmp.gif")
+        temperature_array = np.load(EXPECTED_NP_FP)
+        tools.write_np2gif(gif_fp, temperature_array, duration=[0.1, 0.2, 0.3])
+        result = np.array(imageio.mimread(gif_fp))[..., :3]
+        self.assertTrue(np.array_equal(result, tools.np2pc(temperature_array)[..., ::-1]))
+        image = PIL.Image.open(gif_fp)
+        durations = []
+        for idx in range(image.n_frames):
+            image.seek(idx)
+            durations.append(image.info["duration"])
+        self.assertEqual(durations, [100, 200, 300])
+        _cleanup([gif_fp])
+
+    def test_iterator(self):
+        _init()
+        gif_fp = os.path.join(TMP_PATH, "tmp.gif")
+        temperature_array = np.load(EXPECTED_NP_FP)
+        with self.assertRaises(ValueError):
+            tools.write_np2gif(gif_fp, iter(temperature_array))
+        tools.write_np2gif(gif_fp, iter(temperature_array), t_min=20, t_max=40)
+        result = np.array(imageio.mimread(gif_fp))[..., :3]
+        expected = tools.Pseudocolor(t_min=20, t_max=40)(temperature_array)[..., ::-1]
+        self.assertTrue(np.array_equal(result, expected))
+        _cleanup([gif_fp])
+
+
+class Test_video(unittest.TestCase):
+    def test_upscale_nearest(self):
+        array = np.arange(2 * 3 * 4).reshape([2, 3, 4])
+        result = tools.upscale_nearest(array, 3)
+        self.assertEqual(result.shape, (2, 9, 12))
+        self.assertTrue(np.array_equal(result[:, ::3, ::3], array))
+        self.assertTrue(np.array_equal(result[:, 2::3, 2::3], array))
+
+    def test_write_np2video(self):
+        _init()
+        temperature_array = np.load(EXPECTED_NP_FP)
+        for extension in tools.VIDEO_FOURCC_DICT:
+            fp = os.path.join(TMP_PATH, "tmp." + extension)
+            tools.write_np2video(fp, [temperature_array, temperature_array], [0, 0.1, 0.2], scale=5, title="title")
+            capture = cv2.VideoCapture(fp)
+            self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 3)
+            self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 320)
+            self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)), 160)
+            capture.release()
+            _cleanup([fp])
+
+    def test_tpa_files2videos(self):
+        _init()
+        [shutil.copy2(fp, TMP_PATH) for fp in MV_SAMPLE]
+        filepaths = [os.path.join(TMP_PATH, os.path.basename(fp)) for fp in MV_SAMPLE]
+        output_fps = tools.tpa_files2videos(filepaths, workers=2, extension="avi", crop=26)
+        self.assertEqual(output_fps[0], os.path.splitext(filepaths[0])[0] + ".avi")
+        capture = cv2.VideoCapture(output_fps[1])
+        self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 260)
+        capture.release()
+        multiview_fp = os.path.join(TMP_PATH, "multiview.avi")
+        tools.tpa_files2videos([filepaths], [multiview_fp], workers=1)
+        capture = cv2.VideoCapture(multiview_fp)
+        self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 960)
+        capture.release()
+        _cleanup(filepaths + output_fps + [multiview_fp])
+
+    def test_tpa_file2video_not_aligned(self):
+        _init()
+        array = np.load(EXPECTED_NP_FP)
+        filepaths = [os.path.join(TMP_PATH, "view{}.npz".format(idx)) for idx in range(2)]
+        tools.write_tpa_file(filepaths[0], array, [0, 0.1, 0.2])
+        tools.write_tpa_file(filepaths[1], array[:2], [0, 0.1])
+        output_fp = os.path.join(TMP_PATH, "not_aligned.avi")
+        with self.assertRaises(AssertionError) as context:
+            tools.tpa_file2video(filepaths, output_fp)
+        self.assertEqual(str(context.exception), "Views are not aligned")
+        self.assertFalse(os.path.exists(output_fp))
+        _cleanup(filepaths)
+
+
+class Test_lazy_imports(unittest.TestCase):
+    IMPORT_TIME_BUDGET = 1.
+
+    def test_import_time(self):
+        code = ("import sys, time; t = time.perf_counter(); import HTPA32x32d.tools, HTPA32x32d.dataset, HTPA32x32d.communication, HTPA32x32d.stats, HTPA32x32d.background; "
+                "print(time.perf_counter() - t); print(','.join(m for m in ['cv2', 'pandas', 'matplotlib', 'imageio', 'scipy'] if m in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split("\n")
+        self.assertLess(float(output[0]), self.IMPORT_TIME_BUDGET)
+        self.assertEqual(output[1], "")
+
+    def test_lazy_submodules(self):
+        import HTPA32x32d
+        self.assertIs(HTPA32x32d.tools, tools)
+        self.assertIn("dataset", dir(HTPA32x32d))
+        with self.assertRaises(AttributeError):
+            HTPA32x32d.unknown
+        self.assertEqual(tools.CV_COLORMAP_JET, cv2.COLORMAP_JET)
+
+
+class Test_convert_tpa_files(unittest.TestCase):
+    def test_convert(self):
+        _init()
+        fps = [os.path.join(TESTING_DIR, fn) for fn in ["20200415_1438_ID121.TXT", "20200415_1438_ID122.TXT"]]
+        missing_fp = os.path.join(TMP_PATH, "missing.TXT")
+        output_formats = ["csv", "gif", "npz", "frames", "histogram"]
+        summary = tools.convert_tpa_files(fps + [missing_fp], output_formats, workers=2, output_dir=TMP_PATH)
+        self.assertEqual(len(summary["converted"]), 10)
+        self.assertEqual(summary["skipped"], [])
+        self.assertEqual([(failure["filepath"], failure["format"]) for failure in summary["failed"]], [(missing_fp, None)])
+        for fp in fps:
+            array, ts = tools.read_tpa_file(fp)
+            npz_fp = tools.conversion_output_filepath(fp, "npz", TMP_PATH)
+            loaded, loaded_ts = tools.read_tpa_file(npz_fp)
+            np.testing.assert_array_equal(loaded, array)
+            self.assertEqual(tools.read_tpa_header(npz_fp), tools.read_tpa_header(fp))
+            csv_fp = tools.conversion_output_filepath(fp, "csv", TMP_PATH)
+            expected_csv_fp = os.path.join(TMP_PATH, "expected.csv")
+            tools.write_np2csv(expected_csv_fp, array, ts)
+            with open(csv_fp) as f, open(expected_csv_fp) as f_expected:
+                self.assertEqual(f.read(), f_expected.read())
+            os.remove(expected_csv_fp)
+            frames_dir = tools.conversion_output_filepath(fp, "frames", TMP_PATH)
+            self.assertEqual(len(os.listdir(frames_dir)), len(array))
+        # up-to-date outputs are skipped before parsing
+        summary = tools.convert_tpa_files(fps, output_formats, workers=1, output_dir=TMP_PATH)
+        self.assertEqual((len(summary["converted"]), len(summary["skipped"])), (0, 10))
+        summary = tools.convert_tpa_files(fps[:1], ["csv"], overwrite=True, output_dir=TMP_PATH)
+        self.assertEqual([item[1] for item in summary["converted"]], ["csv"])
+        with self.assertRaises(ValueError):
+            tools.convert_tpa_files(fps, ["unknown"])
+        for fp in fps:
+            shutil.rmtree(tools.conversion_output_filepath(fp, "frames", TMP_PATH))
+        _cleanup([tools.conversion_output_filepath(fp, output_format, TMP_PATH)
+                  for fp in fps for output_format in output_formats if output_format != "frames"])
+
+    def test_bmp(self):
+        _init()
+        fp = os.path.join(TESTING_DIR, "20200415_1438_ID121.TXT")
+        summary = tools.convert_tpa_files([fp], ["bmp"], output_dir=TMP_PATH)
+        self.assertEqual(summary["failed"], [])
+        bmp_fp = tools.conversion_output_filepath(fp, "bmp", TMP_PATH)
+        array, _ = tools.read_tpa_file(fp)
+        # first frame colored with the temperature range of the whole recording
+        np.testing.assert_array_equal(cv2.imread(bmp_fp), tools.np2pc(array)[0])
+        self.assertFalse(np.array_equal(cv2.imread(bmp_fp), tools.np2pc(array[:1])[0]))
+        _cleanup([bmp_fp])
+
+
+class Test_stats(unittest.TestCase):
+    def test_compute_stats(self):
+        rng = np.random.default_rng(0)
+        array = rng.normal(25, 1, (500, 8, 8)).astype(np.float32)
+        array[:, 3, 4] += 10
+        data = array.astype(np.float64)
+        result = stats.compute_stats(array, chunk_frames=33)
+        chunked = stats.compute_stats(iter(np.array_split(array, 7)))
+        for key in stats.FRAME_STATS_KEYS + stats.PIXEL_STATS_KEYS:
+            np.testing.assert_allclose(result[key], chunked[key])
+        np.testing.assert_allclose(result["pixel_mean"], data.mean(axis=0))
+        np.testing.assert_allclose(result["pixel_var"], data.var(axis=0))
+        np.testing.assert_array_equal(result["pixel_max"], data.max(axis=0))
+        np.testing.assert_allclose(result["pixel_noise"], np.sqrt(np.square(np.diff(data, axis=0)).mean(axis=0) / 2))
+        np.testing.assert_array_equal(result["frame_min"], data.reshape(500, -1).min(axis=1))
+        np.testing.assert_allclose(result["frame_percentiles"],
+                                   np.percentile(data.reshape(500, -1), stats.STATS_PERCENTILES, axis=1).T)
+        self.assertTrue((result["frame_foreground"] >= 1).all())
+        self.assertEqual([tuple(idx) for idx in np.argwhere(stats.hot_pixel_map(result))], [(3, 4)])
+
+    def test_tpa_file_stats(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "20200415_1438_ID121.TXT")
+        shutil.copy(os.path.join(TESTING_DIR, "20200415_1438_ID121.TXT"), fp)
+        array, ts = tools.read_tpa_file(fp)
+        chunks = list(tools.iter_tpa_file(fp, 4))
+        self.assertEqual([len(chunk[0]) for chunk in chunks], [4, 4, 4, 2])
+        np.testing.assert_array_equal(np.concatenate([chunk[0] for chunk in chunks]), array)
+        result = stats.tpa_file_stats(fp, chunk_frames=4)
+        sidecar_fp = stats.stats_filepath(fp)
+        self.assertTrue(os.path.exists(sidecar_fp))
+        expected = stats.compute_stats(array)
+        for key in expected:
+            np.testing.assert_allclose(result[key], expected[key])
+        np.testing.assert_array_equal(result["timestamps"], ts)
+        cached = stats.tpa_file_stats(fp)
+        self.assertEqual(sorted(cached), sorted(result))
+        other = stats.tpa_file_stats(fp, percentiles=(50.,))
+        self.assertEqual(other["frame_percentiles"].shape, (len(array), 1))
+        # analysis does not write .idx sidecars into data directories
+        self.assertFalse(os.path.exists(tools.txt_index_filepath(fp)))
+        _cleanup([fp, sidecar_fp])
+
+    def test_stats_filepath(self):
+        self.assertEqual(stats.stats_filepath(os.path.join("data.v2", "rec.TXT")), os.path.join("data.v2", "rec.stats.npz"))
+        self.assertEqual(stats.stats_filepath(os.path.join(".", "rec.TXT")), os.path.join(".", "rec.stats.npz"))
+        self.assertEqual(stats.stats_filepath(os.path.join(TMP_PATH, "rec.npyd")), os.path.join(TMP_PATH, "rec.stats.npz"))
+
+    def test_raw_files(self):
+        _init()
+        array, ts = tools.read_tpa_file(EXPECTED_TXT_FP)
+        expected = stats.compute_stats(array)
+        expected_histogram = tools.TPA_Histogram().update(array)
+        fps = []
+        for extension in ["npz", "tpac", "pickle"]:
+            fp = os.path.join(TMP_PATH, "raw_{0}.{0}".format(extension))
+            tools.write_tpa_file(fp, tools.np2centi(array), ts, scale=tools.TEMPERATURE_SCALE)
+            fps += [fp, stats.stats_filepath(fp)]
+            result = stats.tpa_file_stats(fp)
+            for key in ["frame_mean", "frame_foreground", "pixel_mean", "pixel_var"]:
+                np.testing.assert_allclose(result[key], expected[key], atol=1e-4)
+            histogram = tools.tpa_file_histogram(fp)
+            np.testing.assert_array_equal(histogram.counts, expected_histogram.counts)
+            self.assertAlmostEqual(histogram.mean, expected_histogram.mean, places=4)
+        _cleanup(fps)
+
+
+class Test_background(unittest.TestCase):
+    def test_process_equals_updates(self):
+        rng = np.random.default_rng(0)
+        array = rng.normal(25, 0.5, (300, 8, 8))
+        for method in background.BACKGROUND_METHODS:
+            sequential = background.TPA_Background(method, alpha=0.05)
+            masks = np.stack([sequential.update(frame) for frame in array])
+            chunked = background.TPA_Background(method, alpha=0.05)
+            results = [chunked.process(array[start:start + 70], return_backgrounds=True) for start in range(0, len(array), 70)]
+            np.testing.assert_array_equal(np.concatenate([result[0] for result in results]), masks)
+            np.testing.assert_allclose(chunked.background, sequential.background)
+            self.assertEqual(chunked.n, sequential.n)
+            self.assertTrue(np.array_equal(results[0][1][0], array[0]))
+
+    def test_foreground(self):
+        rng = np.random.default_rng(1)
+        array = rng.normal(22, 0.2, (200, 8, 8))
+        array[150:, 2:4, 5:7] += 10
+        model = background.TPA_Background("median")
+        masks = model.process(array)
+        self.assertFalse(masks[:150].any())
+        self.assertTrue(masks[150:, 2:4, 5:7].all())
+        self.assertEqual(masks[150:].sum(), 50 * 4)
+        masks = list(background.iter_foreground(background.TPA_Background("average"), [(array[:150], None), array[150:]]))
+        self.assertEqual(masks[1].sum(), 50 * 4)
+
+    def test_warm_start(self):
+        _init()
+        rng = np.random.default_rng(2)
+        array = rng.normal(25, 0.5, (100, 8, 8))
+        model = background.load_device_background(TMP_PATH, 121, method="exponential")
+        self.assertIsNone(model.background)
+        masks = model.process(array[:60])
+        fp = background.background_filepath(TMP_PATH, 121)
+        model.save(fp)
+        warm = background.load_device_background(TMP_PATH, 121)
+        self.assertEqual((warm.method, warm.n), ("exponential", 60))
+        np.testing.assert_array_equal(warm.process(array[60:]), model.process(array[60:]))
+        np.testing.assert_array_equal(warm.background, model.background)
+        _cleanup([fp])
+
+
+class Test_raw_temperatures(unittest.TestCase):
+    def test_raw_sample_write(self):
+        _init()
+        views = [shutil.copy(fp, TMP_PATH) for fp in MV_SAMPLE]
+        expected = dataset.TPA_Sample_from_filepaths(views)
+        raw = dataset.TPA_Sample_from_filepaths(views, dtype=tools.RAW_DTYPE)
+        self.assertEqual((raw.scale, expected.scale), (tools.TEMPERATURE_SCALE, 1.))
+        output_fps = [os.path.join(TMP_PATH, "written_ID{}.npz".format(view_id)) for view_id in raw.ids]
+        sample = dataset.TPA_Sample_from_data(raw.arrays, raw.timestamps, raw.ids, output_fps, scale=raw.scale)
+        sample.align_timesteps()
+        sample.write()
+        aligned = dataset.TPA_Sample_from_data(expected.arrays, expected.timestamps, expected.ids)
+        aligned.align_timesteps()
+        for fp, array in zip(output_fps, aligned.arrays):
+            np.testing.assert_allclose(tools.read_tpa_file(fp, dtype=tools.DTYPE)[0], array, atol=1e-5)
+        txt_fps = [os.path.join(TMP_PATH, "written_ID{}.TXT".format(view_id)) for view_id in raw.ids]
+        sample.filepaths = txt_fps
+        sample.write()
+        for fp, array in zip(txt_fps, aligned.arrays):
+            np.testing.assert_allclose(tools.read_tpa_file(fp)[0], array, atol=1e-5)
+        sample.resample_uniform(5)
+        aligned.resample_uniform(5)
+        self.assertEqual(sample.scale, 1.)
+        for array, expected_array in zip(sample.arrays, aligned.arrays):
+            np.testing.assert_allclose(array, expected_array, atol=1e-4)
+        _cleanup(views + output_fps + txt_fps)
+
+    def test_read_raw(self):
+        _init()
+        txt_fp = os.path.join(TMP_PATH, "expected.TXT")
+        shutil.copy(EXPECTED_TXT_FP, txt_fp)
+        array, timestamps = tools.read_tpa_file(txt_fp)
+        raw, raw_timestamps = tools.read_tpa_file(txt_fp, dtype=tools.RAW_DTYPE)
+        self.assertEqual(raw.dtype, np.int16)
+        self.assertEqual(raw_timestamps, timestamps)
+        np.testing.assert_array_equal(tools.as_celsius(raw), array)
+        np.testing.assert_array_equal(tools.np2centi(array), raw)
+        self.assertIs(tools.np2centi(raw, tools.TEMPERATURE_SCALE), raw)
+        # int16 values are scaled only on request
+        self.assertIs(tools.as_celsius(raw, 1.), raw)
+        np.testing.assert_array_equal(tools.np2centi(np.ones(3, dtype=np.int16)), [100] * 3)
+        self.assertEqual(tools.read_txt_frames(txt_fp, 1, 3, dtype=tools.RAW_DTYPE)[0].dtype, np.int16)
+        chunks = [chunk for chunk, _ in tools.iter_tpa_file(txt_fp, 2, dtype=tools.RAW_DTYPE)]
+        np.testing.assert_array_equal(np.concatenate(chunks), raw)
+        self.assertFalse(os.path.exists(tools.txt_index_filepath(txt_fp)))
+        _cleanup([txt_fp])
+
+    def test_lossless_round_trip(self):
+        _init()
+        raw, timestamps = tools.read_tpa_file(EXPECTED_TXT_FP, dtype=tools.RAW_DTYPE)
+        header = tools.read_txt_header(EXPECTED_TXT_FP)
+        txt_fp = os.path.join(TMP_PATH, "raw.TXT")
+        float_txt_fp = os.path.join(TMP_PATH, "float.TXT")
+        tools.write_np2txt(txt_fp, raw, timestamps, header=header, scale=tools.TEMPERATURE_SCALE)
+        tools.write_np2txt(float_txt_fp, tools.as_celsius(raw), timestamps, header=header)
+        with open(txt_fp) as f, open(float_txt_fp) as expected:
+            self.assertTrue(f.read() == expected.read())
+        np.testing.assert_array_equal(tools.read_tpa_file(txt_fp, dtype=tools.RAW_DTYPE)[0], raw)
+        fps = [txt_fp, float_txt_fp]
+        for extension in ["npz", "tpac", "pickle"]:
+            fp = os.path.join(TMP_PATH, "raw." + extension)
+            tools.write_tpa_file(fp, raw, timestamps, header=header if (extension in tools.HEADER_READERS) else None)
+            fps.append(fp)
+            array = tools.read_tpa_file(fp)[0]
+            self.assertEqual(array.dtype, np.int16)
+            np.testing.assert_array_equal(array, raw)
+            np.testing.assert_array_equal(tools.read_tpa_file(fp, dtype=tools.DTYPE)[0], tools.as_celsius(raw))
+        csv_fp = os.path.join(TMP_PATH, "raw.csv")
+        tools.write_np2csv(csv_fp, raw, timestamps, scale=tools.TEMPERATURE_SCALE)
+        fps.append(csv_fp)
+        np.testing.assert_array_equal(tools.read_tpa_file(csv_fp, dtype=tools.RAW_DTYPE)[0], raw)
+        _cleanup(fps)
+
+    def test_processing_raw(self):
+        array, timestamps = tools.read_tpa_file(EXPECTED_TXT_FP)
+        raw = tools.np2centi(array)
+        colors = tools.Pseudocolor(t_min=20, t_max=30)
+        raw_colors = tools.Pseudocolor(t_min=20, t_max=30, scale=tools.TEMPERATURE_SCALE)
+        np.testing.assert_array_equal(raw_colors(raw), colors(array))
+        np.testing.assert_array_equal(tools.crop_center(raw, 26), tools.np2centi(tools.crop_center(array, 26)))
+        scale = tools.TEMPERATURE_SCALE
+        expected, result = stats.compute_stats(array), stats.compute_stats(raw, scale=scale)
+        for key in ["frame_mean", "frame_max", "pixel_mean", "pixel_var"]:
+            np.testing.assert_allclose(result[key], expected[key], atol=1e-5)
+        histogram = tools.TPA_Histogram().update(raw, scale)
+        self.assertAlmostEqual(histogram.mean, tools.TPA_Histogram().update(array).mean, places=5)
+        self.assertAlmostEqual(tools.TPA_Histogram().update(raw).mean, histogram.mean / scale, places=2)
+        np.testing.assert_allclose(tools.resample_uniform(raw, timestamps, 5, scale=scale)[0], tools.resample_uniform(array, timestamps, 5)[0], atol=1e-5)
+        resampler = tools.TPA_Uniform_Resampler(5, scale=scale)
+        resampled = np.concatenate([resampler.push(raw, timestamps)[0], resampler.flush()[0]])
+        np.testing.assert_allclose(resampled, tools.resample_uniform(array, timestamps, 5)[0], atol=1e-5)
+        model, raw_model = background.TPA_Background(), background.TPA_Background(scale=scale)
+        np.testing.assert_array_equal(raw_model.process(raw), model.process(array))
+        np.testing.assert_allclose(raw_model.background, model.background, atol=1e-5)
+
+
+class Test_read_cache(unittest.TestCase):
+    def test_read_tpa_file(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "cached.TXT")
+        shutil.copy(EXPECTED_TXT_FP, fp)
+        cache = tools.read_cache()
+        before = cache.info()
+        # the cache is opt-in
+        self.assertTrue(tools.read_tpa_file(fp)[0].flags.writeable)
+        self.assertEqual(cache.info(), before)
+        array, timestamps = tools.read_tpa_file(fp, cache=True)
+        cached_array, cached_timestamps = tools.read_tpa_file(fp, cache=True)
+        info = cache.info()
+        self.assertEqual((info["hits"] - before["hits"], info["misses"] - before["misses"]), (1, 1))
+        np.testing.assert_array_equal(cached_array, array)
+        self.assertEqual(cached_timestamps, timestamps)
+        with self.assertRaises(ValueError):
+            cached_array[0, 0, 0] = 0
+        cached_timestamps.append(0)
+        self.assertEqual(tools.read_tpa_file(fp, cache=True)[1], timestamps)
+        self.assertTrue(tools.read_tpa_file(fp)[0].flags.writeable)
+        self.assertTrue(np.array(cached_array).flags.writeable)
+        # rewritten files are read again
+        tools.write_tpa_file(fp, array[:2], timestamps[:2], header=tools.read_tpa_header(fp))
+        self.assertEqual(len(tools.read_tpa_file(fp, cache=True)[0]), 2)
+        self.assertEqual(tools.read_tpa_file(fp, dtype=tools.RAW_DTYPE, cache=True)[0].dtype, np.int16)
+        tools.modify_tpa_header(fp, "header")
+        self.assertEqual(tools.read_tpa_header(fp), "header")
+        self.assertEqual(tools.read_txt_header(fp), "header")
+        # worker processes drop the cache
+        tools.disable_read_cache()
+        self.assertEqual((cache.info()["entries"], cache.enabled), (0, False))
+        cache.enabled = True
+        _cleanup([fp])
+
+    def test_bound(self):
+        cache = tools.TPA_Read_Cache(max_bytes=3000)
+        loads = []
+        load = lambda n: loads.append(n) or np.zeros(n, dtype=np.uint8)
+        cache.get(EXPECTED_TXT_FP, "frames", load, 1000)
+        cache.get(EXPECTED_TXT_FP, "frames", load, 1500)
+        cache.get(EXPECTED_TXT_FP, "frames", load, 1000)
+        cache.get(EXPECTED_TXT_FP, "frames", load, 1200)
+        self.assertEqual(cache.info()["nbytes"], 2200)
+        cache.get(EXPECTED_TXT_FP, "frames", load, 5000)
+        cache.get(EXPECTED_TXT_FP, "frames", load, 1000)
+        self.assertEqual(loads, [1000, 1500, 1200, 5000])
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+        cache.invalidate(EXPECTED_TXT_FP)
+        self.assertEqual(cache.info()["entries"], 0)
+        cache.enabled = False
+        cache.get(EXPECTED_TXT_FP, "frames", load, 1000)
+        self.assertEqual((len(loads), cache.misses), (5, 4))
+
+
+class Test_read_tpa_files(unittest.TestCase):
+    def test_read_tpa_files(self):
+        _init()
+        views = [os.path.join(TESTING_DIR, "20200415_1438_ID{}.TXT".format(view_id)) for view_id in [121, 122, 123]]
+        npz_fp = os.path.join(TMP_PATH, "20200415_1438_ID124.npz")
+        tools.write_tpa_file(npz_fp, *tools.read_tpa_file(EXPECTED_TXT_FP))
+        filepaths = views + [npz_fp]
+        expected = [tools.read_tpa_file(fp, cache=False) for fp in filepaths]
+        for workers in [1, 4]:
+            for cache in [False, True]:
+                results = tools.read_tpa_files(filepaths, workers=workers, cache=cache)
+                self.assertEqual(len(results), len(filepaths))
+                for (array, timestamps), (expected_array, expected_timestamps) in zip(results, expected):
+                    np.testing.assert_array_equal(array, expected_array)
+                    np.testing.assert_array_equal(timestamps, expected_timestamps)
+        before = tools.read_cache().info()["hits"]
+        results = tools.read_tpa_files(filepaths, workers=4, dtype=tools.RAW_DTYPE, cache=True)
+        self.assertEqual([array.dtype for array, _ in results], [np.int16] * 4)
+        tools.read_tpa_files(filepaths, workers=4, dtype=tools.RAW_DTYPE, cache=True)
+        self.assertEqual(tools.read_cache().info()["hits"] - before, 4)
+        self.assertTrue(all(array.flags.writeable for array, _ in tools.read_tpa_files(filepaths, workers=4)))
+        # serial by default, no pools are started
+        with unittest.mock.patch("concurrent.futures.ProcessPoolExecutor", side_effect=AssertionError), \
+                unittest.mock.patch("concurrent.futures.ThreadPoolExecutor", side_effect=AssertionError):
+            results = tools.read_tpa_files(filepaths)
+            sample = dataset.TPA_Sample_from_filepaths(views)
+        for (array, _), (expected_array, _) in zip(results, expected):
+            np.testing.assert_array_equal(array, expected_array)
+        # a pool is reused across calls
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            results = tools.read_tpa_files(filepaths, executor=executor)
+            samples = [dataset.TPA_Sample_from_filepaths(views, executor=executor) for _ in range(2)]
+        for (array, _), (expected_array, _) in zip(results, expected):
+            np.testing.assert_array_equal(array, expected_array)
+        samples.append(dataset.TPA_Sample_from_filepaths(views, workers=3))
+        for sample in [sample] + samples:
+            self.assertEqual(sample.ids, ["121", "122", "123"])
+            for array, (expected_array, _) in zip(sample.arrays, expected):
+                np.testing.assert_array_equal(array, expected_array)
+        _cleanup([npz_fp])
+
+
 class Test_headers_handling(unittest.TestCase):
     def test_read_txt_header(self):
         fp = os.path.join(TESTING_DIR,"20200415_1438_ID121.TXT")
@@ -215,6 +704,128 @@ class Test_headers_handling(unittest.TestCase):
         
         
 
+class Test_txt_index(unittest.TestCase):
+    def test_read_txt_frames(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "indexed.TXT")
+        shutil.copy2(MV_SAMPLE[0], fp)
+        expected_array, expected_timestamps = tools.txt2np(fp)
+        index = tools.build_txt_index(fp)
+        self.assertTrue(os.path.exists(tools.txt_index_filepath(fp)))
+        self.assertEqual(len(index), len(expected_timestamps))
+        self.assertTrue(np.array_equal(index["timestamp"], expected_timestamps))
+        array, timestamps = tools.read_txt_frames(fp, 2, 5)
+        self.assertTrue(np.array_equal(array, expected_array[2:5]))
+        self.assertEqual(timestamps, expected_timestamps[2:5])
+        array, timestamps = tools.read_txt_frames(fp, -2)
+        self.assertTrue(np.array_equal(array, expected_array[-2:]))
+        self.assertEqual(timestamps, expected_timestamps[-2:])
+        array, timestamps = tools.read_txt_frames(fp, 5, 5)
+        self.assertEqual(array.shape, (0, 32, 32))
+        _cleanup([fp, tools.txt_index_filepath(fp)])
+
+    def test_read_only_directory(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "read_only.TXT")
+        shutil.copy2(MV_SAMPLE[0], fp)
+        expected_array, expected_timestamps = tools.txt2np(fp)
+        with unittest.mock.patch("os.replace", side_effect=PermissionError("read-only")):
+            index = tools.load_txt_index(fp)
+            array, timestamps = tools.read_tpa_file(fp, t_start=expected_timestamps[2], cache=False)
+            chunks = list(tools.iter_tpa_file(fp, 4))
+        self.assertEqual(len(index), len(expected_timestamps))
+        self.assertTrue(np.array_equal(array, expected_array[2:]))
+        self.assertTrue(np.array_equal(np.concatenate([chunk for chunk, _ in chunks]), expected_array))
+        self.assertEqual(os.listdir(TMP_PATH), ["read_only.TXT"])
+        _cleanup([fp])
+
+    def test_growing_file(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "growing.TXT")
+        with open(MV_SAMPLE[0]) as f:
+            lines = [line.rstrip("\n") + "\n" for line in f.readlines()]
+        with open(fp, "w") as f:
+            f.writelines(lines[:4])
+        index = tools.load_txt_index(fp, save=True)
+        self.assertEqual(len(index), 3)
+        with open(fp, "a") as f:
+            f.writelines(lines[4:])
+            # a line that is still being written
+            f.write(lines[-1][:100])
+        index = tools.load_txt_index(fp, save=True)
+        self.assertEqual(len(index), len(lines) - 1)
+        expected_array, expected_timestamps = tools.txt2np(MV_SAMPLE[0])
+        array, timestamps = tools.read_txt_frames(fp, -3, index=index)
+        self.assertTrue(np.array_equal(array, expected_array[-3:]))
+        self.assertEqual(timestamps, expected_timestamps[-3:])
+        _cleanup([fp, tools.txt_index_filepath(fp)])
+
+
+class Test_validate_txt(unittest.TestCase):
+    def _corrupt(self, fp, source_fp=os.path.join(TESTING_DIR, "20200415_1438_ID121.TXT"), newline=b"\r\n"):
+        with open(source_fp, "rb") as f:
+            lines = f.read().split(newline)
+        lines[3] = lines[3].replace(b" 29", b" 2x9", 1)
+        split = lines[5].split()
+        lines[5] = b" ".join(split[:10] + split[11:])
+        lines[7] = lines[7][:300]
+        split = lines[9].split()
+        lines[9] = b" ".join(split[:-1] + [b"1.0"])
+        split = lines[11].split()
+        lines[11] = b" ".join(split[:-1] + [b"abc"])
+        with open(fp, "wb") as f:
+            f.write(newline.join(lines))
+
+    def test_validate(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "corrupted.TXT")
+        self._corrupt(fp)
+        report = tools.validate_txt(fp)
+        self.assertFalse(report["ok"])
+        self.assertEqual((report["frames"], report["valid"], report["tokens"]), (14, 9, 1292))
+        self.assertEqual([(issue["line"], issue["kind"]) for issue in report["issues"]],
+                         [(4, "non_integer"), (6, "value_count"), (8, "truncated"), (10, "non_monotonic"), (12, "timestamp")])
+        self.assertEqual(json.loads(json.dumps(report)), report)
+        self.assertEqual(tools.debug_HTPA32x32d_txt(fp), 4)
+        for fp_ok in MV_SAMPLE_MESSED + [EXPECTED_TXT_FP]:
+            self.assertTrue(tools.validate_txt(fp_ok)["ok"])
+            self.assertEqual(tools.debug_HTPA32x32d_txt(fp_ok), -1)
+        reports = tools.validate_txt_files([fp] + MV_SAMPLE_MESSED, workers=2)
+        self.assertEqual([r["ok"] for r in reports], [False, True, True, True])
+        self.assertEqual(reports[0], report)
+        _cleanup([fp])
+
+    def test_repair(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "corrupted.TXT")
+        self._corrupt(fp)
+        original, original_ts = tools.txt2np(os.path.join(TESTING_DIR, "20200415_1438_ID121.TXT"))
+        output_fps = []
+        for mode, repaired, dropped in [("drop", [], [4, 6, 8, 10, 12]), ("interpolate", [4, 6], [8, 10, 12])]:
+            output_fp = os.path.join(TMP_PATH, "repaired_{}.TXT".format(mode))
+            report = tools.repair_txt(fp, output_fp, mode=mode)
+            self.assertEqual((report["repaired"], report["dropped"]), (repaired, dropped))
+            self.assertTrue(tools.validate_txt(output_fp)["ok"])
+            self.assertEqual(tools.read_txt_header(output_fp), tools.read_txt_header(fp))
+            array, ts = tools.txt2np(output_fp)
+            kept = [line - 2 for line in range(2, 16) if line not in dropped]
+            self.assertEqual(ts, [original_ts[idx] for idx in kept])
+            for idx, frame in zip(kept, array):
+                if idx + 2 not in repaired:
+                    np.testing.assert_array_equal(frame, original[idx])
+            output_fps.append(output_fp)
+        # a repaired clean write equals the clean write of the kept frames
+        clean_fp = os.path.join(TMP_PATH, "clean.TXT")
+        tools.write_np2txt(clean_fp, original, original_ts, header=tools.read_txt_header(fp))
+        self._corrupt(fp, clean_fp, b"\n")
+        tools.repair_txt(fp, output_fps[0])
+        kept = [line - 2 for line in range(2, 16) if line not in [4, 6, 8, 10, 12]]
+        tools.write_np2txt(clean_fp, original[kept], [original_ts[idx] for idx in kept], header=tools.read_txt_header(fp))
+        with open(output_fps[0], "rb") as f, open(clean_fp, "rb") as f_clean:
+            self.assertTrue(f.read() == f_clean.read())
+        _cleanup([fp, clean_fp] + output_fps)
+
+
 class Test_timestamps2frame_durations(unittest.TestCase):
     def test_Result_Defaults(self):
         test = [1, 2, 4]
@@ -256,6 +867,46 @@ class Testapply_heatmap(unittest.TestCase):
         self.assertTrue(np.array_equal(result[1, 0, 0], [255, 255, 255]))
 
 
+class Test_Pseudocolor(unittest.TestCase):
+    def test_file_range(self):
+        array = np.random.rand(10, 32, 32).astype(np.float32) * 20 + 20
+        minimum, maximum = array.min(), array.max()
+        indices = (255 * ((array - minimum) / (maximum - minimum))).astype(np.uint8)
+        expected = cv2.applyColorMap(indices.flatten(), cv2.COLORMAP_JET).reshape([10, 32, 32, 3])
+        self.assertTrue(np.array_equal(tools.Pseudocolor()(array), expected))
+        self.assertTrue(np.array_equal(tools.apply_heatmap(array), expected))
+
+    def test_fixed_range(self):
+        array = np.random.rand(10, 32, 32).astype(np.float32) * 20 + 20
+        pc = tools.Pseudocolor(t_min=10, t_max=50)
+        result = pc(array)
+        chunks = [chunk.copy() for chunk in pc.iter([array[:4], array[4:]])]
+        self.assertTrue(np.array_equal(np.concatenate(chunks), result))
+        out = np.empty([10, 32, 32, 3], dtype=np.uint8)
+        for chunk_start, chunk in zip([0, 5], pc.iter([array[:5], array[5:]], out=out)):
+            self.assertTrue(np.shares_memory(chunk, out))
+            self.assertTrue(np.array_equal(chunk, result[chunk_start:chunk_start+5]))
+        clipped = pc(np.array([[[0, 100]]], dtype=np.float32))
+        lut = tools.colormap_lut(cv2.COLORMAP_JET)
+        self.assertTrue(np.array_equal(clipped[0, 0], [lut[0], lut[-1]]))
+
+    def test_int16(self):
+        array = np.random.rand(10, 32, 32).astype(np.float32) * 20 + 20
+        centi = np.rint(array * 100).astype(np.int16)
+        expected = tools.Pseudocolor(t_min=20, t_max=40, lut_size=4096)(centi.astype(np.float32) * np.float32(0.01))
+        result = tools.Pseudocolor(t_min=20, t_max=40, lut_size=4096, scale=0.01)(centi)
+        self.assertTrue(np.array_equal(result, expected))
+
+    def test_running_range(self):
+        pc = tools.Pseudocolor(mode="running")
+        list(pc.iter([np.full([1, 2, 2], 25.), np.full([1, 2, 2], 30.), np.full([1, 2, 2], 20.)]))
+        self.assertEqual((pc.t_min, pc.t_max), (20, 30))
+        with self.assertRaises(ValueError):
+            list(tools.Pseudocolor().iter([np.zeros([1, 2, 2])]))
+        pc = tools.Pseudocolor().fit([np.full([1, 2, 2], 25.), np.full([1, 2, 2], 30.)])
+        self.assertEqual((pc.t_min, pc.t_max), (25, 30))
+
+
 class TestNp2pc(unittest.TestCase):
     def test_Result(self):
         array = np.ones([2, 40, 40])
@@ -399,6 +1050,44 @@ class Test_match_timesteps(unittest.TestCase):
         expected_results[4] = [0, 1, 2, 3, 4]
         self.assertEqual(results, expected_results)
 
+    def test_same_as_cdist(self):
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            ts1 = rng.integers(0, 10, rng.integers(1, 20)) / 2
+            ts2 = rng.integers(0, 10, rng.integers(20, 30)) + rng.choice([0, 0.5])
+            ts2[rng.integers(0, len(ts2))] = rng.choice([np.inf, -np.inf, 0])
+            expected = list(cdist(ts1.reshape(-1, 1), ts2.reshape(-1, 1)).argmin(axis=-1))
+            self.assertEqual(tools.match_timesteps(ts1, ts2)[1], expected)
+            self.assertEqual(tools.match_timesteps(ts1, ts2, chunk_size=3)[1], expected)
+
+    def test_monotonic(self):
+        ts1 = [1, 2, 3, 4, 5]
+        ts2 = [1.1, 1.2, 2.1, 2.9, 3.6, 5.1, 6, 6.1]
+        self.assertEqual(tools.match_timesteps(ts1, ts2)[1], [0, 2, 3, 4, 5])
+        ts2 = [1.1, 1.15, 1.2, 3.6, 5.1, 6, 6.1]
+        # nearest matching repeats frame 2
+        self.assertEqual(tools.match_timesteps(ts1, ts2)[1], [0, 2, 3, 3, 4])
+        self.assertEqual(tools.match_timesteps_monotonic(ts1, ts2)[1], [0, 1, 2, 3, 4])
+        self.assertEqual(tools.match_timesteps_monotonic(ts1, ts2, criterion="max")[1], [0, 2, 3, 4, 5])
+        with self.assertRaises(ValueError):
+            tools.match_monotonic(ts2, ts1)
+        results = tools.match_timesteps_monotonic(ts2, ts1, ts2)
+        self.assertEqual(results[0], list(range(5)))
+
+    def test_match_timesteps2(self):
+        ts1 = [1, 2, 3, 4, 5]
+        ts2 = [1.1, 2.1, 2.9, 3.6, 5.1, 6, 6.1]
+        ts3 = [0.9, 1.2, 2, 3, 4.1, 4.2, 4.3, 4.9]
+        max_errors = tools.timesteps_max_errors(ts1, ts2, ts3)
+        self.assertEqual(int(np.argmin(max_errors)), 0)
+        self.assertEqual(tools.match_timesteps2(ts1, ts2, ts3), tools.match_timesteps(ts1, ts2, ts3))
+
+    def test_long(self):
+        ts1 = np.arange(36000) * 0.1
+        ts2 = np.arange(40000) * 0.1 + 0.03
+        results = tools.match_timesteps(ts1, ts2, chunk_size=1000)
+        self.assertTrue(np.array_equal(results[1], np.arange(36000)))
+
 
 class Test_resample_np_tuples(unittest.TestCase):
     def test_indices(self):
@@ -484,6 +1173,94 @@ class Test_resample_timestamps(unittest.TestCase):
         self.assertEqual(result, expected_result)
 
 
+class Test_resample_uniform(unittest.TestCase):
+    def test_methods(self):
+        ts = np.array([0., 0.09, 0.21, 0.3, 0.42, 0.5])
+        # linear in time: linear and cubic interpolation are exact
+        a = ts[:, np.newaxis, np.newaxis] * np.ones((1, 2, 2)) + 20
+        for method in ["linear", "cubic"]:
+            result, grid, valid = tools.resample_uniform(a, ts, 10, method)
+            np.testing.assert_allclose(grid, np.arange(6) / 10)
+            self.assertTrue(valid.all())
+            np.testing.assert_allclose(result[:, 0, 0], grid + 20, rtol=1e-5)
+        result, grid, valid = tools.resample_uniform(a, ts, 10, "nearest")
+        np.testing.assert_allclose(result[:, 1, 1], a[[0, 1, 2, 3, 4, 5], 1, 1])
+        with self.assertRaises(ValueError):
+            tools.resample_uniform(a, ts[::-1], 10)
+
+    def test_gaps(self):
+        ts = np.r_[np.arange(10) / 10, np.arange(10) / 10 + 3]
+        a = np.ones((20, 2, 2), dtype=np.int16)
+        result, grid, valid = tools.resample_uniform(a, ts, 10, "linear", t_start=-0.2, max_gap=0.5)
+        self.assertEqual(result.dtype, np.float32)
+        self.assertFalse(valid[:2].any())
+        self.assertTrue(np.isnan(result[~valid]).all())
+        self.assertTrue((result[valid] == 1).all())
+        self.assertTrue(valid[(grid >= 0) & (grid <= 0.9)].all())
+        self.assertFalse(valid[(grid > 0.9) & (grid < 3)].any())
+        self.assertTrue(valid[grid >= 3].all())
+
+    def test_stream(self):
+        rng = np.random.default_rng(0)
+        ts = np.cumsum(rng.uniform(0.08, 0.14, 300))
+        ts[150:] += 2
+        a = rng.normal(25, 2, (300, 4, 4)).astype(np.float32)
+        for method in tools.RESAMPLING_METHODS:
+            expected = tools.resample_uniform(a, ts, 10, method)
+            resampler = tools.TPA_Uniform_Resampler(10, method)
+            chunks = []
+            for start in range(0, 300, 17):
+                chunks.append(resampler.push(a[start:start+17], ts[start:start+17]))
+            chunks.append(resampler.flush())
+            for expected_item, idx in zip(expected, range(3)):
+                item = np.concatenate([chunk[idx] for chunk in chunks])
+                np.testing.assert_array_equal(item, expected_item)
+
+
+class Test_TPA_Histogram(unittest.TestCase):
+    def test_update_merge(self):
+        rng = np.random.default_rng(0)
+        array = rng.normal(25, 5, (200, 8, 8))
+        array[0, 0, 0], array[1, 0, 0], array[2, 0, 0] = np.nan, 200, -50
+        data = array[np.isfinite(array)]
+        for bins in [None, np.array([0, 10, 20, 25, 30, 100.])]:
+            histogram = tools.TPA_Histogram(bins)
+            partial = tools.TPA_Histogram(bins)
+            histogram.update(array[:50])
+            partial.update(array[50:120]).update(array[120:])
+            histogram.merge(partial)
+            expected, _ = np.histogram(data, histogram.edges)
+            np.testing.assert_array_equal(histogram.counts, expected)
+            self.assertEqual((histogram.underflow, histogram.overflow), (1, 1))
+            self.assertEqual(histogram.n, data.size)
+            self.assertAlmostEqual(histogram.mean, data.mean())
+            self.assertAlmostEqual(histogram.std(), data.std())
+            self.assertEqual((histogram.min, histogram.max), (-50, 200))
+        with self.assertRaises(ValueError):
+            histogram.merge(tools.TPA_Histogram())
+
+    def test_files(self):
+        _init()
+        fps = [shutil.copy(os.path.join(TESTING_DIR, fp), TMP_PATH) for fp in ["20200415_1438_ID121.TXT", "20200415_1438_ID122.TXT", "expected.TXT"]]
+        data = np.concatenate([tools.read_tpa_file(fp, cache=False)[0].ravel() for fp in fps])
+        entries = tools.read_cache().info()["entries"]
+        histogram = tools.tpa_files_histogram(fps, workers=2)
+        serial = tools.tpa_files_histogram(fps, workers=1)
+        np.testing.assert_array_equal(tools.tpa_file_histogram(fps[0], chunk_frames=7).counts, tools.tpa_file_histogram(fps[0]).counts)
+        # recordings are streamed, not cached
+        self.assertEqual(tools.read_cache().info()["entries"], entries)
+        np.testing.assert_array_equal(histogram.counts, serial.counts)
+        np.testing.assert_array_equal(histogram.counts, np.histogram(data, histogram.edges)[0])
+        self.assertAlmostEqual(histogram.mean, data.mean(), places=4)
+        fp = os.path.join(TMP_PATH, "histogram.png")
+        # no plt.stairs() before matplotlib 3.4
+        with unittest.mock.patch("matplotlib.pyplot.stairs", side_effect=AssertionError, create=True):
+            self.assertTrue(histogram.save(fp, mu=True, sigma=True))
+        self.assertTrue(os.path.exists(fp))
+        self.assertFalse(any(os.path.exists(tools.txt_index_filepath(fp)) for fp in fps))
+        _cleanup([fp] + fps)
+
+
 class Test_read_tpa_file(unittest.TestCase):
     def test_txt(self):
         expected_array = np.load(EXPECTED_NP_FP)
@@ -507,6 +1284,44 @@ class Test_read_tpa_file(unittest.TestCase):
         self.assertTrue(np.array_equal(timestamps, expected_timestamps))
 
 
+class Test_read_tpa_file_time_range(unittest.TestCase):
+    def test_txt(self):
+        _init()
+        fp = os.path.join(TMP_PATH, "file.TXT")
+        shutil.copy2(MV_SAMPLE[0], fp)
+        expected_array, expected_timestamps = tools.txt2np(fp)
+        array, timestamps = tools.read_tpa_file(fp, t_start=1.66, t_end=2.2)
+        start, stop = tools.time_range2slice(expected_timestamps, 1.66, 2.2)
+        self.assertTrue(stop - start > 1)
+        self.assertTrue(all(1.66 <= t <= 2.2 for t in timestamps))
+        self.assertTrue(np.array_equal(array, expected_array[start:stop]))
+        self.assertEqual(timestamps, expected_timestamps[start:stop])
+        array, timestamps = tools.read_tpa_file(fp, t_end=expected_timestamps[0])
+        self.assertEqual(timestamps, expected_timestamps[:1])
+        array, timestamps = tools.read_tpa_file(fp, t_start=1e6)
+        self.assertEqual(len(array), 0)
+        self.assertFalse(os.path.exists(tools.txt_index_filepath(fp)))
+        # an existing sidecar is reused
+        tools.build_txt_index(fp)
+        array, timestamps = tools.read_tpa_file(fp, t_start=1.66, t_end=2.2)
+        self.assertTrue(np.array_equal(array, expected_array[start:stop]))
+        _cleanup([fp, tools.txt_index_filepath(fp)])
+
+    def test_pickle(self):
+        expected_array = np.load(EXPECTED_NP_FP)
+        expected_timestamps = [170.093, 170.218, 170.343]
+        array, timestamps = tools.read_tpa_file(EXPECTED_PICKLE_FP, t_start=170.2)
+        self.assertTrue(np.array_equal(array, expected_array[1:]))
+        self.assertTrue(np.array_equal(timestamps, expected_timestamps[1:]))
+
+    def test_time_range2slice(self):
+        ts = [1, 2, 3, 4, 5]
+        self.assertEqual(tools.time_range2slice(ts), (0, 5))
+        self.assertEqual(tools.time_range2slice(ts, 2, 4), (1, 4))
+        self.assertEqual(tools.time_range2slice(ts, 2.5, 3.5), (2, 3))
+        self.assertEqual(tools.time_range2slice(ts, 4, 2), (3, 3))
+
+
 class Test_write_tpa_file(unittest.TestCase):
     def test_txt(self):
         fp = os.path.join(TMP_PATH, "file.TXT")
@@ -539,6 +1354,196 @@ class Test_write_tpa_file(unittest.TestCase):
         _cleanup([fp])
 
 
+class Test_npz_npyd(unittest.TestCase):
+    def test_npz(self):
+        expected_array = np.load(EXPECTED_NP_FP)
+        expected_timestamps = [170.093, 170.218, 170.343]
+        expected_header = "subject,neg"
+        fp = os.path.join(TMP_PATH, "file.NPZ")
+        tools.write_tpa_file(fp, expected_array, expected_timestamps, header=expected_header)
+        self.assertTrue(os.path.isfile(fp))
+        array, timestamps = tools.read_tpa_file(fp)
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertTrue(np.array_equal(timestamps, expected_timestamps))
+        self.assertEqual(tools.read_tpa_header(fp), expected_header)
+        array, timestamps = tools.read_tpa_file(fp, mmap_mode="r")
+        self.assertTrue(isinstance(array, np.memmap))
+        self.assertTrue(np.array_equal(array, expected_array))
+        array, timestamps = tools.read_tpa_file(fp, t_start=170.2)
+        self.assertFalse(isinstance(array, np.memmap))
+        self.assertTrue(np.array_equal(array, expected_array[1:]))
+        del array
+        tools.modify_tpa_header(fp, "MODIFIED")
+        self.assertEqual(tools.read_tpa_header(fp), "MODIFIED")
+        tools.write_np2npz(fp, expected_array, expected_timestamps, compressed=True)
+        array, timestamps = tools.npz2np(fp, mmap_mode="r")
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertEqual(tools.read_tpa_header(fp), "")
+        _cleanup([fp])
+
+    def test_npyd(self):
+        expected_array = np.load(EXPECTED_NP_FP)
+        expected_timestamps = [170.093, 170.218, 170.343]
+        expected_header = "subject,neg"
+        fp = os.path.join(TMP_PATH, "file.npyd")
+        tools.write_tpa_file(fp, expected_array, expected_timestamps, header=expected_header)
+        self.assertTrue(os.path.isdir(fp))
+        array, timestamps = tools.read_tpa_file(fp, mmap_mode="r")
+        self.assertTrue(isinstance(array, np.memmap))
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertTrue(np.array_equal(timestamps, expected_timestamps))
+        self.assertEqual(tools.read_tpa_header(fp), expected_header)
+        del array
+        shutil.rmtree(fp)
+        _cleanup()
+
+    def test_sample_write_header(self):
+        s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE)
+        header = s.get_header()
+        sample = dataset.TPA_Sample_from_data(s.arrays, s.timestamps, s.ids, header=header)
+        sample.make_filepaths(TMP_PATH, "prefix_", "npz")
+        sample.write()
+        s_o = dataset.TPA_Sample_from_filepaths(sample.filepaths)
+        self.assertEqual(s_o.get_header(), header)
+        [self.assertTrue(np.array_equal(result, expected))
+         for result, expected in zip(s_o.arrays, s.arrays)]
+        _cleanup(sample.filepaths)
+
+
+class Test_tpac(unittest.TestCase):
+    def test_write_read(self):
+        _init()
+        expected_array = np.load(EXPECTED_NP_FP)
+        expected_timestamps = [170.093, 170.218, 170.343]
+        expected_header = "subject,neg"
+        fp = os.path.join(TMP_PATH, "file.tpac")
+        tools.write_tpa_file(fp, expected_array, expected_timestamps, header=expected_header)
+        array, timestamps = tools.read_tpa_file(fp)
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertTrue(np.array_equal(timestamps, expected_timestamps))
+        self.assertEqual(tools.read_tpa_header(fp), expected_header)
+        array, timestamps = tools.read_tpa_file(fp, t_start=170.2)
+        self.assertTrue(np.array_equal(array, expected_array[1:]))
+        tools.modify_tpa_header(fp, "MODIFIED")
+        self.assertEqual(tools.read_tpa_header(fp), "MODIFIED")
+        array, timestamps = tools.read_tpa_file(fp)
+        self.assertTrue(np.array_equal(array, expected_array))
+        _cleanup([fp])
+
+    def test_chunks(self):
+        _init()
+        expected_array = np.random.rand(50, 32, 32).astype(np.float32)
+        expected_timestamps = np.arange(50) * 0.1
+        counter = np.arange(50, dtype=np.int32)
+        fp = os.path.join(TMP_PATH, "chunks.tpac")
+        tools.write_np2tpac(fp, expected_array, expected_timestamps,
+                            chunk_size=8, columns={"counter": counter})
+        with tools.TPA_Container(fp) as container:
+            self.assertEqual(len(container), 50)
+            array, timestamps = container.read(5, 30, workers=4)
+            self.assertTrue(np.array_equal(array, expected_array[5:30]))
+            self.assertTrue(np.array_equal(timestamps, expected_timestamps[5:30]))
+            array, timestamps, columns = container.read(t_start=1.05, t_end=2.0, columns=True)
+            self.assertTrue(np.array_equal(array, expected_array[11:21]))
+            self.assertTrue(np.array_equal(columns["counter"], counter[11:21]))
+            array, timestamps = container.read(-3)
+            self.assertTrue(np.array_equal(array, expected_array[-3:]))
+            array, timestamps = container.read(t_start=100)
+            self.assertEqual(len(array), 0)
+        _cleanup([fp])
+
+    def test_timestamps_skip_frames(self):
+        _init()
+        expected_timestamps = np.arange(24) * 0.1
+        fp = os.path.join(TMP_PATH, "timestamps.tpac")
+        tools.write_np2tpac(fp, np.random.rand(24, 32, 32).astype(np.float32), expected_timestamps, chunk_size=8)
+        with tools.TPA_Container(fp) as container:
+            sizes = []
+            f = container._file
+            container._file = unittest.mock.Mock(wraps=f)
+            container._file.read.side_effect = lambda *args: sizes.append(args[0] if args else -1) or f.read(*args)
+            self.assertTrue(np.array_equal(container.timestamps(), expected_timestamps))
+            # frame payloads are skipped
+            frames_nbytes = {chunk["frames_nbytes"] for chunk in container._chunks}
+            self.assertFalse(frames_nbytes & set(sizes))
+            container._file = f
+        _cleanup([fp])
+
+    def test_append(self):
+        _init()
+        expected_array = np.random.rand(20, 32, 32).astype(np.float32)
+        expected_timestamps = np.arange(20) * 0.1
+        fp = os.path.join(TMP_PATH, "append.tpac")
+        recorder = tools.TPA_Container(fp, "w", chunk_size=4, header="HEADER")
+        for i in range(10):
+            recorder.append(expected_array[i:i+1], expected_timestamps[i:i+1])
+        # full chunks are readable while recording
+        array, timestamps = tools.tpac2np(fp)
+        self.assertTrue(np.array_equal(array, expected_array[:8]))
+        recorder.close()
+        # incomplete trailing record is ignored
+        with open(fp, "ab") as f:
+            f.write(tools.TPAC_RECORD.pack(tools.TPAC_MAGIC, tools.TPAC_CHUNK_RECORD, 4, 0, 1000, 100, 0, 0))
+        with tools.TPA_Container(fp, "a") as container:
+            container.append(expected_array[10:], expected_timestamps[10:])
+        array, timestamps = tools.read_tpa_file(fp)
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertTrue(np.array_equal(timestamps, expected_timestamps))
+        self.assertEqual(tools.read_tpa_header(fp), "HEADER")
+        _cleanup([fp])
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+class Test_parquet(unittest.TestCase):
+    def test_wide(self):
+        _init()
+        expected_array, expected_timestamps = tools.read_tpa_file(EXPECTED_TXT_FP)
+        fp = os.path.join(TMP_PATH, "20200415_1438_ID121.parquet")
+        tools.write_np2parquet(fp, expected_array, expected_timestamps, header="test1,label5", row_group_seconds=0.2)
+        df = pd.read_parquet(fp)
+        self.assertEqual(len(df), len(expected_array))
+        self.assertEqual(str(df["label"].dtype), "category")
+        self.assertEqual(df["label"][0], "label5")
+        self.assertEqual(df["subject"][0], "test1")
+        self.assertEqual(df["view"][0], "121")
+        array = df[["P%04d" % idx for idx in range(1024)]].to_numpy().reshape([-1, 32, 32])
+        self.assertTrue(np.array_equal(array, expected_array))
+        self.assertTrue(np.array_equal(df["timestamp"], expected_timestamps))
+        self.assertEqual(pyarrow.parquet.ParquetFile(fp).num_row_groups, 2)
+        df = pd.read_parquet(fp, filters=[("timestamp", ">", 170.2)])
+        self.assertTrue(np.array_equal(df["frame"], [1, 2]))
+        _cleanup([fp])
+
+    def test_long(self):
+        _init()
+        expected_array, expected_timestamps = tools.read_tpa_file(EXPECTED_TXT_FP)
+        fp = os.path.join(TMP_PATH, "long.parquet")
+        tools.write_np2parquet(fp, expected_array, expected_timestamps, layout="long")
+        df = pd.read_parquet(fp)
+        self.assertEqual(len(df), expected_array.size)
+        self.assertEqual(df["prefix"][0], "long")
+        self.assertEqual(df["label"][0], "")
+        array = df.sort_values(["frame", "pixel"])["temperature"].to_numpy().reshape(expected_array.shape)
+        self.assertTrue(np.array_equal(array, expected_array))
+        _cleanup([fp])
+
+    def test_export_dir(self):
+        _init()
+        source_dir = os.path.join(TMP_PATH, "source")
+        os.mkdir(source_dir)
+        [shutil.copy2(fp, source_dir) for fp in MV_SAMPLE]
+        output_dir = os.path.join(TMP_PATH, "parquet")
+        output_fps = tools.export_dir2parquet(source_dir, output_dir, workers=2)
+        self.assertEqual(len(output_fps), len(MV_SAMPLE))
+        fp = [fp for fp in output_fps if fp.endswith("20200415_1438_ID122.parquet")][0]
+        df = pd.read_parquet(fp)
+        self.assertEqual(df["subject"][0], "test2")
+        self.assertEqual(df["prefix"][0], "20200415_1438_")
+        shutil.rmtree(output_dir)
+        shutil.rmtree(source_dir)
+        _cleanup()
+
+
 class Test_class_TPA_Sample_from_filepaths(unittest.TestCase):
     def test_default_init(self):
         expected_samples = [tools.read_tpa_file(fp) for fp in MV_SAMPLE]
@@ -574,6 +1579,31 @@ class Test_class_TPA_Sample_from_filepaths(unittest.TestCase):
         t0, t1, t2 = sample.timestamps
 
 
+    def test_time_range(self):
+        _init()
+        fps = [os.path.join(TMP_PATH, os.path.basename(fp)) for fp in MV_SAMPLE]
+        for src, dst in zip(MV_SAMPLE, fps):
+            shutil.copy2(src, dst)
+        full_sample = dataset.TPA_Sample_from_filepaths(fps)
+        sample = dataset.TPA_Sample_from_filepaths(fps, t_start=1.7, t_end=2.5)
+        for full_array, full_ts, array, ts in zip(full_sample.arrays, full_sample.timestamps, sample.arrays, sample.timestamps):
+            start, stop = tools.time_range2slice(full_ts, 1.7, 2.5)
+            self.assertTrue(np.array_equal(array, full_array[start:stop]))
+            self.assertEqual(ts, full_ts[start:stop])
+        _cleanup(fps)
+
+    def test_cache(self):
+        expected = dataset.TPA_Sample_from_filepaths(MV_SAMPLE)
+        self.assertTrue(all(array.flags.writeable for array in expected.arrays))
+        dataset.TPA_Sample_from_filepaths(MV_SAMPLE, cache=True)
+        before = tools.read_cache().info()["hits"]
+        sample = dataset.TPA_Sample_from_filepaths(MV_SAMPLE, cache=True)
+        self.assertEqual(tools.read_cache().info()["hits"] - before, 3)
+        self.assertFalse(any(array.flags.writeable for array in sample.arrays))
+        for array, expected_array in zip(sample.arrays, expected.arrays):
+            np.testing.assert_array_equal(array, expected_array)
+
+
 class Test_class_TPA_Sample_from_data(unittest.TestCase):
     def test_default_init(self):
         array0, ts0 = tools.txt2np(MV_SAMPLE[0])
@@ -663,6 +1693,16 @@ class Test_class_TPA_Sample_from_data(unittest.TestCase):
         self.assertTrue(np.array_equal(a[1][11], processed_a[1][-1]))
         self.assertTrue(np.array_equal(a[2][-1], processed_a[2][-1]))
 
+    def test_align_timesteps_monotonic(self):
+        s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE_MESSED)
+        sample = dataset.TPA_Sample_from_data(s.arrays, s.timestamps, s.ids)
+        sample.align_timesteps(method="monotonic")
+        self.assertTrue(sample.test_alignment())
+        for ts in sample.timestamps:
+            self.assertTrue((np.diff(ts) > 0).all())
+        with self.assertRaises(ValueError):
+            sample.align_timesteps(method="unknown")
+
     def test_reset_T0_align_timesteps(self):
         s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE_MESSED)
         a, t, i = s.arrays, s.timestamps, s.ids
@@ -686,6 +1726,79 @@ class Test_class_TPA_Sample_from_data(unittest.TestCase):
         self.assertEqual(processed_t[1][0], 0)
         np.testing.assert_almost_equal(processed_t[2][0], 0.05, 5)
 
+    def test_align_timesteps_index_views(self):
+        s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE_MESSED)
+        sample = dataset.TPA_Sample_from_data(s.arrays, s.timestamps, s.ids)
+        sample.align_timesteps(reset_T0=True)
+        sample.select_timesteps([slice(None, None, 2)] * len(sample.ids))
+        indexes = tools.match_timesteps(*s.timestamps)
+        for i in range(len(sample.ids)):
+            # alignment is kept as indices, original arrays are not copied
+            self.assertIs(sample._arrays[i], s.arrays[i])
+            self.assertEqual(sample.timestamps[i].dtype, np.float64)
+            np.testing.assert_array_equal(sample.get_array(i), s.arrays[i][indexes[i]][::2])
+        self.assertTrue(sample.test_alignment())
+        arrays = sample.arrays
+        for i in range(len(sample.ids)):
+            np.testing.assert_array_equal(arrays[i], s.arrays[i][indexes[i]][::2])
+        resampled = tools.resample_np_tuples(s.arrays, step=2)
+        self.assertTrue(all(np.shares_memory(a, b) for a, b in zip(resampled, s.arrays)))
+
+    def test_resample_uniform(self):
+        s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE_MESSED)
+        sample = dataset.TPA_Sample_from_data(s.arrays, s.timestamps, s.ids)
+        valid_masks = sample.resample_uniform(10, method="cubic")
+        self.assertTrue(sample.test_alignment())
+        self.assertTrue(sample.test_synchronization(1e-9))
+        self.assertEqual(len(valid_masks), len(sample.ids))
+        for array, ts, valid in zip(sample.arrays, sample.timestamps, valid_masks):
+            self.assertEqual(len(array), len(ts))
+            np.testing.assert_allclose(np.diff(ts), 0.1)
+            self.assertTrue(valid.all())
+
+
+class Test_class_TPA_Stream_Synchronizer(unittest.TestCase):
+    def _stream(self, sample, synchronizer, delays=None):
+        delays = delays if delays else [0] * len(sample.ids)
+        # frames arrive ordered by timestamp (plus transmission delay of a view)
+        events = sorted((ts + delay, view_idx, frame_idx) for view_idx, (timestamps, delay) in enumerate(zip(sample.timestamps, delays))
+                        for frame_idx, ts in enumerate(timestamps))
+        bundles = []
+        for _, view_idx, frame_idx in events:
+            bundles.extend(synchronizer.push(sample.ids[view_idx], sample.arrays[view_idx][frame_idx],
+                                             sample.timestamps[view_idx][frame_idx]))
+        bundles.extend(synchronizer.flush())
+        return bundles
+
+    def test_same_as_offline(self):
+        s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE_MESSED)
+        reference_idx = int(np.argmin([len(ts) for ts in s.timestamps]))
+        synchronizer = dataset.TPA_Stream_Synchronizer(s.ids, reference_id=s.ids[reference_idx], max_error=np.inf)
+        bundles = self._stream(s, synchronizer, delays=[0.2, 0, 0.1])
+        indices = tools.match_timesteps(*s.timestamps)
+        self.assertEqual(len(bundles), len(indices[0]))
+        for view_idx in range(len(s.ids)):
+            expected_timestamps = list(np.array(s.timestamps[view_idx])[indices[view_idx]])
+            self.assertEqual([bundle[1][view_idx] for bundle in bundles], expected_timestamps)
+            self.assertTrue(np.array_equal(np.array([bundle[0][view_idx] for bundle in bundles]),
+                                           s.arrays[view_idx][indices[view_idx]]))
+        self.assertEqual(synchronizer.stats["emitted"], len(bundles))
+
+    def test_max_error_and_lagging(self):
+        ids = ["121", "122"]
+        synchronizer = dataset.TPA_Stream_Synchronizer(ids, max_error=0.05, max_latency=0.5)
+        bundles = []
+        for t in np.arange(15) * 0.1:
+            bundles.extend(synchronizer.push("121", t, t))
+            if t < 0.45:
+                bundles.extend(synchronizer.push("122", t + 0.01, t + 0.01))
+        np.testing.assert_allclose([bundle[1] for bundle in bundles[:5]], [[0, 0.01], [0.1, 0.11], [0.2, 0.21], [0.3, 0.31], [0.4, 0.41]])
+        self.assertEqual(synchronizer.lagging_views(), ["122"])
+        self.assertTrue(synchronizer.stats["lagging"]["122"] > 0)
+        self.assertTrue(synchronizer.stats["unsynchronized"] > 0)
+        # bounded latency: reference frames older than max_latency are decided
+        self.assertTrue(len(synchronizer._timestamps["121"]) <= 6)
+
 
 class Test_class_TPA_Dataset_Maker(unittest.TestCase):
     def test_generate_config_template(self):
@@ -1017,6 +2130,15 @@ class Test_TPA_RGB_Sample_from_data(unittest.TestCase):
                                   TESTING_DIR + os.path.sep + '20200415_1438_IDRGB/2-35.' + tools.HTPA_UDP_MODULE_WEBCAM_IMG_EXT, TESTING_DIR + os.path.sep + '20200415_1438_IDRGB/2-46.' + tools.HTPA_UDP_MODULE_WEBCAM_IMG_EXT, TESTING_DIR + os.path.sep + '20200415_1438_IDRGB/2-58.' + tools.HTPA_UDP_MODULE_WEBCAM_IMG_EXT, TESTING_DIR + os.path.sep + '20200415_1438_IDRGB/2-85.' + tools.HTPA_UDP_MODULE_WEBCAM_IMG_EXT]
         self.assertEqual(expected_rgb_filepaths, sample.RGB.filepaths)
 
+    def test_align_timesteps_monotonic(self):
+        rgb_dir = os.path.join(TESTING_DIR, "20200415_1438_IDRGB")
+        s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE_MESSED)
+        sample = dataset.TPA_RGB_Sample_from_data(s.arrays, s.timestamps, s.ids, rgb_dir)
+        sample.align_timesteps(method="monotonic")
+        self.assertTrue(sample.test_alignment())
+        self.assertEqual(len(set(sample.RGB.filepaths)), len(sample.RGB.filepaths))
+        self.assertTrue((np.diff(sample.RGB.timestamps) > 0).all())
+
     def test_reset_T0_align_timesteps(self):
         rgb_dir = os.path.join(TESTING_DIR, "20200415_1438_IDRGB")
         s = dataset.TPA_Sample_from_filepaths(MV_SAMPLE_MESSED)
@@ -1151,7 +2273,9 @@ class Test_Integration_TPA_RGB_Sample_from_data_and_filepaths(unittest.TestCase)
         self.assertTrue(sample.test_alignment())
         self.assertTrue(sample2.test_alignment())
         self.assertEqual(sample.TPA.filepaths, sample2.TPA.filepaths)
-        self.assertEqual(sample.TPA.timestamps, sample2.TPA.timestamps)
+        self.assertEqual(len(sample.TPA.timestamps), len(sample2.TPA.timestamps))
+        for ts, ts2 in zip(sample.TPA.timestamps, sample2.TPA.timestamps):
+            np.testing.assert_array_equal(ts, ts2)
         self.assertEqual(sample.RGB.timestamps, sample2.RGB.timestamps)
         sample_rgb_fns = [os.path.basename(fp) for fp in sample.RGB.filepaths]
         sample2_rgb_fns = [os.path.basename(fp) for fp in sample2.RGB.filepaths]
@@ -1178,7 +2302,9 @@ class Test_Integration_TPA_RGB_Sample_from_data_and_filepaths(unittest.TestCase)
         self.assertTrue(sample.test_alignment())
         self.assertTrue(sample2.test_alignment())
         self.assertEqual(sample.TPA.filepaths, sample2.TPA.filepaths)
-        self.assertEqual(sample.TPA.timestamps, sample2.TPA.timestamps)
+        self.assertEqual(len(sample.TPA.timestamps), len(sample2.TPA.timestamps))
+        for ts, ts2 in zip(sample.TPA.timestamps, sample2.TPA.timestamps):
+            np.testing.assert_array_equal(ts, ts2)
         self.assertEqual(sample.RGB.timestamps, sample2.RGB.timestamps)
         self.assertNotEqual(sample2.RGB.timestamps, unaligned_timesteps)
         sample_rgb_fns = [os.path.basename(fp) for fp in sample.RGB.filepaths]
@@ -1287,6 +2413,83 @@ class Test_class_TPA_RGB_Preparer(unittest.TestCase):
 
 
 
+class Test_parallel_prepare(unittest.TestCase):
+    def _snapshot(self, dest):
+        snapshot = {}
+        for root, _, fns in os.walk(dest):
+            for fn in fns:
+                with open(os.path.join(root, fn), "rb") as f:
+                    snapshot[os.path.relpath(os.path.join(root, fn), dest)] = f.read()
+        return snapshot
+
+    def test_parallel_equals_serial(self):
+        with open(TPA_PP_CONFIG) as f:
+            dest = json.load(f)["processed_destination_dir"]
+        for preparer_class in [dataset.TPA_Preparer, dataset.TPA_RGB_Preparer]:
+            snapshots = []
+            for workers in [1, 3]:
+                preparer = preparer_class()
+                preparer.config(TPA_PP_CONFIG)
+                preparer.prepare(workers=workers)
+                self.assertEqual(preparer.failed_prefixes, {})
+                snapshots.append(self._snapshot(dest))
+                shutil.rmtree(dest)
+            self.assertIn("labels.json", snapshots[0])
+            self.assertEqual(snapshots[0], snapshots[1])
+
+    def test_failed_prefixes(self):
+        with open(TPA_PP_CONFIG) as f:
+            dest = json.load(f)["processed_destination_dir"]
+        max_error = dataset.SYNCHRONIZATION_MAX_ERROR
+        dataset.SYNCHRONIZATION_MAX_ERROR = -1
+        try:
+            preparer = dataset.TPA_Preparer()
+            preparer.config(TPA_PP_CONFIG)
+            with self.assertRaises(Exception):
+                preparer.prepare(workers=2)
+        finally:
+            dataset.SYNCHRONIZATION_MAX_ERROR = max_error
+        self.assertEqual(sorted(preparer.failed_prefixes), ["20200415_1438_", "20200415_1515_", "NO_LABELS_"])
+        self.assertFalse(os.path.exists(os.path.join(dest, dataset.TPA_NFO_FN)))
+        if os.path.exists(dest):
+            shutil.rmtree(dest)
+
+    def test_serial_single_process(self):
+        with open(TPA_PP_CONFIG) as f:
+            dest = json.load(f)["processed_destination_dir"]
+        for preparer_class in [dataset.TPA_Preparer, dataset.TPA_RGB_Preparer]:
+            preparer = preparer_class()
+            preparer.config(TPA_PP_CONFIG)
+            self.assertEqual(preparer.workers, 1)
+            with unittest.mock.patch("concurrent.futures.ProcessPoolExecutor", side_effect=AssertionError), \
+                    unittest.mock.patch("concurrent.futures.ThreadPoolExecutor", side_effect=AssertionError):
+                preparer.prepare()
+            self.assertEqual(preparer.failed_prefixes, {})
+            self.assertEqual(preparer._view_workers(2, 3), 1)
+            self.assertEqual(preparer._view_workers(4, 2), 2)
+            shutil.rmtree(dest)
+
+    def test_cache(self):
+        with open(TPA_PP_CONFIG) as f:
+            dest = json.load(f)["processed_destination_dir"]
+        for preparer_class in [dataset.TPA_Preparer, dataset.TPA_RGB_Preparer]:
+            snapshots = []
+            for cache in [False, True, True]:
+                preparer = preparer_class()
+                preparer.config(TPA_PP_CONFIG)
+                self.assertFalse(preparer.cache)
+                before = tools.read_cache().info()["hits"]
+                preparer.prepare(cache=cache)
+                self.assertEqual(preparer.failed_prefixes, {})
+                hits = tools.read_cache().info()["hits"] - before
+                snapshots.append(self._snapshot(dest))
+                shutil.rmtree(dest)
+            # the second cached run reuses the recordings of the first one
+            self.assertGreater(hits, 0)
+            self.assertEqual(snapshots[0], snapshots[1])
+            self.assertEqual(snapshots[0], snapshots[2])
+
+
 class Test_class_TPA_RGB_Dataset_Maker(unittest.TestCase):
     def test_generate_config_template(self):
         gen = dataset.TPA_RGB_Dataset_Maker()